@@ -1,5 +1,4 @@
 import csv
-import time
 from io import StringIO
 
 
@@ -33,12 +32,12 @@ def evaluate_csv(
     grammar, constraints = parse(file, use_stdlib=False)
     solutions = []
 
-    time_in_an_hour = time.time() + seconds
-
-    while time.time() < time_in_an_hour:
-        fandango = Fandango(grammar, constraints, logger_level=LoggerLevel.ERROR)
-        fandango.evolve(desired_solutions=100)
-        solutions.extend(fandango.solution)
+    fandango = Fandango(grammar, constraints, logger_level=LoggerLevel.ERROR)
+    fandango.evolve(
+        max_generations=None,
+        time_budget=seconds,
+        solution_callback=lambda solution, _index: solutions.append(solution),
+    )
 
     coverage = grammar.compute_grammar_coverage(solutions, 4)
 
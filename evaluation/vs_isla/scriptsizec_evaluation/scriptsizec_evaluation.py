@@ -2,7 +2,6 @@ import os
 import shutil
 import subprocess
 import tempfile
-import time
 
 
 from tccbox import tcc_bin_path
@@ -88,12 +87,12 @@ def evaluate_scriptsizec(
     grammar, constraints = parse(file, use_stdlib=False)
     solutions = []
 
-    time_in_an_hour = time.time() + seconds
-
-    while time.time() < time_in_an_hour:
-        fandango = Fandango(grammar, constraints, logger_level=LoggerLevel.ERROR)
-        fandango.evolve(desired_solutions=100)
-        solutions.extend(fandango.solution)
+    fandango = Fandango(grammar, constraints, logger_level=LoggerLevel.ERROR)
+    fandango.evolve(
+        max_generations=None,
+        time_budget=seconds,
+        solution_callback=lambda solution, _index: solutions.append(solution),
+    )
 
     coverage = grammar.compute_grammar_coverage(solutions, 4)
 
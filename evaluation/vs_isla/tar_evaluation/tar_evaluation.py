@@ -1,6 +1,5 @@
 import subprocess
 import tempfile
-import time
 
 
 from fandango.evolution.algorithm import Fandango, LoggerLevel
@@ -29,16 +28,16 @@ def evaluate_tar(
     grammar, constraints = parse(file, use_stdlib=False)
     solutions = []
 
-    time_in_an_hour = time.time() + seconds
-
-    while time.time() < time_in_an_hour:
-        fandango = Fandango(
-            grammar,
-            constraints,
-            logger_level=LoggerLevel.ERROR,
-        )
-        fandango.evolve(desired_solutions=100)
-        solutions.extend(fandango.solution)
+    fandango = Fandango(
+        grammar,
+        constraints,
+        logger_level=LoggerLevel.ERROR,
+    )
+    fandango.evolve(
+        max_generations=None,
+        time_budget=seconds,
+        solution_callback=lambda solution, _index: solutions.append(solution),
+    )
 
     coverage = grammar.compute_grammar_coverage(solutions, 4)
 
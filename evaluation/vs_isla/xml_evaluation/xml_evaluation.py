@@ -1,4 +1,3 @@
-import time
 import xml.etree.ElementTree as ET
 
 
@@ -23,17 +22,17 @@ def evaluate_xml(
     grammar, constraints = parse(file, use_stdlib=False)
     solutions = []
 
-    time_in_an_hour = time.time() + seconds
-
-    while time.time() < time_in_an_hour:
-        fandango = Fandango(
-            grammar,
-            constraints,
-            logger_level=LoggerLevel.ERROR,
-            profiling=True,
-        )
-        fandango.evolve(desired_solutions=100)
-        solutions.extend(fandango.solution)
+    fandango = Fandango(
+        grammar,
+        constraints,
+        logger_level=LoggerLevel.ERROR,
+        profiling=True,
+    )
+    fandango.evolve(
+        max_generations=None,
+        time_budget=seconds,
+        solution_callback=lambda solution, _index: solutions.append(solution),
+    )
 
     coverage = grammar.compute_grammar_coverage(solutions, 4)
 
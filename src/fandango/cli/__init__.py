@@ -2,12 +2,17 @@ import argparse
 import atexit
 import ctypes
 import glob
+import io
 import logging
 import os
 import os.path
+import queue
+import struct
+import tarfile
+import threading
 import traceback
 import re
-from typing import Any
+from typing import Any, Optional
 
 from fandango.constraints.base import Constraint, SoftValue
 
@@ -55,7 +60,18 @@ from pathlib import Path
 
 from ansi_styles import ansiStyles as styles
 
-from fandango.evolution.algorithm import Fandango
+from fandango.evolution.algorithm import Fandango, EvolutionStrategy
+from fandango.evolution.crossover import (
+    SimpleSubtreeCrossover,
+    SizeAwareSubtreeCrossover,
+    SpliceCrossover,
+)
+from fandango.evolution.mutation import (
+    HavocMutation,
+    SimpleMutation,
+    SubtreeRegenerationMutation,
+)
+from fandango.evolution.scheduler import BanditStrategy
 from fandango.language.grammar import Grammar
 from fandango.language.parse import parse, parse_spec, FandangoSpec
 from fandango.logger import LOGGER, print_exception
@@ -167,6 +183,13 @@ def get_parser(in_command_line=True):
         help="run the algorithm indefinitely",
         default=False,
     )
+    algorithm_group.add_argument(
+        "--time-budget",
+        metavar="SECONDS",
+        type=float,
+        help="stop the algorithm after SECONDS seconds, even in the middle of a generation; unless --max-generations is given, run as many generations as fit into the budget",
+        default=None,
+    )
     algorithm_group.add_argument(
         "--population-size", type=int, help="the size of the population", default=None
     )
@@ -224,6 +247,31 @@ def get_parser(in_command_line=True):
         help="Maximal value, the number of nodes in a tree can be increased to",
         default=None,
     )
+    algorithm_group.add_argument(
+        "--evolution-strategy",
+        choices=[strategy.value for strategy in EvolutionStrategy],
+        help="how to evolve the population: 'generational' replaces the whole population every generation (default); 'steady-state' replaces the worst individuals one child at a time",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--operator-bandit",
+        choices=[strategy.value for strategy in BanditStrategy],
+        help="use several mutation operators (failing subtree regeneration, random subtree regeneration, havoc) and crossover operators (subtree crossover, splice from solutions), chosen by a multi-armed bandit with the given strategy according to their fitness improvement per CPU-second",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--size-aware-crossover",
+        dest="size_aware_crossover",
+        action="store_true",
+        help="only swap subtrees in crossover if the children do not exceed --max-nodes nodes",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--short-circuit-generations",
+        type=int,
+        help="in the first N generations, stop evaluating an individual's hard constraints at the first failing one, and estimate its fitness from the evaluated constraints (default: 0)",
+        default=None,
+    )
     algorithm_group.add_argument(
         "-n",
         "--num-outputs",
@@ -246,6 +294,130 @@ def get_parser(in_command_line=True):
         help="directory or ZIP archive with initial population",
         default=None,
     )
+    algorithm_group.add_argument(
+        "--skip-unparsable-seeds",
+        dest="skip_unparsable_seeds",
+        action="store_true",
+        help="skip (and report) individuals in the initial population that cannot be parsed, instead of stopping",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--sample-seeds",
+        dest="sample_seeds",
+        action="store_true",
+        help="if the initial population is larger than the population size, select the individuals that cover the most grammar expansions",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--push-constraints",
+        dest="push_constraints",
+        action="store_true",
+        help="enforce constraints that only restrict the value of a single nonterminal (e.g. 'int(<port>) in range(1024, 65536)') while generating inputs",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--compile-grammar",
+        dest="compile_grammar",
+        action="store_true",
+        help="generate specialized Python code from the grammar to produce inputs faster",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--population-workers",
+        type=int,
+        help="the number of worker processes to parse and generate the initial population with (default: 1). With a random seed, any number of workers above 1 generates the same population, but a different one than a single process",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--seen-set",
+        dest="seen_set_error_rate",
+        type=float,
+        metavar="RATE",
+        help="skip individuals evaluated before in this run, using a probabilistic set with the given false-positive rate (e.g. 0.001)",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--seen-set-memory",
+        dest="seen_set_max_memory",
+        type=int,
+        metavar="MB",
+        help="the maximum memory of the seen-set in megabytes (default: 64)",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--constraint-timeout",
+        dest="constraint_time_limit",
+        type=float,
+        metavar="SECONDS",
+        help="stop evaluating a constraint on an input after the given time, giving the input a fitness of zero",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--constraint-memory",
+        dest="constraint_memory_limit",
+        type=int,
+        metavar="MB",
+        help="stop evaluating a constraint on an input once it allocated the given megabytes, giving the input a fitness of zero",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--profile",
+        dest="profiling",
+        action="store_true",
+        help="report the time spent in the individual steps of the algorithm",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--trace-file",
+        metavar="FILE",
+        type=str,
+        help="write a trace of the algorithm steps to FILE, in Chrome trace-event JSON format (implies --profile)",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--stats-file",
+        metavar="FILE",
+        type=str,
+        help="write per-generation statistics to FILE, as CSV if FILE ends in '.csv' and as JSON Lines otherwise (implies --profile)",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--profile-constraints",
+        dest="profile_constraints",
+        action="store_true",
+        help="report the evaluations, time, combinations, cache hit rate, failure rate, and search time of each constraint, most expensive first",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--constraint-profile-file",
+        metavar="FILE",
+        type=str,
+        help="write the constraint report to FILE, in JSON format (implies --profile-constraints)",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--checkpoint",
+        dest="checkpoint_dir",
+        metavar="DIR",
+        type=str,
+        help="periodically save the state of the evolution to DIR, such that it can be resumed with --resume",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--checkpoint-interval",
+        metavar="N",
+        type=int,
+        help="save a checkpoint every N generations (default: 5)",
+        default=None,
+    )
+    algorithm_group.add_argument(
+        "--resume",
+        dest="resume_from",
+        metavar="DIR",
+        type=str,
+        help="resume the evolution from the checkpoint in DIR; unless --checkpoint is given, checkpoints continue to be saved to DIR",
+        default=None,
+    )
 
     # Shared Settings
     settings_parser = argparse.ArgumentParser(add_help=False)
@@ -409,6 +581,36 @@ def get_parser(in_command_line=True):
         help="write output to OUTPUT (default: stdout)",
     )
 
+    output_group = fuzz_parser.add_argument_group("output settings")
+    output_group.add_argument(
+        "--output-archive",
+        metavar="ARCHIVE",
+        type=str,
+        default=None,
+        help="write outputs as individual files into a single ARCHIVE (.zip, .tar, .tar.gz, .tgz)",
+    )
+    output_group.add_argument(
+        "--output-stream",
+        metavar="FILE",
+        type=str,
+        default=None,
+        help="append outputs to FILE, each preceded by its length as an 8-byte big-endian integer",
+    )
+    output_group.add_argument(
+        "--writer-threads",
+        metavar="N",
+        type=int,
+        default=1,
+        help="write outputs and run commands in N background threads (default: 1). With more than one thread, outputs go to individual files or commands only, and may be processed out of order",
+    )
+    output_group.add_argument(
+        "--output-queue-size",
+        metavar="N",
+        type=int,
+        default=1000,
+        help="hold at most N outputs waiting to be written; evolution pauses when the queue is full (default: 1000)",
+    )
+
     command_group = fuzz_parser.add_argument_group("command invocation settings")
 
     command_group.add_argument(
@@ -680,6 +882,46 @@ def make_fandango_settings(args, initial_settings={}):
     _copy_setting(args, settings, "max_repetitions")
     _copy_setting(args, settings, "max_nodes")
     _copy_setting(args, settings, "max_node_rate")
+    _copy_setting(args, settings, "short_circuit_generations")
+    _copy_setting(args, settings, "compile_grammar")
+    _copy_setting(args, settings, "push_constraints")
+    _copy_setting(args, settings, "population_workers")
+    _copy_setting(args, settings, "skip_unparsable_seeds")
+    _copy_setting(args, settings, "sample_seeds")
+    _copy_setting(args, settings, "seen_set_error_rate")
+    if getattr(args, "seen_set_max_memory", None) is not None:
+        settings["seen_set_max_memory"] = args.seen_set_max_memory * 1024 * 1024
+    _copy_setting(args, settings, "constraint_time_limit")
+    if getattr(args, "constraint_memory_limit", None) is not None:
+        settings["constraint_memory_limit"] = args.constraint_memory_limit * 1024 * 1024
+    _copy_setting(args, settings, "profiling")
+    _copy_setting(args, settings, "trace_file")
+    _copy_setting(args, settings, "stats_file")
+    _copy_setting(args, settings, "profile_constraints")
+    _copy_setting(args, settings, "constraint_profile_file")
+    _copy_setting(args, settings, "checkpoint_dir")
+    _copy_setting(args, settings, "checkpoint_interval")
+    _copy_setting(args, settings, "resume_from")
+    if "resume_from" in settings and "checkpoint_dir" not in settings:
+        settings["checkpoint_dir"] = settings["resume_from"]
+
+    if hasattr(args, "evolution_strategy") and args.evolution_strategy is not None:
+        settings["evolution_strategy"] = EvolutionStrategy(args.evolution_strategy)
+
+    if hasattr(args, "operator_bandit") and args.operator_bandit is not None:
+        settings["operator_bandit"] = BanditStrategy(args.operator_bandit)
+        settings["mutation_operators"] = [
+            SimpleMutation(),
+            SubtreeRegenerationMutation(),
+            HavocMutation(),
+        ]
+        settings["crossover_operators"] = [SimpleSubtreeCrossover(), SpliceCrossover()]
+
+    if hasattr(args, "size_aware_crossover") and args.size_aware_crossover:
+        # `Fandango` sets `max_nodes` of the operator
+        settings["crossover_method"] = SizeAwareSubtreeCrossover()
+        if "crossover_operators" in settings:
+            settings["crossover_operators"][0] = settings["crossover_method"]
 
     if hasattr(args, "start_symbol") and args.start_symbol is not None:
         if args.start_symbol.startswith("<"):
@@ -704,42 +946,64 @@ def make_fandango_settings(args, initial_settings={}):
     return settings
 
 
-def make_evolve_settings(args, file_mode):
+def make_evolve_settings(args, file_mode, writer: Optional["OutputWriter"] = None):
     evolve_settings: dict[str, Any] = {}
     _copy_setting(args, evolve_settings, "desired_solutions", args_name="num_outputs")
+    _copy_setting(args, evolve_settings, "time_budget")
     if args.infinite:
         if args.max_generations != DEFAULT_MAX_GENERATIONS:
             LOGGER.warning("Ignoring --max-generations because --infinite is set")
         evolve_settings["max_generations"] = None
+    elif (
+        getattr(args, "time_budget", None) is not None
+        and args.max_generations == DEFAULT_MAX_GENERATIONS
+    ):
+        evolve_settings["max_generations"] = None
     else:
         _copy_setting(args, evolve_settings, "max_generations")
 
-    evolve_settings["solution_callback"] = (
-        lambda solution, solution_index: output_solution(
-            solution, args, solution_index, file_mode
+    if writer is not None:
+        evolve_settings["solution_callback"] = writer.put
+    else:
+        evolve_settings["solution_callback"] = (
+            lambda solution, solution_index: output_solution(
+                solution, args, solution_index, file_mode
+            )
         )
-    )
 
     return evolve_settings
 
 
-def extract_initial_population(path):
-    try:
-        initial_population = list()
-        if path.strip().endswith(".zip"):
-            with zipfile.ZipFile(path, "r") as zip:
+class SeedCorpus:
+    """
+    The individuals in a directory or ZIP archive.
+    Files are read lazily, one at a time, whenever the corpus is iterated over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_zip = path.strip().endswith(".zip")
+        # Fail early if the corpus does not exist
+        if self.is_zip:
+            with zipfile.ZipFile(path, "r"):
+                pass
+        else:
+            os.listdir(path)
+
+    def __iter__(self):
+        if self.is_zip:
+            with zipfile.ZipFile(self.path, "r") as zip:
                 for file in zip.namelist():
-                    data = zip.read(file).decode()
-                    initial_population.append(data)
+                    yield zip.read(file).decode()
         else:
-            for file in os.listdir(path):
-                filename = os.path.join(path, file)
-                with open(filename, "r") as fd:
-                    individual = fd.read()
-                initial_population.append(individual)
-        return initial_population
-    except FileNotFoundError as e:
-        raise e
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    with open(entry.path, "r") as fd:
+                        yield fd.read()
+
+
+def extract_initial_population(path) -> SeedCorpus:
+    return SeedCorpus(path)
 
 
 # Default Fandango file content (grammar, constraints); set with `set`
@@ -885,26 +1149,42 @@ def output_population(population, args, file_mode=None, *, output_on_stdout=True
 def output_solution_to_directory(solution, args, solution_index: int, file_mode=None):
     LOGGER.debug(f"Storing solution in directory {args.directory!r}")
     os.makedirs(args.directory, exist_ok=True)
+    write_output_to_directory(
+        output(solution, args, file_mode), args, solution_index, file_mode
+    )
+
 
+def write_output_to_directory(
+    data: str | bytes, args, solution_index: int, file_mode=None
+):
+    """Write `data` (an output as produced by `output()`) to its own file in the output directory"""
     basename = f"fandango-{solution_index:04d}{args.filename_extension}"
     filename = os.path.join(args.directory, basename)
     with open_file(filename, file_mode, mode="w") as fd:
-        fd.write(output(solution, args, file_mode))
+        fd.write(data)
 
 
 def output_solution_to_file(solution, args, file_mode=None):
     LOGGER.debug(f"Storing solution in file {args.output!r}")
     with open_file(args.output, file_mode, mode="a") as fd:
-        if fd.tell() > 0:
-            fd.write(
-                args.separator.encode("utf-8")
-                if file_mode == "binary"
-                else args.separator
-            )
-        fd.write(output(solution, args, file_mode))
+        write_output_to_file(fd, output(solution, args, file_mode), args, file_mode)
+
+
+def write_output_to_file(fd, data: str | bytes, args, file_mode=None):
+    """Append `data` (an output as produced by `output()`) to the open output file `fd`"""
+    if fd.tell() > 0:
+        fd.write(
+            args.separator.encode("utf-8") if file_mode == "binary" else args.separator
+        )
+    fd.write(data)
 
 
 def output_solution_with_test_command(solution, args, file_mode):
+    run_test_command(output(solution, args, file_mode), args, file_mode)
+
+
+def run_test_command(data: str | bytes, args, file_mode):
+    """Run the test command in `args` with `data` (an output as produced by `output()`)"""
     LOGGER.info(f"Running {args.test_command}")
     base_cmd = [args.test_command] + args.test_args
 
@@ -930,7 +1210,7 @@ def output_solution_with_test_command(solution, args, file_mode):
                 )
 
         with named_temp_file(mode=mode, prefix=prefix, suffix=suffix) as fd:
-            fd.write(output(solution, args, file_mode))
+            fd.write(data)
             fd.flush()
             cmd = base_cmd + [fd.name]
             LOGGER.debug(f"Running {cmd}")
@@ -940,7 +1220,7 @@ def output_solution_with_test_command(solution, args, file_mode):
         LOGGER.debug(f"Running {cmd} with individual as stdin")
         subprocess.run(
             cmd,
-            input=output(solution, args, file_mode),
+            input=data,
             text=(None if file_mode == "binary" else True),
         )
     elif args.input_method == "libfuzzer":
@@ -948,18 +1228,21 @@ def output_solution_with_test_command(solution, args, file_mode):
             raise NotImplementedError("LibFuzzer harnesses only support binary input")
         harness = ctypes.CDLL(args.test_command).LLVMFuzzerTestOneInput
 
-        bytes = output(solution, args, file_mode)
-        harness(bytes, len(bytes))
+        harness(data, len(data))
     else:
         raise NotImplementedError("Unsupported input method")
 
 
 def output_solution_to_stdout(solution, args, file_mode):
     LOGGER.debug("Printing solution on stdout")
-    out = output(solution, args, file_mode)
-    if not isinstance(out, str):
-        out = out.decode("iso8859-1")
-    print(out, end="")
+    write_output_to_stdout(output(solution, args, file_mode), args)
+
+
+def write_output_to_stdout(data: str | bytes, args):
+    """Print `data` (an output as produced by `output()`) on stdout"""
+    if not isinstance(data, str):
+        data = data.decode("iso8859-1")
+    print(data, end="")
     print(args.separator, end="")
 
 
@@ -988,6 +1271,165 @@ def output_solution(
         output_solution_to_stdout(solution, args, file_mode)
 
 
+class OutputWriter:
+    """
+    Writes solutions in background threads, such that evolution does not wait for disk or terminal I/O.
+
+    Solutions are converted into their output format by the caller, then queued; writer threads
+    take them from the queue in batches. If the queue is full, `put()` blocks until a writer
+    catches up (backpressure). Errors raised by writers are re-raised in `put()` and `close()`.
+
+    Outputs that are ordered (standard output, `--output`, `--output-archive`, `--output-stream`)
+    are only supported with a single writer thread; with more threads, outputs go to individual
+    files in `--directory` or to the test command.
+    """
+
+    BATCH_SIZE = 64
+
+    def __init__(self, args, file_mode: str):
+        assert file_mode == "binary" or file_mode == "text"
+        self.args = args
+        self.file_mode = file_mode
+        self.num_threads = max(1, getattr(args, "writer_threads", 1) or 1)
+        self._queue: queue.Queue = queue.Queue(
+            maxsize=max(1, getattr(args, "output_queue_size", 1000) or 1000)
+        )
+        self._error: Optional[BaseException] = None
+        self._closed = False
+
+        self._directory = args.directory
+        self._test_command = "test_command" in args and args.test_command
+        self._output_file = None
+        self._archive: Any = None
+        self._stream = None
+
+        if args.directory:
+            os.makedirs(args.directory, exist_ok=True)
+        if args.output:
+            self._output_file = open_file(args.output, file_mode, mode="a")
+        archive = getattr(args, "output_archive", None)
+        if archive:
+            if archive.endswith(".zip"):
+                self._archive = zipfile.ZipFile(
+                    archive, "w", compression=zipfile.ZIP_DEFLATED
+                )
+            elif archive.endswith(".tar.gz") or archive.endswith(".tgz"):
+                self._archive = tarfile.open(archive, "w:gz")
+            else:
+                self._archive = tarfile.open(archive, "w")
+        stream = getattr(args, "output_stream", None)
+        if stream:
+            self._stream = open(stream, "ab")
+        self._stdout = not (
+            self._directory
+            or self._test_command
+            or self._output_file
+            or self._archive
+            or self._stream
+        )
+
+        if self.num_threads > 1 and (
+            self._stdout or self._output_file or self._archive or self._stream
+        ):
+            raise FandangoError(
+                "Multiple writer threads require output to a directory (-d) or a command"
+            )
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"fandango-writer-{i}", daemon=True)
+            for i in range(self.num_threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def put(self, solution, solution_index: int) -> None:
+        """Queue `solution` for output; blocks if the queue is full"""
+        if self._error is not None:
+            raise self._error
+        if self.args.format == "none":
+            return
+        self._queue.put((solution_index, output(solution, self.args, self.file_mode)))
+
+    def close(self) -> None:
+        """Write all queued solutions, stop the writer threads and close all outputs"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        for fd in [self._output_file, self._archive, self._stream]:
+            if fd is not None and fd not in (sys.stdout, sys.stdout.buffer):
+                fd.close()
+        if self._stdout:
+            sys.stdout.flush()
+
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            sentinels = batch.count(None)
+            if sentinels > 0:
+                # Every thread needs its own sentinel; return the ones taken for others
+                done = True
+                batch = [item for item in batch if item is not None]
+                for _ in range(sentinels - 1):
+                    self._queue.put(None)
+            if self._error is not None:
+                continue  # Keep draining, such that `put()` does not block forever
+            try:
+                self._write_batch(batch)
+            except BaseException as e:
+                self._error = e
+
+    def _write_batch(self, batch: list[tuple[int, str | bytes]]) -> None:
+        for solution_index, data in batch:
+            basename = f"fandango-{solution_index:04d}{self.args.filename_extension}"
+            raw = data.encode("utf-8") if isinstance(data, str) else data
+
+            if self._directory:
+                write_output_to_directory(
+                    data, self.args, solution_index, self.file_mode
+                )
+            if self._archive is not None:
+                if isinstance(self._archive, zipfile.ZipFile):
+                    self._archive.writestr(basename, raw)
+                else:
+                    info = tarfile.TarInfo(basename)
+                    info.size = len(raw)
+                    info.mtime = int(time.time())
+                    self._archive.addfile(info, io.BytesIO(raw))
+            if self._stream is not None:
+                self._stream.write(struct.pack(">Q", len(raw)) + raw)
+            if self._output_file is not None:
+                write_output_to_file(self._output_file, data, self.args, self.file_mode)
+            if self._test_command:
+                run_test_command(data, self.args, self.file_mode)
+            if self._stdout:
+                write_output_to_stdout(data, self.args)
+
+        if self._output_file is not None:
+            self._output_file.flush()
+        if self._stream is not None:
+            self._stream.flush()
+
+
 def report_syntax_error(
     filename: str, position: int, individual: str | bytes, *, binary: bool = False
 ) -> str:
@@ -1135,7 +1577,8 @@ def fuzz_command(args):
     LOGGER.debug("Starting Fandango")
     fandango = Fandango(grammar, constraints, **settings)
     LOGGER.debug("Evolving population")
-    population = fandango.evolve(**make_evolve_settings(args, file_mode))
+    with OutputWriter(args, file_mode) as writer:
+        population = fandango.evolve(**make_evolve_settings(args, file_mode, writer))
 
     if args.validate:
         LOGGER.debug("Validating population")
@@ -3,11 +3,15 @@ This module contains the base classes for constraints in the fandango library.
 """
 
 import itertools
+import operator
+import time
 from abc import ABC, abstractmethod
+from collections import Counter
 from copy import copy
-from typing import Any, Optional
-from tdigest import TDigest as BaseTDigest
-import math
+from types import CodeType
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
 
 from fandango.constraints.fitness import (
     ConstraintFitness,
@@ -16,51 +20,186 @@ from fandango.constraints.fitness import (
     FailingTree,
     Comparison,
     ComparisonSide,
+    active_statistics,
+    timed_search,
 )
-from fandango.language.search import NonTerminalSearch
+from fandango.language.search import Container, NonTerminalSearch
 from fandango.language.symbol import NonTerminal
 from fandango.language.tree import DerivationTree
 from fandango.logger import print_exception, LOGGER
 
 
-class TDigest(BaseTDigest):
-    def __init__(self, optimization_goal: str):
-        super().__init__()
-        self._min = None
-        self._max = None
-        self.contrast = 200.0
-        if optimization_goal == "min":
-            self.transform = self.amplify_near_0
-        else:
-            self.transform = self.amplify_near_1
+class QuantileSketch:
+    """
+    A NumPy-backed quantile sketch of the values of a soft constraint.
 
-    def update(self, x, w=1):
-        super().update(x, w)
-        if self._min is None or x < self._min:
-            self._min = x
-        if self._max is None or x > self._max:
-            self._max = x
+    Values are ingested in batches (`update_batch()`) and kept as weighted centroids, sorted by value.
+    Whenever there are more than `max_centroids` centroids, they are merged, with finer resolution near the
+    tails (as in a merging t-digest). `score()` maps a whole array of values to [0, 1] at once.
+    """
 
-    def amplify_near_0(self, q):
-        return 1 - math.exp(-self.contrast * q)
+    def __init__(self, optimization_goal: str, max_centroids: int = 1000):
+        self.max_centroids = max_centroids
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self._min: Optional[float] = None
+        self._max: Optional[float] = None
+        self.contrast = 200.0
+        self.optimization_goal = optimization_goal
 
-    def amplify_near_1(self, q):
-        return math.exp(self.contrast * (q - 1))
+    def __len__(self) -> int:
+        """:return: The number of values ingested."""
+        return int(self.weights.sum())
 
-    def score(self, x):
+    def update_batch(self, values: Any) -> None:
+        """
+        Ingest `values` (an iterable of numbers).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        low, high = float(values.min()), float(values.max())
+        self._min = low if self._min is None else min(self._min, low)
+        self._max = high if self._max is None else max(self._max, high)
+
+        means = np.concatenate((self.means, values))
+        weights = np.concatenate((self.weights, np.ones(values.size)))
+        order = np.argsort(means, kind="stable")
+        self.means, self.weights = means[order], weights[order]
+        if self.means.size > self.max_centroids:
+            self._compress()
+
+    def _compress(self) -> None:
+        cumulative = np.cumsum(self.weights)
+        total = cumulative[-1]
+        quantiles = (cumulative - self.weights / 2) / total
+        # Arcsine scale: buckets are smaller near the tails
+        scale = (np.arcsin(2 * quantiles - 1) / np.pi + 0.5) * (self.max_centroids / 2)
+        buckets = np.minimum(scale.astype(np.int64), self.max_centroids // 2 - 1)
+        _, buckets = np.unique(buckets, return_inverse=True)
+        weights = np.bincount(buckets, weights=self.weights)
+        self.means = np.bincount(buckets, weights=self.weights * self.means) / weights
+        self.weights = weights
+
+    def cdf(self, values: np.ndarray) -> np.ndarray:
+        """
+        :return: The estimated fraction of ingested values below each of `values`.
+        """
+        cumulative = np.cumsum(self.weights)
+        quantiles = (cumulative - self.weights / 2) / cumulative[-1]
+        return np.interp(values, self.means, quantiles, left=0.0, right=1.0)
+
+    def transform(self, quantiles: np.ndarray) -> np.ndarray:
+        if self.optimization_goal == "min":
+            # Amplify differences near 0
+            return 1 - np.exp(-self.contrast * quantiles)
+        # Amplify differences near 1
+        return np.exp(self.contrast * (quantiles - 1))
+
+    def score(self, values: Any) -> np.ndarray:
+        """
+        :param values: The values to score (an array of numbers; NaN for values that could not be computed).
+        :return: The score of each value in [0, 1]: 0 at the minimum, 1 at the maximum observed value, and the
+            amplified quantile in between. NaN values get a score of 0.
+        """
+        values = np.asarray(values, dtype=np.float64)
         if self._min is None or self._max is None:
-            return 0
-        if self._min == self._max:
-            return self.transform(self.cdf(x))
-        if x <= self._min:
-            return 0
-        if x >= self._max:
-            return 1
-        else:
-            return self.transform(self.cdf(x))
+            return np.zeros(values.shape)
+        with np.errstate(invalid="ignore"):
+            scores = self.transform(self.cdf(values))
+            if self._min != self._max:
+                scores = np.where(values <= self._min, 0.0, scores)
+                scores = np.where(values >= self._max, 1.0, scores)
+        return np.where(np.isnan(values), 0.0, scores)
 
 
-class Value(GeneticBase):
+def compile_expression(expression: str) -> Optional[CodeType]:
+    """
+    Compile `expression` for `eval()`, such that it need not be compiled again on every evaluation.
+    :param str expression: The expression to compile.
+    :return Optional[CodeType]: The code object, or None if `expression` cannot be compiled;
+    evaluating `expression` itself then reports the error.
+    """
+    try:
+        return compile(expression, "<string>", "eval")
+    except SyntaxError:
+        return None
+
+
+def referenced_names(code: CodeType) -> set[str]:
+    """
+    Get the names (e.g. placeholders) a compiled expression, including nested comprehensions and lambdas, refers to.
+    :param CodeType code: The compiled expression.
+    :return set[str]: The names.
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= referenced_names(const)
+    return names
+
+
+# Marks values that could not be evaluated
+_INVALID = object()
+
+_COMPARISON_OPERATORS = {
+    Comparison.EQUAL: operator.eq,
+    Comparison.NOT_EQUAL: operator.ne,
+    Comparison.GREATER: operator.gt,
+    Comparison.GREATER_EQUAL: operator.ge,
+    Comparison.LESS: operator.lt,
+    Comparison.LESS_EQUAL: operator.le,
+}
+
+
+# Minimum number of values to compare with NumPy rather than one by one
+_VECTORIZE_MIN_VALUES = 64
+
+
+def _is_exact_float(value: Any) -> bool:
+    """
+    Values that convert to a float64 without loss.
+    """
+    if type(value) is float:
+        return True
+    return type(value) in (bool, int) and -(2**53) <= value <= 2**53
+
+
+def _is_plain_value(value: Any) -> bool:
+    """
+    Values whose hash is consistent with `==` (unlike, e.g., derivation trees, which equal their string value).
+    """
+    if type(value) is float:
+        return value == value  # not NaN
+    return type(value) in (bool, int, str, bytes)
+
+
+class CompiledExpressions:
+    """
+    Mixin for genetic bases that evaluate Python expressions.
+    Code objects are not pickled, but compiled again when unpickling (e.g. from the spec cache).
+    """
+
+    def compile_expressions(self):
+        """
+        Compile the expressions of this object. To be overridden in subclasses.
+        """
+        pass
+
+    def __getstate__(self):
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if not isinstance(value, CodeType)
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compile_expressions()
+
+
+class Value(CompiledExpressions, GeneticBase):
     """
     Represents a value that can be used for fitness evaluation.
     In contrast to a constraint, a value is not calculated based on the constraints solved by a tree,
@@ -77,6 +216,10 @@ class Value(GeneticBase):
         super().__init__(*args, **kwargs)
         self.expression = expression
         self.cache: dict[int, ValueFitness] = dict()
+        self.compile_expressions()
+
+    def compile_expressions(self):
+        self.code = compile_expression(self.expression)
 
     def fitness(
         self,
@@ -99,10 +242,10 @@ class Value(GeneticBase):
         else:
             trees = []
             values = []
+            local_variables = self.local_variables.copy()
             # Iterate over all combinations of the tree and the scope
             for combination in self.combinations(tree, scope):
                 # Update the local variables to initialize the placeholders with the values of the combination
-                local_variables = self.local_variables.copy()
                 local_variables.update(
                     {name: container.evaluate() for name, container in combination}
                 )
@@ -113,7 +256,9 @@ class Value(GeneticBase):
                 try:
                     # Evaluate the expression
                     result = eval(
-                        self.expression, self.global_variables, local_variables
+                        self.code or self.expression,
+                        self.global_variables,
+                        local_variables,
                     )
                     values.append(result)
                 except Exception as e:
@@ -157,7 +302,8 @@ class SoftValue(Value):
             "max",
         ), f"Invalid SoftValue optimization goal {type!r}"
         self.optimization_goal = optimization_goal
-        self.tdigest = TDigest(optimization_goal)
+        # The distribution of values seen so far, to normalize them
+        self.sketch = QuantileSketch(optimization_goal)
 
     def __repr__(self):
         representation = repr(self.expression)
@@ -183,7 +329,7 @@ class SoftValue(Value):
                 return f"{self.optimization_goal} {representation}"
 
 
-class Constraint(GeneticBase, ABC):
+class Constraint(CompiledExpressions, GeneticBase, ABC):
     """
     Abstract class to represents a constraint that can be used for fitness evaluation.
     """
@@ -234,7 +380,7 @@ class Constraint(GeneticBase, ABC):
         """
         return self.searches.values()
 
-    def eval(self, expression: str, global_variables, local_variables):
+    def eval(self, expression: Union[str, CodeType], global_variables, local_variables):
         """
         Evaluate the tree in the context of local and global variables.
         """
@@ -268,6 +414,10 @@ class ExpressionConstraint(Constraint):
         """
         super().__init__(*args, **kwargs)
         self.expression = expression
+        self.compile_expressions()
+
+    def compile_expressions(self):
+        self.code = compile_expression(self.expression)
 
     def fitness(
         self, tree: DerivationTree, scope: Optional[dict[str, DerivationTree]] = None
@@ -284,22 +434,23 @@ class ExpressionConstraint(Constraint):
         # Initialize the fitness values
         solved = 0
         total = 0
-        failing_trees = []
+        # The failing trees by their identity, in the order they fail
+        failing_trees: dict[int, DerivationTree] = {}
         # If the tree is None, the fitness is 0
         if tree is None:
             return ConstraintFitness(0, 0, False)
         has_combinations = False
+        local_variables = self.local_variables.copy()
         # Iterate over all combinations of the tree and the scope
         for combination in self.combinations(tree, scope):
             has_combinations = True
             # Update the local variables to initialize the placeholders with the values of the combination
-            local_variables = self.local_variables.copy()
             local_variables.update(
                 {name: container.evaluate() for name, container in combination}
             )
             try:
                 result = self.eval(
-                    self.expression, self.global_variables, local_variables
+                    self.code or self.expression, self.global_variables, local_variables
                 )
                 # Commented this out for now, as `None` is a valid result
                 # of functions such as `re.match()` -- AZ
@@ -311,8 +462,7 @@ class ExpressionConstraint(Constraint):
                     # If the expression evaluates to False, add the failing trees to the list
                     for _, container in combination:
                         for node in container.get_trees():
-                            if node not in failing_trees:
-                                failing_trees.append(node)
+                            failing_trees.setdefault(id(node), node)
             except Exception as e:
                 print_exception(e, f"Evaluation failed: {self.expression}")
 
@@ -326,7 +476,7 @@ class ExpressionConstraint(Constraint):
             solved,
             total,
             solved == total,
-            failing_trees=[FailingTree(t, self) for t in failing_trees],
+            failing_trees=[FailingTree(t, self) for t in failing_trees.values()],
         )
         # Cache the fitness
         self.cache[tree_hash] = fitness
@@ -375,6 +525,13 @@ class ComparisonConstraint(Constraint):
         self.left = left
         self.right = right
         self.types_checked = False
+        self.compile_expressions()
+
+    def compile_expressions(self):
+        self.left_code = compile_expression(self.left)
+        self.right_code = compile_expression(self.right)
+        self.join_plan = self._plan_join()
+        self.constant_side = self._plan_constant_side()
 
     def fitness(
         self, tree: DerivationTree, scope: Optional[dict[str, DerivationTree]] = None
@@ -386,32 +543,53 @@ class ComparisonConstraint(Constraint):
         # If the fitness has already been calculated, return the cached value
         if tree_hash in self.cache:
             return copy(self.cache[tree_hash])
+        # If the tree is None, the fitness is 0
+        if tree is None:
+            return ConstraintFitness(0, 0, False)
+        if self.join_plan is not None:
+            fitness = self._join_fitness(tree, scope, *self.join_plan)
+        else:
+            fitness = self._product_fitness(tree, scope)
+        # Cache the fitness
+        self.cache[tree_hash] = fitness
+        return fitness
+
+    def _product_fitness(
+        self, tree: DerivationTree, scope: Optional[dict[str, DerivationTree]] = None
+    ) -> ConstraintFitness:
+        """
+        Calculate the fitness by evaluating both sides for every combination of the search results.
+        """
         # Initialize the fitness values
         solved = 0
         total = 0
-        failing_trees = []
+        # An ordered set of the failing trees
+        failing_trees: dict[FailingTree, None] = {}
         has_combinations = False
-        # If the tree is None, the fitness is 0
-        if tree is None:
-            return ConstraintFitness(0, 0, False)
+        local_variables = self.local_variables.copy()
         # Iterate over all combinations of the tree and the scope
         for combination in self.combinations(tree, scope):
             total += 1
             has_combinations = True
             # Update the local variables to initialize the placeholders with the values of the combination
-            local_variables = self.local_variables.copy()
             local_variables.update(
                 {name: container.evaluate() for name, container in combination}
             )
             # Evaluate the left and right side of the comparison
             try:
-                left = self.eval(self.left, self.global_variables, local_variables)
+                left = self.eval(
+                    self.left_code or self.left, self.global_variables, local_variables
+                )
             except Exception as e:
                 print_exception(e, f"Evaluation failed: {self.left}")
                 continue
 
             try:
-                right = self.eval(self.right, self.global_variables, local_variables)
+                right = self.eval(
+                    self.right_code or self.right,
+                    self.global_variables,
+                    local_variables,
+                )
             except Exception as e:
                 print_exception(e, f"Evaluation failed: {self.right}")
                 continue
@@ -419,84 +597,7 @@ class ComparisonConstraint(Constraint):
             if not hasattr(self, "types_checked") or not self.types_checked:
                 self.types_checked = self.check_type_compatibility(left, right)
 
-            # Initialize the suggestions
-            suggestions = []
-            is_solved = False
-            match self.operator:
-                case Comparison.EQUAL:
-                    # If the left and right side are equal, the constraint is solved
-                    if left == right:
-                        is_solved = True
-                    else:
-                        # If the left and right side are not equal, add suggestions to the list
-                        if not self.right.strip().startswith("len("):
-                            suggestions.append(
-                                (Comparison.EQUAL, left, ComparisonSide.RIGHT)
-                            )
-                        if not self.left.strip().startswith("len("):
-                            suggestions.append(
-                                (Comparison.EQUAL, right, ComparisonSide.LEFT)
-                            )
-                case Comparison.NOT_EQUAL:
-                    # If the left and right side are not equal, the constraint is solved
-                    if left != right:
-                        is_solved = True
-                    else:
-                        # If the left and right side are equal, add suggestions to the list
-                        suggestions.append(
-                            (Comparison.NOT_EQUAL, left, ComparisonSide.RIGHT)
-                        )
-                        suggestions.append(
-                            (Comparison.NOT_EQUAL, right, ComparisonSide.LEFT)
-                        )
-                case Comparison.GREATER:
-                    # If the left side is greater than the right side, the constraint is solved
-                    if left > right:
-                        is_solved = True
-                    else:
-                        # If the left side is not greater than the right side, add suggestions to the list
-                        suggestions.append(
-                            (Comparison.LESS, left, ComparisonSide.RIGHT)
-                        )
-                        suggestions.append(
-                            (Comparison.GREATER, right, ComparisonSide.LEFT)
-                        )
-                case Comparison.GREATER_EQUAL:
-                    # If the left side is greater than or equal to the right side, the constraint is solved
-                    if left >= right:
-                        is_solved = True
-                    else:
-                        # If the left side is not greater than or equal to the right side, add suggestions to the list
-                        suggestions.append(
-                            (Comparison.LESS_EQUAL, left, ComparisonSide.RIGHT)
-                        )
-                        suggestions.append(
-                            (Comparison.GREATER_EQUAL, right, ComparisonSide.LEFT)
-                        )
-                case Comparison.LESS:
-                    # If the left side is less than the right side, the constraint is solved
-                    if left < right:
-                        is_solved = True
-                    else:
-                        # If the left side is not less than the right side, add suggestions to the list
-                        suggestions.append(
-                            (Comparison.GREATER, left, ComparisonSide.RIGHT)
-                        )
-                        suggestions.append(
-                            (Comparison.LESS, right, ComparisonSide.LEFT)
-                        )
-                case Comparison.LESS_EQUAL:
-                    # If the left side is less than or equal to the right side, the constraint is solved
-                    if left <= right:
-                        is_solved = True
-                    else:
-                        # If the left side is not less than or equal to the right side, add suggestions to the list
-                        suggestions.append(
-                            (Comparison.GREATER_EQUAL, left, ComparisonSide.RIGHT)
-                        )
-                        suggestions.append(
-                            (Comparison.LESS_EQUAL, right, ComparisonSide.LEFT)
-                        )
+            is_solved, suggestions = self._compare(left, right)
             if is_solved:
                 solved += 1
             else:
@@ -504,20 +605,389 @@ class ComparisonConstraint(Constraint):
                 for _, container in combination:
                     for node in container.get_trees():
                         ft = FailingTree(node, self, suggestions=suggestions)
-                        if ft not in failing_trees:
-                            failing_trees.append(ft)
+                        failing_trees.setdefault(ft)
 
         if not has_combinations:
             solved += 1
             total += 1
 
-        # Create the fitness object
-        fitness = ConstraintFitness(
-            solved, total, solved == total, failing_trees=failing_trees
+        return ConstraintFitness(
+            solved, total, solved == total, failing_trees=list(failing_trees)
         )
-        # Cache the fitness
-        self.cache[tree_hash] = fitness
-        return fitness
+
+    def fitness_batch(self, trees: list[DerivationTree]) -> list[ConstraintFitness]:
+        """
+        Calculate the fitness of each of the trees like `fitness()`. If one side of the comparison reads no
+        placeholder (e.g. `int(<number>) > 10000`), it is evaluated once for all trees rather than once per
+        combination, and many numeric values are compared with the constant at once.
+        """
+        if self.constant_side is None:
+            return super().fitness_batch(trees)
+        if self.constant_side == ComparisonSide.LEFT:
+            constant_code, constant_expression = self.left_code, self.left
+            code, expression = self.right_code, self.right
+        else:
+            constant_code, constant_expression = self.right_code, self.right
+            code, expression = self.left_code, self.left
+        try:
+            constant = self.eval(
+                constant_code or constant_expression,
+                self.global_variables,
+                self.local_variables.copy(),
+            )
+        except Exception:
+            # Report the error for each tree
+            return super().fitness_batch(trees)
+
+        results: list[Optional[ConstraintFitness]] = [None] * len(trees)
+        # The trees to evaluate, with the combinations of their search results and the values of the other side
+        pending: list[tuple[int, int, list[tuple[Any, Any]]]] = []
+        for index, tree in enumerate(trees):
+            tree_hash = self.get_hash(tree)
+            if tree_hash in self.cache:
+                results[index] = copy(self.cache[tree_hash])
+                continue
+            if tree is None:
+                results[index] = ConstraintFitness(0, 0, False)
+                continue
+            local_variables = self.local_variables.copy()
+            evaluated = []
+            for combination in self.combinations(tree):
+                local_variables.update(
+                    {name: container.evaluate() for name, container in combination}
+                )
+                try:
+                    value = self.eval(
+                        code or expression, self.global_variables, local_variables
+                    )
+                except Exception as e:
+                    print_exception(e, f"Evaluation failed: {expression}")
+                    value = _INVALID
+                evaluated.append((combination, value))
+            pending.append((index, tree_hash, evaluated))
+
+        values = [
+            value
+            for _, _, evaluated in pending
+            for _, value in evaluated
+            if value is not _INVALID
+        ]
+        if self.constant_side == ComparisonSide.LEFT:
+            operands = [(constant, value) for value in values]
+        else:
+            operands = [(value, constant) for value in values]
+        if not getattr(self, "types_checked", False):
+            for left, right in operands:
+                self.types_checked = self.check_type_compatibility(left, right)
+                if self.types_checked:
+                    break
+        is_solved = iter(self._compare_all(operands, constant, values))
+
+        for index, tree_hash, evaluated in pending:
+            if not evaluated:
+                # No combinations
+                fitness = ConstraintFitness(1, 1, True)
+            else:
+                solved = 0
+                failing_trees: dict[FailingTree, None] = {}
+                for combination, value in evaluated:
+                    if value is _INVALID:
+                        continue
+                    if next(is_solved):
+                        solved += 1
+                        continue
+                    if self.constant_side == ComparisonSide.LEFT:
+                        _, suggestions = self._compare(constant, value)
+                    else:
+                        _, suggestions = self._compare(value, constant)
+                    for _, container in combination:
+                        for node in container.get_trees():
+                            ft = FailingTree(node, self, suggestions=suggestions)
+                            failing_trees.setdefault(ft)
+                fitness = ConstraintFitness(
+                    solved,
+                    len(evaluated),
+                    solved == len(evaluated),
+                    failing_trees=list(failing_trees),
+                )
+            self.cache[tree_hash] = fitness
+            results[index] = fitness
+        return results
+
+    def _compare_all(
+        self, operands: list[tuple[Any, Any]], constant: Any, values: list[Any]
+    ) -> list[bool]:
+        """
+        :return list[bool]: Whether each of the `operands` (`constant` and one of `values`) satisfy the comparison.
+        """
+        compare = _COMPARISON_OPERATORS[self.operator]
+        if (
+            len(values) >= _VECTORIZE_MIN_VALUES
+            and _is_exact_float(constant)
+            and all(map(_is_exact_float, values))
+        ):
+            array = np.array(values, dtype=np.float64)
+            if self.constant_side == ComparisonSide.LEFT:
+                return compare(constant, array).tolist()
+            return compare(array, constant).tolist()
+        return [bool(compare(left, right)) for left, right in operands]
+
+    def _plan_constant_side(self) -> Optional[ComparisonSide]:
+        """
+        :return Optional[ComparisonSide]: The side of the comparison that reads no placeholder,
+        if the other one does (see `fitness_batch()`).
+        """
+        if self.left_code is None or self.right_code is None:
+            return None
+        left_names = referenced_names(self.left_code) & self.searches.keys()
+        right_names = referenced_names(self.right_code) & self.searches.keys()
+        if right_names and not left_names:
+            return ComparisonSide.LEFT
+        if left_names and not right_names:
+            return ComparisonSide.RIGHT
+        return None
+
+    def _plan_join(self) -> Optional[tuple[str, str]]:
+        """
+        If each side of the comparison reads exactly one placeholder, and these differ,
+        both sides can be evaluated independently (see `_join_fitness()`).
+        :return Optional[tuple[str, str]]: The placeholders of the left and right side, or None.
+        """
+        if self.left_code is None or self.right_code is None or len(self.searches) != 2:
+            return None
+        left_names = referenced_names(self.left_code) & self.searches.keys()
+        right_names = referenced_names(self.right_code) & self.searches.keys()
+        if len(left_names) != 1 or len(right_names) != 1 or left_names == right_names:
+            return None
+        return left_names.pop(), right_names.pop()
+
+    def _evaluate_side(
+        self,
+        code: CodeType,
+        expression: str,
+        name: str,
+        containers: list[Container],
+    ) -> list[Any]:
+        """
+        Evaluate one side of the comparison for each of the search results of its placeholder `name`.
+        :return list[Any]: The values, or `_INVALID` where the evaluation failed.
+        """
+        local_variables = self.local_variables.copy()
+        values = []
+        for container in containers:
+            local_variables[name] = container.evaluate()
+            try:
+                values.append(self.eval(code, self.global_variables, local_variables))
+            except Exception as e:
+                print_exception(e, f"Evaluation failed: {expression}")
+                values.append(_INVALID)
+        return values
+
+    def _count_solved(self, lefts: list[Any], rights: list[Any]) -> int:
+        """
+        :return int: The number of pairs of `lefts` and `rights` that satisfy the comparison.
+        """
+        if self.operator in (Comparison.EQUAL, Comparison.NOT_EQUAL) and all(
+            _is_plain_value(value) for value in itertools.chain(lefts, rights)
+        ):
+            # Hash join
+            counts = Counter(rights)
+            equal = sum(counts[value] for value in lefts)
+            if self.operator == Comparison.EQUAL:
+                return equal
+            return len(lefts) * len(rights) - equal
+        statistics = active_statistics()
+        if statistics is not None:
+            # Every pair is compared
+            statistics.combinations += len(lefts) * len(rights)
+        compare = _COMPARISON_OPERATORS[self.operator]
+        return sum(1 for left in lefts for right in rights if compare(left, right))
+
+    def _join_fitness(
+        self,
+        tree: DerivationTree,
+        scope: Optional[dict[str, DerivationTree]],
+        left_name: str,
+        right_name: str,
+    ) -> ConstraintFitness:
+        """
+        Calculate the fitness like `_product_fitness()`, but evaluate each side once per search result of its
+        placeholder instead of once per combination. Satisfied pairs are counted with a hash join where possible;
+        failing pairs are only visited as far as they add failing trees, in the same order as the product would.
+        """
+        outer_name, inner_name = self.searches
+        statistics = active_statistics()
+        start = time.perf_counter() if statistics is not None else 0.0
+        containers = {
+            name: search.find_memoized(tree, scope=scope)
+            for name, search in self.searches.items()
+        }
+        if statistics is not None:
+            statistics.search_time += time.perf_counter() - start
+        if not containers[outer_name] or not containers[inner_name]:
+            # No combinations
+            return ConstraintFitness(1, 1, True)
+
+        values = {
+            left_name: self._evaluate_side(
+                self.left_code, self.left, left_name, containers[left_name]
+            ),
+            right_name: self._evaluate_side(
+                self.right_code, self.right, right_name, containers[right_name]
+            ),
+        }
+        outer_values, inner_values = values[outer_name], values[inner_name]
+        valid_outer = [
+            i for i, value in enumerate(outer_values) if value is not _INVALID
+        ]
+        valid_inner = [
+            i for i, value in enumerate(inner_values) if value is not _INVALID
+        ]
+
+        def operands(o: int, i: int) -> tuple[Any, Any]:
+            if outer_name == left_name:
+                return outer_values[o], inner_values[i]
+            return inner_values[i], outer_values[o]
+
+        def compare(
+            o: int, i: int
+        ) -> tuple[bool, list[tuple[Comparison, Any, ComparisonSide]]]:
+            # Only the pairs compared one by one count as combinations
+            if statistics is not None:
+                statistics.combinations += 1
+            return self._compare(*operands(o, i))
+
+        if not hasattr(self, "types_checked") or not self.types_checked:
+            for o, i in itertools.product(valid_outer, valid_inner):
+                self.types_checked = self.check_type_compatibility(*operands(o, i))
+                if self.types_checked:
+                    break
+
+        total = len(outer_values) * len(inner_values)
+        solved = self._count_solved(
+            [value for value in values[left_name] if value is not _INVALID],
+            [value for value in values[right_name] if value is not _INVALID],
+        )
+        if solved == len(valid_outer) * len(valid_inner):
+            # No failing pairs
+            return ConstraintFitness(solved, total, solved == total)
+
+        # An ordered set of the failing trees
+        failing_trees: dict[FailingTree, None] = {}
+
+        def add_failing(container: Container, suggestions: list) -> None:
+            for node in container.get_trees():
+                failing_trees.setdefault(
+                    FailingTree(node, self, suggestions=suggestions)
+                )
+
+        # Inner results whose trees may not have been added yet
+        pending = list(valid_inner)
+        for o in valid_outer:
+            first = None
+            for i in valid_inner:
+                is_solved, suggestions = compare(o, i)
+                if not is_solved:
+                    first = i
+                    break
+            if first is None:
+                continue
+            # The first failing pair adds the trees of both sides
+            add_failing(containers[outer_name][o], suggestions)
+            add_failing(containers[inner_name][first], suggestions)
+            # Later failing pairs only add new trees of the inner side
+            still_pending = []
+            for i in pending:
+                if i > first:
+                    is_solved, suggestions = compare(o, i)
+                    if not is_solved:
+                        add_failing(containers[inner_name][i], suggestions)
+                        continue
+                if i != first:
+                    still_pending.append(i)
+            pending = still_pending
+
+        return ConstraintFitness(
+            solved, total, solved == total, failing_trees=list(failing_trees)
+        )
+
+    def _compare(
+        self, left: Any, right: Any
+    ) -> tuple[bool, list[tuple[Comparison, Any, ComparisonSide]]]:
+        """
+        :return: Whether `left` and `right` satisfy the comparison, and if not, suggestions to fix them.
+        """
+        # Initialize the suggestions
+        suggestions = []
+        is_solved = False
+        match self.operator:
+            case Comparison.EQUAL:
+                # If the left and right side are equal, the constraint is solved
+                if left == right:
+                    is_solved = True
+                else:
+                    # If the left and right side are not equal, add suggestions to the list
+                    if not self.right.strip().startswith("len("):
+                        suggestions.append(
+                            (Comparison.EQUAL, left, ComparisonSide.RIGHT)
+                        )
+                    if not self.left.strip().startswith("len("):
+                        suggestions.append(
+                            (Comparison.EQUAL, right, ComparisonSide.LEFT)
+                        )
+            case Comparison.NOT_EQUAL:
+                # If the left and right side are not equal, the constraint is solved
+                if left != right:
+                    is_solved = True
+                else:
+                    # If the left and right side are equal, add suggestions to the list
+                    suggestions.append(
+                        (Comparison.NOT_EQUAL, left, ComparisonSide.RIGHT)
+                    )
+                    suggestions.append(
+                        (Comparison.NOT_EQUAL, right, ComparisonSide.LEFT)
+                    )
+            case Comparison.GREATER:
+                # If the left side is greater than the right side, the constraint is solved
+                if left > right:
+                    is_solved = True
+                else:
+                    # If the left side is not greater than the right side, add suggestions to the list
+                    suggestions.append((Comparison.LESS, left, ComparisonSide.RIGHT))
+                    suggestions.append((Comparison.GREATER, right, ComparisonSide.LEFT))
+            case Comparison.GREATER_EQUAL:
+                # If the left side is greater than or equal to the right side, the constraint is solved
+                if left >= right:
+                    is_solved = True
+                else:
+                    # If the left side is not greater than or equal to the right side, add suggestions to the list
+                    suggestions.append(
+                        (Comparison.LESS_EQUAL, left, ComparisonSide.RIGHT)
+                    )
+                    suggestions.append(
+                        (Comparison.GREATER_EQUAL, right, ComparisonSide.LEFT)
+                    )
+            case Comparison.LESS:
+                # If the left side is less than the right side, the constraint is solved
+                if left < right:
+                    is_solved = True
+                else:
+                    # If the left side is not less than the right side, add suggestions to the list
+                    suggestions.append((Comparison.GREATER, left, ComparisonSide.RIGHT))
+                    suggestions.append((Comparison.LESS, right, ComparisonSide.LEFT))
+            case Comparison.LESS_EQUAL:
+                # If the left side is less than or equal to the right side, the constraint is solved
+                if left <= right:
+                    is_solved = True
+                else:
+                    # If the left side is not less than or equal to the right side, add suggestions to the list
+                    suggestions.append(
+                        (Comparison.GREATER_EQUAL, left, ComparisonSide.RIGHT)
+                    )
+                    suggestions.append(
+                        (Comparison.LESS_EQUAL, right, ComparisonSide.LEFT)
+                    )
+        return is_solved, suggestions
 
     def check_type_compatibility(self, left: Any, right: Any) -> bool:
         """
@@ -822,6 +1292,27 @@ class ExistsConstraint(Constraint):
         self.search = search
         self.lazy = lazy
 
+    def _containers(
+        self, tree: DerivationTree, scope: dict[NonTerminal, DerivationTree]
+    ) -> Iterable[Container]:
+        """
+        The containers to quantify over. If the constraint is lazy, they are found lazily,
+        such that the search stops along with the quantifier.
+        """
+        statistics = active_statistics()
+        if self.lazy:
+            # The bound variable is added to the scope while iterating, so search in a snapshot
+            containers = self.search.iter_find_memoized(tree, scope=dict(scope))
+            if statistics is None:
+                return containers
+            return timed_search(containers, statistics)
+        if statistics is None:
+            return self.search.find_memoized(tree, scope=scope)
+        start = time.perf_counter()
+        containers = self.search.find_memoized(tree, scope=scope)
+        statistics.search_time += time.perf_counter() - start
+        return containers
+
     def fitness(
         self,
         tree: DerivationTree,
@@ -840,7 +1331,7 @@ class ExistsConstraint(Constraint):
         fitness_values = list()
         scope = scope or dict()
         # Iterate over all containers found by the search
-        for container in self.search.find(tree, scope=scope):
+        for container in self._containers(tree, scope):
             # Update the scope with the bound variable
             scope[self.bound] = container.evaluate()
             # Evaluate the statement
@@ -915,6 +1406,27 @@ class ForallConstraint(Constraint):
         self.search = search
         self.lazy = lazy
 
+    def _containers(
+        self, tree: DerivationTree, scope: dict[NonTerminal, DerivationTree]
+    ) -> Iterable[Container]:
+        """
+        The containers to quantify over. If the constraint is lazy, they are found lazily,
+        such that the search stops along with the quantifier.
+        """
+        statistics = active_statistics()
+        if self.lazy:
+            # The bound variable is added to the scope while iterating, so search in a snapshot
+            containers = self.search.iter_find_memoized(tree, scope=dict(scope))
+            if statistics is None:
+                return containers
+            return timed_search(containers, statistics)
+        if statistics is None:
+            return self.search.find_memoized(tree, scope=scope)
+        start = time.perf_counter()
+        containers = self.search.find_memoized(tree, scope=scope)
+        statistics.search_time += time.perf_counter() - start
+        return containers
+
     def fitness(
         self,
         tree: DerivationTree,
@@ -933,7 +1445,7 @@ class ForallConstraint(Constraint):
         fitness_values = list()
         scope = scope or dict()
         # Iterate over all containers found by the search
-        for container in self.search.find(tree, scope=scope):
+        for container in self._containers(tree, scope):
             # Update the scope with the bound variable
             scope[self.bound] = container.evaluate()
             # Evaluate the statement
@@ -1027,3 +1539,59 @@ class ConstraintVisitor:
     def visit_implication_constraint(self, constraint: "ImplicationConstraint"):
         """Visits an implication constraint."""
         pass
+
+
+def search_symbols(search: NonTerminalSearch) -> set[NonTerminal]:
+    """
+    Get the nonterminal symbols a search reads, including those of nested (base) searches.
+    :param NonTerminalSearch search: The search.
+    :return set[NonTerminal]: The symbols read by the search.
+    """
+    symbols = set(search.get_access_points())
+    for name in ("base", "attribute", "value"):
+        nested = getattr(search, name, None)
+        if isinstance(nested, NonTerminalSearch):
+            symbols |= search_symbols(nested)
+    return symbols
+
+
+class ReadSymbolsVisitor(ConstraintVisitor):
+    """
+    Collects the nonterminal symbols a constraint (including all nested constraints) reads.
+    The result of a constraint only depends on the subtrees of these symbols.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.symbols: set[NonTerminal] = set()
+
+    def _add_searches(self, constraint: "Constraint"):
+        for search in constraint.searches.values():
+            self.symbols |= search_symbols(search)
+
+    def visit_expression_constraint(self, constraint: "ExpressionConstraint"):
+        self._add_searches(constraint)
+
+    def visit_comparison_constraint(self, constraint: "ComparisonConstraint"):
+        self._add_searches(constraint)
+
+    def visit_forall_constraint(self, constraint: "ForallConstraint"):
+        self._add_searches(constraint)
+        if isinstance(constraint.bound, NonTerminal):
+            self.symbols.add(constraint.bound)
+        self.symbols |= search_symbols(constraint.search)
+
+    def visit_exists_constraint(self, constraint: "ExistsConstraint"):
+        self._add_searches(constraint)
+        if isinstance(constraint.bound, NonTerminal):
+            self.symbols.add(constraint.bound)
+        self.symbols |= search_symbols(constraint.search)
+
+    def visit_disjunction_constraint(self, constraint: "DisjunctionConstraint"):
+        self._add_searches(constraint)
+
+    def visit_conjunction_constraint(self, constraint: "ConjunctionConstraint"):
+        self._add_searches(constraint)
+
+    def visit_implication_constraint(self, constraint: "ImplicationConstraint"):
+        self._add_searches(constraint)
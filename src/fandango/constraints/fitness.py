@@ -5,7 +5,9 @@ The `fitness` module provides the `Fitness` class and its subclasses `ValueFitne
 import abc
 import enum
 import itertools
-from typing import Optional, Any
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional, TypeVar
 
 from fandango.language.search import NonTerminalSearch
 from fandango.language.symbol import NonTerminal
@@ -57,11 +59,20 @@ class FailingTree:
         self.cause = cause
         self.suggestions = suggestions or []
 
+    @property
+    def key(self) -> tuple[int, int]:
+        """
+        :return: The key failing trees are told apart by: the identity of the tree and of the cause.
+        Trees are compared by identity rather than by structure, as equal subtrees at different
+        positions fail separately, and as comparing trees by structure is expensive.
+        """
+        return id(self.tree), id(self.cause)
+
     def __hash__(self):
-        return hash((self.tree, self.cause))
+        return hash(self.key)
 
     def __eq__(self, other):
-        return self.tree == other.tree and self.cause == other.cause
+        return isinstance(other, FailingTree) and self.key == other.key
 
     def __repr__(self):
         return f"FailingTree({self.tree}, {self.cause}, {self.suggestions})"
@@ -184,6 +195,74 @@ class ConstraintFitness(Fitness):
         )
 
 
+class EvaluationStatistics:
+    """
+    Counts the work of the constraint evaluations within `evaluation_statistics()`,
+    including that of nested constraints.
+    """
+
+    def __init__(self):
+        # Number of combinations of search results enumerated; joins count the pairs they compare
+        self.combinations = 0
+        # Time spent searching derivation trees, in seconds
+        self.search_time = 0.0
+
+
+# The statistics of the current constraint evaluation, if any (see `evaluation_statistics()`)
+_active_statistics: Optional[EvaluationStatistics] = None
+
+
+def active_statistics() -> Optional[EvaluationStatistics]:
+    """
+    :return: The statistics of the current constraint evaluation, or None if they are not collected.
+    """
+    return _active_statistics
+
+
+@contextmanager
+def evaluation_statistics() -> Iterator[EvaluationStatistics]:
+    """
+    Collect the statistics of constraint evaluations within this context.
+    """
+    global _active_statistics
+    previous = _active_statistics
+    _active_statistics = EvaluationStatistics()
+    try:
+        yield _active_statistics
+    finally:
+        _active_statistics = previous
+
+
+T = TypeVar("T")
+
+
+def timed_search(results: Iterable[T], statistics: EvaluationStatistics) -> Iterator[T]:
+    """
+    Iterate over lazily found search `results`, adding the time spent searching to `statistics`.
+    """
+    iterator = iter(results)
+    while True:
+        start = time.perf_counter()
+        try:
+            result = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            statistics.search_time += time.perf_counter() - start
+        yield result
+
+
+def counted_combinations(
+    combinations: Iterable[T], statistics: EvaluationStatistics
+) -> Iterator[T]:
+    """
+    Iterate over `combinations`, counting the ones enumerated in `statistics`.
+    """
+    for combination in combinations:
+        statistics.combinations += 1
+        yield combination
+
+
 class GeneticBase(abc.ABC):
     """
     Abstract class to represent a genetic base.
@@ -228,6 +307,15 @@ class GeneticBase(abc.ABC):
         """
         raise NotImplementedError("Fitness function not implemented")
 
+    def fitness_batch(self, trees: list[DerivationTree]) -> list[Fitness]:
+        """
+        Calculate the fitness of each of the trees, e.g. of a whole population.
+        Subclasses override this where evaluating the trees at once is cheaper than one by one.
+        :param list[DerivationTree] trees: The trees to calculate the fitness.
+        :return list[Fitness]: The fitness of each tree.
+        """
+        return [self.fitness(tree) for tree in trees]
+
     @staticmethod
     def get_hash(
         tree: DerivationTree,
@@ -247,12 +335,20 @@ class GeneticBase(abc.ABC):
         :return list[list[tuple[str, DerivationTree]]]: The list of combinations of trees that fill all non-terminals
         in the genetic base.
         """
+        statistics = _active_statistics
+        start = time.perf_counter() if statistics is not None else 0.0
         nodes: list[list[tuple[str, DerivationTree]]] = []
         for name, search in self.searches.items():
             nodes.append(
-                [(name, container) for container in search.find(tree, scope=scope)]
+                [
+                    (name, container)
+                    for container in search.find_memoized(tree, scope=scope)
+                ]
             )
-        return itertools.product(*nodes)
+        if statistics is None:
+            return itertools.product(*nodes)
+        statistics.search_time += time.perf_counter() - start
+        return counted_combinations(itertools.product(*nodes), statistics)
 
     def check(
         self,
@@ -0,0 +1,234 @@
+"""
+Static analysis of hard constraints that only restrict the values of a single nonterminal,
+such as `len(str(<name>)) < 10`, `int(<port>) in range(1024, 65536)`, or `<type> == "A"`.
+
+Such constraints need not be left to evolution: `Grammar.set_local_constraints()` enforces them
+while fuzzing, by regenerating subtrees that violate them or by sampling their values directly.
+"""
+
+import ast
+import random
+from typing import Any, Iterable, Optional, Sequence, Union
+
+from fandango.constraints.base import (
+    CompiledExpressions,
+    ComparisonConstraint,
+    ConjunctionConstraint,
+    Constraint,
+    ConstraintVisitor,
+    ExpressionConstraint,
+    compile_expression,
+    referenced_names,
+)
+from fandango.language.grammar import Grammar
+from fandango.language.search import RuleSearch
+from fandango.language.symbol import NonTerminal
+from fandango.language.tree import DerivationTree
+
+# Conversions under which a value of a nonterminal can be sampled from its string
+_CONVERSIONS = ("str", "int")
+
+
+class LocalConstraint(CompiledExpressions):
+    """
+    A hard constraint that holds for a tree exactly if it holds for each subtree of `symbol` on its own.
+    If `values` is given, the constraint restricts `symbol` to these values, which can be sampled directly.
+    """
+
+    def __init__(
+        self,
+        symbol: NonTerminal,
+        constraint: Union[ExpressionConstraint, ComparisonConstraint],
+        values: Optional[Sequence[Union[str, int]]] = None,
+    ):
+        """
+        :param NonTerminal symbol: The nonterminal the constraint restricts.
+        :param constraint: The constraint; its only search is a `RuleSearch` for `symbol`.
+        :param Optional[Sequence[Union[str, int]]] values: The values `symbol` is restricted to, if known.
+        """
+        self.symbol = symbol
+        self.constraint = constraint
+        self.values = values
+        (self.placeholder,) = constraint.searches
+        if isinstance(constraint, ComparisonConstraint):
+            self.expression = (
+                f"({constraint.left}) {constraint.operator.value} ({constraint.right})"
+            )
+        else:
+            self.expression = constraint.expression
+        self.compile_expressions()
+
+    def compile_expressions(self):
+        self.code = compile_expression(self.expression)
+
+    def accepts(self, tree: DerivationTree) -> bool:
+        """
+        Check whether the generated subtree `tree` (of `symbol`) satisfies the constraint.
+        Unlike `Constraint.fitness()`, this neither reports evaluation errors nor caches results,
+        as rejected subtrees are discarded.
+        :param DerivationTree tree: The subtree.
+        :return bool: True if the constraint holds for all subtrees of `symbol` in `tree`.
+        """
+        local_variables = self.constraint.local_variables.copy()
+        for subtree in tree.iter_all_trees(self.symbol):
+            local_variables[self.placeholder] = subtree
+            try:
+                if not eval(
+                    self.code or self.expression,
+                    self.constraint.global_variables,
+                    local_variables,
+                ):
+                    return False
+            except Exception:
+                return False
+        return True
+
+    def sample(self, grammar: Grammar) -> Optional[DerivationTree]:
+        """
+        Sample a subtree of `symbol` from the known values.
+        :param Grammar grammar: The grammar to parse the value with.
+        :return Optional[DerivationTree]: The subtree, or None if no values are known or the value cannot be parsed.
+        """
+        if not self.values:
+            return None
+        value = random.choice(self.values)
+        return grammar.parse(str(value), self.symbol)
+
+    def __repr__(self):
+        return f"LocalConstraint({self.symbol!r}, {self.constraint!r})"
+
+    def __str__(self):
+        return str(self.constraint)
+
+
+class LocalConstraintFinder(ConstraintVisitor):
+    """
+    Collects the local constraints among hard constraints and their (nested) conjuncts.
+    """
+
+    def __init__(self, grammar: Grammar):
+        super().__init__()
+        self.grammar = grammar
+        self.local_constraints: list[LocalConstraint] = []
+
+    def do_continue(self, constraint: Constraint) -> bool:
+        # Only the conjuncts of a constraint must hold on their own
+        return isinstance(constraint, ConjunctionConstraint)
+
+    def visit_expression_constraint(self, constraint: ExpressionConstraint):
+        self._add(constraint)
+
+    def visit_comparison_constraint(self, constraint: ComparisonConstraint):
+        self._add(constraint)
+
+    def _add(self, constraint: Union[ExpressionConstraint, ComparisonConstraint]):
+        if len(constraint.searches) != 1:
+            return
+        ((placeholder, search),) = constraint.searches.items()
+        if type(search) is not RuleSearch:
+            return
+        symbol = search.symbol
+        if symbol not in self.grammar.rules or symbol in self.grammar.generators:
+            return
+        if isinstance(constraint, ExpressionConstraint):
+            if constraint.is_debug_statement(constraint.expression):
+                return
+        self.local_constraints.append(
+            LocalConstraint(
+                symbol, constraint, self._values(constraint, placeholder) or None
+            )
+        )
+
+    def _values(
+        self,
+        constraint: Union[ExpressionConstraint, ComparisonConstraint],
+        placeholder: str,
+    ) -> Optional[Sequence[Union[str, int]]]:
+        """
+        :return: The values the constraint restricts its symbol to, for constraints of the forms
+            `<x> == value` (or `value == <x>`) and `<x> in values`, where `<x>` may be converted
+            with `str()` or `int()`; None for all other constraints.
+        """
+        try:
+            if isinstance(constraint, ComparisonConstraint):
+                if constraint.operator.value != "==":
+                    return None
+                left = ast.parse(constraint.left, mode="eval").body
+                right = ast.parse(constraint.right, mode="eval").body
+                if _is_value_of(left, placeholder):
+                    other = right
+                elif _is_value_of(right, placeholder):
+                    other = left
+                else:
+                    return None
+                value = self._evaluate(constraint, other, placeholder)
+                return [value] if _is_sampleable(value) else None
+
+            expression = ast.parse(constraint.expression, mode="eval").body
+        except SyntaxError:
+            return None
+        if not (
+            isinstance(expression, ast.Compare)
+            and len(expression.ops) == 1
+            and isinstance(expression.ops[0], ast.In)
+            and _is_value_of(expression.left, placeholder)
+        ):
+            return None
+        values = self._evaluate(constraint, expression.comparators[0], placeholder)
+        if isinstance(values, range):
+            return values
+        if isinstance(values, (set, frozenset)):
+            # Sort, such that sampling only depends on the random state
+            values = sorted(values, key=repr)
+        if isinstance(values, (list, tuple)) and all(map(_is_sampleable, values)):
+            return values
+        return None
+
+    @staticmethod
+    def _evaluate(constraint: Constraint, node: ast.expr, placeholder: str) -> Any:
+        code = compile(ast.Expression(node), "<string>", "eval")
+        if placeholder in referenced_names(code):
+            return None
+        try:
+            return eval(
+                code, constraint.global_variables, constraint.local_variables.copy()
+            )
+        except Exception:
+            return None
+
+
+def _is_value_of(node: ast.expr, placeholder: str) -> bool:
+    """
+    :return: True if `node` is the placeholder, possibly converted with one of `_CONVERSIONS`.
+    """
+    if isinstance(node, ast.Name):
+        return node.id == placeholder
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in _CONVERSIONS
+        and len(node.args) == 1
+        and not node.keywords
+        and isinstance(node.args[0], ast.Name)
+        and node.args[0].id == placeholder
+    )
+
+
+def _is_sampleable(value: Any) -> bool:
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def find_local_constraints(
+    grammar: Grammar, constraints: Iterable[Any]
+) -> list[LocalConstraint]:
+    """
+    Find the hard constraints (or conjuncts thereof) that only restrict the values of a single nonterminal.
+    :param Grammar grammar: The grammar the constraints apply to.
+    :param constraints: The constraints; soft constraints are ignored.
+    :return list[LocalConstraint]: The local constraints.
+    """
+    finder = LocalConstraintFinder(grammar)
+    for constraint in constraints:
+        if isinstance(constraint, Constraint):
+            finder.visit(constraint)
+    return finder.local_constraints
@@ -2,18 +2,35 @@
 import enum
 import logging
 import random
+import sys
+import threading
 import time
-from typing import Callable, Generator, Optional, Union
+from contextlib import AbstractContextManager
+from typing import Callable, Generator, Iterable, Optional, Union
+
+import numpy as np
 
 from fandango import FandangoFailedError, FandangoParseError, FandangoValueError
 from fandango.constraints.base import Constraint, SoftValue
+from fandango.constraints.fitness import FailingTree
+from fandango.constraints.pushdown import LocalConstraint, find_local_constraints
 from fandango.evolution import GeneratorWithReturn
 from fandango.evolution.adaptation import AdaptiveTuner
-from fandango.evolution.crossover import CrossoverOperator, SimpleSubtreeCrossover
+from fandango.evolution.checkpoint import Checkpointer
+from fandango.evolution.constraint_profiler import ConstraintProfiler
+from fandango.evolution.crossover import (
+    CrossoverOperator,
+    SimpleSubtreeCrossover,
+    SizeAwareSubtreeCrossover,
+    SpliceCrossover,
+)
 from fandango.evolution.evaluation import Evaluator
+from fandango.evolution.guard import EvaluationGuard
 from fandango.evolution.mutation import MutationOperator, SimpleMutation
 from fandango.evolution.population import PopulationManager, IoPopulationManager
 from fandango.evolution.profiler import Profiler
+from fandango.evolution.scheduler import BanditStrategy, OperatorScheduler
+from fandango.evolution.seenset import SeenSet
 from fandango.language.grammar import DerivationTree, Grammar, FuzzingMode
 from fandango.language.io import FandangoIO, FandangoParty
 from fandango.language.packetforecaster import PacketForecaster
@@ -35,19 +52,27 @@ class LoggerLevel(enum.Enum):
     CRITICAL = logging.CRITICAL
 
 
+class EvolutionStrategy(enum.Enum):
+    GENERATIONAL = "generational"
+    STEADY_STATE = "steady-state"
+
+
 class Fandango:
     def __init__(
         self,
         grammar: Grammar,
         constraints: list[Union[Constraint, SoftValue]],
         population_size: int = 100,
-        initial_population: Optional[list[Union[DerivationTree, str]]] = None,
+        initial_population: Optional[Iterable[Union[DerivationTree, str]]] = None,
         expected_fitness: float = 1.0,
         elitism_rate: float = 0.1,
-        crossover_method: CrossoverOperator = SimpleSubtreeCrossover(),
+        crossover_method: Optional[CrossoverOperator] = None,
+        crossover_operators: Optional[list[CrossoverOperator]] = None,
         crossover_rate: float = 0.8,
         tournament_size: float = 0.1,
         mutation_method: MutationOperator = SimpleMutation(),
+        mutation_operators: Optional[list[MutationOperator]] = None,
+        operator_bandit: BanditStrategy = BanditStrategy.UCB,
         mutation_rate: float = 0.2,
         destruction_rate: float = 0.0,
         logger_level: Optional[LoggerLevel] = None,
@@ -62,6 +87,24 @@ class Fandango:
         max_nodes: int = 200,
         max_nodes_rate: float = 0.5,
         profiling: bool = False,
+        evolution_strategy: EvolutionStrategy = EvolutionStrategy.GENERATIONAL,
+        short_circuit_generations: int = 0,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_interval: int = 5,
+        resume_from: Optional[str] = None,
+        trace_file: Optional[str] = None,
+        stats_file: Optional[str] = None,
+        compile_grammar: bool = False,
+        population_workers: int = 1,
+        seen_set_error_rate: Optional[float] = None,
+        seen_set_max_memory: int = 64 * 1024 * 1024,
+        skip_unparsable_seeds: bool = False,
+        sample_seeds: bool = False,
+        push_constraints: bool = False,
+        constraint_time_limit: Optional[float] = None,
+        constraint_memory_limit: Optional[int] = None,
+        profile_constraints: bool = False,
+        constraint_profile_file: Optional[str] = None,
     ):
         if tournament_size > 1:
             raise FandangoValueError(
@@ -74,6 +117,11 @@ class Fandango:
         LOGGER.info("---------- Initializing FANDANGO algorithm ---------- ")
 
         self.grammar = grammar
+        # Applied to the grammar only while this instance generates (see `_fuzzing_settings()`)
+        self.compile_grammar = compile_grammar
+        self.local_constraints: Optional[list[LocalConstraint]] = (
+            self._push_constraints(constraints) if push_constraints else None
+        )
         self.constraints = constraints
         self.population_size = population_size
         self.elitism_rate = elitism_rate
@@ -82,6 +130,8 @@ class Fandango:
         self.tournament_size = tournament_size
         self.warnings_are_errors = warnings_are_errors
         self.best_effort = best_effort
+        self.evolution_strategy = evolution_strategy
+        self.short_circuit_generations = short_circuit_generations
         self.current_max_nodes = 50
 
         # Instantiate managers
@@ -105,6 +155,16 @@ class Fandango:
             diversity_weight,
             warnings_are_errors,
         )
+        self.evaluator.short_circuit = short_circuit_generations > 0
+        if seen_set_error_rate is not None:
+            self.evaluator.seen_set = SeenSet(seen_set_error_rate, seen_set_max_memory)
+        if constraint_time_limit is not None or constraint_memory_limit is not None:
+            self.evaluator.guard = EvaluationGuard(
+                constraint_time_limit, constraint_memory_limit
+            )
+        self.constraint_profile_file = constraint_profile_file
+        if profile_constraints or constraint_profile_file is not None:
+            self.evaluator.constraint_profiler = ConstraintProfiler(constraints)
         self.adaptive_tuner = AdaptiveTuner(
             mutation_rate,
             crossover_rate,
@@ -116,75 +176,186 @@ class Fandango:
             max_nodes_rate,
         )
 
-        self.profiler = Profiler(enabled=profiling)
+        self.profiler = Profiler(
+            enabled=profiling, trace_file=trace_file, stats_file=stats_file
+        )
 
+        if crossover_method is None:
+            # Created per instance, such that its index cache does not keep trees of other runs alive
+            crossover_method = SimpleSubtreeCrossover()
         self.crossover_operator = crossover_method
         self.mutation_method = mutation_method
-
-        self.population = self._parse_and_deduplicate(population=initial_population)
-
-        LOGGER.info(
-            f"Generating (additional) initial population (size: {self.population_size - len(self.population)})..."
-        )
-        st_time = time.time()
-
-        with self.profiler.timer("initial_population") as timer:
-            generator = self.population_manager.refill_population(
-                current_population=self.population,
-                eval_individual=self.evaluator.evaluate_individual,
-                max_nodes=self.current_max_nodes,
-                target_population_size=self.population_size,
+        # If several operators are given, a bandit chooses among them
+        self.crossover_scheduler: OperatorScheduler[CrossoverOperator] = (
+            OperatorScheduler(
+                crossover_operators or [crossover_method], operator_bandit
             )
-            self._initial_solutions = list(generator)
-            timer.increment(len(self.population))
-
-        LOGGER.info(
-            f"Initial population generated in {time.time() - st_time:.2f} seconds"
         )
+        self.mutation_scheduler: OperatorScheduler[MutationOperator] = (
+            OperatorScheduler(mutation_operators or [mutation_method], operator_bandit)
+        )
+        for operator in self.crossover_scheduler.operators:
+            if (
+                isinstance(operator, SizeAwareSubtreeCrossover)
+                and operator.max_nodes is None
+            ):
+                operator.max_nodes = max_nodes
 
-        # Evaluate initial population
-        with self.profiler.timer("evaluate_population", increment=self.population):
-            generator = GeneratorWithReturn(
-                self.evaluator.evaluate_population(self.population)
-            )
-            self._initial_solutions.extend(generator)
-            self.evaluation = generator.return_value
-
+        self.generation = 0
+        # Set by a timer thread when the time budget of `evolve()` is exhausted
+        self.out_of_time = False
         self.fixes_made = 0
         self.crossovers_made = 0
         self.mutations_made = 0
         self.time_taken = 0.0
+        self.solutions_per_second = 0.0
+
+        self.checkpointer = (
+            Checkpointer(checkpoint_dir, checkpoint_interval)
+            if checkpoint_dir is not None
+            else None
+        )
+        # Record the spans of generating the initial population; `evolve()` writes them out
+        with self._fuzzing_settings():
+            self.profiler.activate()
+            try:
+                if resume_from is not None:
+                    if initial_population is not None:
+                        LOGGER.warning(
+                            "Resuming from checkpoint; ignoring initial population"
+                        )
+                    self.population = Checkpointer.restore(
+                        self, Checkpointer.load(resume_from)
+                    )
+                else:
+                    self.population = self._parse_and_deduplicate(
+                        population=initial_population,
+                        workers=population_workers,
+                        skip_unparsable=skip_unparsable_seeds,
+                    )
+                    if sample_seeds and len(self.population) > self.population_size:
+                        LOGGER.info(
+                            f"Sampling {self.population_size} diverse individuals from {len(self.population)} seeds..."
+                        )
+                        self.population = PopulationManager.select_diverse(
+                            self.population, self.population_size
+                        )
+
+                LOGGER.info(
+                    f"Generating (additional) initial population (size: {self.population_size - len(self.population)})..."
+                )
+                st_time = time.time()
+
+                with self.profiler.timer("initial_population") as timer:
+                    generator = self.population_manager.refill_population(
+                        current_population=self.population,
+                        eval_individual=self.evaluator.evaluate_individual,
+                        max_nodes=self.current_max_nodes,
+                        target_population_size=self.population_size,
+                        workers=population_workers,
+                        is_seen=self.evaluator.is_seen,
+                    )
+                    self._initial_solutions = list(generator)
+                    timer.increment(len(self.population))
+
+                LOGGER.info(
+                    f"Initial population generated in {time.time() - st_time:.2f} seconds"
+                )
+
+                # Evaluate initial population
+                with self.profiler.timer(
+                    "evaluate_population", increment=self.population
+                ):
+                    generator = GeneratorWithReturn(
+                        self.evaluator.evaluate_population(self.population)
+                    )
+                    self._initial_solutions.extend(generator)
+                    self.evaluation = generator.return_value
+                    self.fitness = Evaluator.fitness_array(self.evaluation)
+            finally:
+                self.profiler.deactivate()
+
+    def _push_constraints(
+        self, constraints: list[Union[Constraint, SoftValue]]
+    ) -> list[LocalConstraint]:
+        """
+        Find the constraints that only restrict single nonterminals, to enforce them while generating.
+        They are still evaluated as usual.
+        """
+        local_constraints = find_local_constraints(self.grammar, constraints)
+        for constraint in local_constraints:
+            how = "sampling" if constraint.values else "filtering"
+            LOGGER.info(
+                f"Enforcing {constraint} while generating {constraint.symbol} ({how})"
+            )
+        LOGGER.info(f"Pushed {len(local_constraints)} constraint(s) into generation")
+        return local_constraints
+
+    def _fuzzing_settings(self) -> AbstractContextManager:
+        """
+        Apply the fuzzing settings of this instance to the grammar within this context.
+        """
+        return self.grammar.fuzzing_settings(
+            compiled=self.compile_grammar, local_constraints=self.local_constraints
+        )
+
+    def _report_constraint_profile(self):
+        """
+        Report the evaluation statistics of each constraint, most expensive first.
+        """
+        profiler = self.evaluator.constraint_profiler
+        if profiler is None:
+            return
+        # On stderr, such that the report does not mix with the generated inputs
+        print(profiler.format_table(), file=sys.stderr)
+        if self.constraint_profile_file is not None:
+            profiler.write_json(self.constraint_profile_file)
+            LOGGER.info(f"Constraint profile written to {self.constraint_profile_file}")
 
     def _parse_and_deduplicate(
-        self, population: Optional[list[Union[DerivationTree, str]]]
+        self,
+        population: Optional[Iterable[Union[DerivationTree, str]]],
+        workers: int = 1,
+        skip_unparsable: bool = False,
     ) -> list[DerivationTree]:
         """
         Parses and deduplicates the initial population along unique parse trees. If no initial population is provided, an empty list is returned.
 
-        :param population: The initial population to parse and deduplicate.
+        :param population: The initial population to parse and deduplicate. This may be a lazy stream.
+        :param workers: The number of worker processes to parse the initial population with.
+        :param skip_unparsable: If True, skip and report individuals that cannot be parsed instead of raising an error.
         :return: A list of unique parse trees.
         """
         if population is None:
             return []
         LOGGER.info("Deduplicating the provided initial population...")
         unique_population: list[DerivationTree] = []
-        unique_hashes: set[int] = set()
-        for individual in population:
-            if isinstance(individual, str):
-                tree = self.grammar.parse(individual)
-                if not tree:
-                    position = self.grammar.max_position()
-                    raise FandangoParseError(
-                        message=f"Failed to parse initial individual{individual!r}",
-                        position=position,
+        unique_fingerprints: set[bytes] = set()
+        skipped = 0
+        for individual, tree in self.population_manager.parse_seeds(
+            population, workers
+        ):
+            if tree is None:
+                if skip_unparsable:
+                    LOGGER.debug(
+                        f"Skipping unparsable initial individual {individual!r:.80}"
                     )
-            elif isinstance(individual, DerivationTree):
-                tree = individual
-            else:
-                raise TypeError("Initial individuals must be DerivationTree or String")
-            PopulationManager.add_unique_individual(
-                population=unique_population, candidate=tree, unique_set=unique_hashes
-            )
+                    skipped += 1
+                    continue
+                # Parse again in this process to obtain the error position
+                self.grammar.parse(individual)
+                position = self.grammar.max_position()
+                raise FandangoParseError(
+                    message=f"Failed to parse initial individual{individual!r}",
+                    position=position,
+                )
+            fingerprint = tree.fingerprint()
+            if fingerprint not in unique_fingerprints:
+                unique_fingerprints.add(fingerprint)
+                unique_population.append(tree)
+        if skipped:
+            LOGGER.warning(f"Skipped {skipped} unparsable initial individual(s)")
+        LOGGER.info(f"{len(unique_population)} unique initial individuals")
         return unique_population
 
     def _perform_selection(self) -> tuple[list[DerivationTree], set[int]]:
@@ -199,49 +370,78 @@ class Fandango:
                 self.evaluation,
                 self.elitism_rate,
                 self.population_size,
+                self.fitness,
             )
             timer.increment(len(new_population))
 
         unique_hashes = {hash(ind) for ind in new_population}
         return new_population, unique_hashes
 
+    def _select_parent_pairs(
+        self, count: int
+    ) -> list[tuple[DerivationTree, DerivationTree]]:
+        """
+        Selects `count` pairs of parents for crossover in a single batch of tournaments.
+
+        :param count: The number of parent pairs to select.
+        :return: The list of parent pairs.
+        """
+        with self.profiler.timer("tournament_selection", increment=2 * count):
+            return self.evaluator.tournament_selection_batch(
+                evaluation=self.evaluation,
+                tournament_size=max(
+                    2, int(self.population_size * self.tournament_size)
+                ),
+                num_tournaments=count,
+                fitness=self.fitness,
+            )
+
     def _perform_crossover(
-        self, new_population: list[DerivationTree], unique_hashes: set[int]
+        self,
+        new_population: list[DerivationTree],
+        unique_hashes: set[int],
+        parent1: DerivationTree,
+        parent2: DerivationTree,
     ) -> Generator[DerivationTree, None, None]:
         """
         Performs crossover of the population.
 
         :param new_population: The new population to perform crossover on.
         :param unique_hashes: The set of unique hashes of the individuals in the new population.
+        :param parent1: The first parent.
+        :param parent2: The second parent.
         """
         try:
-            with self.profiler.timer("tournament_selection", increment=2):
-                parent1, parent2 = self.evaluator.tournament_selection(
-                    evaluation=self.evaluation,
-                    tournament_size=max(
-                        2, int(self.population_size * self.tournament_size)
-                    ),
-                )
-
+            index = self.crossover_scheduler.select()
+            start = time.process_time()
             with self.profiler.timer("crossover", increment=2):
-                child1, child2 = self.crossover_operator.crossover(
+                child1, child2 = self.crossover_scheduler.operators[index].crossover(
                     self.grammar, parent1, parent2
                 )
+            cpu_time = time.process_time() - start
 
-            PopulationManager.add_unique_individual(
-                new_population, child1, unique_hashes
-            )
-            yield from self.evaluator.evaluate_individual(child1)
+            evaluated = []
+            if not self.evaluator.is_seen(child1):
+                PopulationManager.add_unique_individual(
+                    new_population, child1, unique_hashes
+                )
+                yield from self.evaluator.evaluate_individual(child1)
+                evaluated.append(child1)
 
             count = len(new_population)
             with self.profiler.timer("filling") as timer:
-                if len(new_population) < self.population_size:
-                    PopulationManager.add_unique_individual(
-                        new_population, child2, unique_hashes
-                    )
-                yield from self.evaluator.evaluate_individual(child2)
+                if not self.evaluator.is_seen(child2):
+                    if len(new_population) < self.population_size:
+                        PopulationManager.add_unique_individual(
+                            new_population, child2, unique_hashes
+                        )
+                    yield from self.evaluator.evaluate_individual(child2)
+                    evaluated.append(child2)
                 timer.increment(len(new_population) - count)
             self.crossovers_made += 2
+            yield from self._reward_operator(
+                self.crossover_scheduler, index, cpu_time, [parent1, parent2], evaluated
+            )
         except Exception as e:
             print_exception(e, "Error during crossover")
 
@@ -256,16 +456,15 @@ class Fandango:
         mutation_pool = self.evaluator.compute_mutation_pool(new_population)
         mutated_population = []
         for individual in mutation_pool:
+            if self.out_of_time:
+                break
             if random.random() < self.adaptive_tuner.mutation_rate:
                 try:
-                    with self.profiler.timer("mutation", increment=1):
-                        mutated_individual = yield from self.mutation_method.mutate(
-                            individual,
-                            self.grammar,
-                            self.evaluator.evaluate_individual,
-                        )
+                    mutated_individual = yield from self._mutate(individual)
+                    if mutated_individual is None:
+                        # Evaluated before; the population is refilled with new individuals instead
+                        continue
                     mutated_population.append(mutated_individual)
-                    self.mutations_made += 1
                 except Exception as e:
                     LOGGER.error(f"Error during mutation: {e}")
                     print_exception(e, "Error during mutation")
@@ -292,27 +491,51 @@ class Fandango:
         max_generations: Optional[int] = None,
         desired_solutions: Optional[int] = None,
         solution_callback: Callable[[DerivationTree, int], None] = lambda _a, _b: None,
+        time_budget: Optional[float] = None,
     ) -> list[DerivationTree]:
         """
         Evolves the population of the grammar.
 
         If both max_generations and desired_solutions are provided, the generation will run until either the maximum number of generations is reached or the desired number of solutions is found. If neither is provided, the generation will run indefinitely.
+        If time_budget is provided, the generation also stops once the given number of seconds has passed, even in the middle of a generation; the population is then left as of the last completed generation.
+        In IO mode, the conversation stops once the time budget is exhausted.
 
         TODO: go into more details about Fandango IO mode.
 
         :param max_generations: The maximum number of generations to evolve.
         :param desired_solutions: The number of solutions to evolve.
         :param solution_callback: A callback function to be called for each solution.
+        :param time_budget: The maximum number of seconds to evolve.
         :return: A list of DerivationTree objects, all of which are valid solutions to the grammar (or satisify the minimum fitness threshold). The function may run indefinitely if neither max_generations nor desired_solutions are provided.
         """
-        if self.grammar.fuzzing_mode == FuzzingMode.COMPLETE:
-            return self._evolve_single(
-                max_generations, desired_solutions, solution_callback
-            )
-        elif self.grammar.fuzzing_mode == FuzzingMode.IO:
-            return self._evolve_io(max_generations)
-        else:
-            raise RuntimeError(f"Invalid mode: {self.grammar.fuzzing_mode}")
+        self.profiler.open()
+        self.profiler.activate()
+
+        # Rather than reading the clock for every individual, let a timer thread raise a flag
+        self.out_of_time = False
+        deadline = None
+        if time_budget is not None:
+            deadline = threading.Timer(time_budget, self._set_out_of_time)
+            deadline.daemon = True
+            deadline.start()
+
+        try:
+            with self._fuzzing_settings():
+                if self.grammar.fuzzing_mode == FuzzingMode.COMPLETE:
+                    return self._evolve_single(
+                        max_generations,
+                        desired_solutions,
+                        solution_callback,
+                        time_budget,
+                    )
+                elif self.grammar.fuzzing_mode == FuzzingMode.IO:
+                    return self._evolve_io(max_generations)
+                else:
+                    raise RuntimeError(f"Invalid mode: {self.grammar.fuzzing_mode}")
+        finally:
+            if deadline is not None:
+                deadline.cancel()
+            self.profiler.close()
 
     def _evolve_io(self, max_generations: Optional[int] = None) -> list[DerivationTree]:
         spec_env_global, _ = self.grammar.get_spec_env()
@@ -321,6 +544,9 @@ class Fandango:
         forecaster = PacketForecaster(self.grammar)
 
         while True:
+            if self.out_of_time:
+                LOGGER.info("Time budget exhausted")
+                return [history_tree]
             forecast = forecaster.predict(history_tree)
 
             if len(forecast.getMsgParties()) == 0:
@@ -354,6 +580,7 @@ class Fandango:
                         self.evaluator.evaluate_population(self.population)
                     )
                     solutions, self.evaluation = generator.collect()
+                    self.fitness = Evaluator.fitness_array(self.evaluation)
 
                 if not solutions:
                     try:
@@ -422,15 +649,35 @@ class Fandango:
         """
         while self._initial_solutions:
             yield self._initial_solutions.pop(0)
+
+        if self.evolution_strategy == EvolutionStrategy.STEADY_STATE:
+            yield from self._generate_steady_state(max_generations)
+        else:
+            yield from self._generate_generational(max_generations)
+
+    def _generate_generational(
+        self, max_generations: Optional[int] = None
+    ) -> Generator[DerivationTree, None, None]:
+        """
+        Generational evolution: every generation builds a complete new population,
+        which is then fixed and re-evaluated as a whole.
+
+        :param max_generations: The maximum number of generations to generate. If None, the generation will run indefinitely.
+        :return: A generator of solutions.
+        """
         prev_best_fitness = 0.0
-        generation = 0
+        # Generations are counted across `evolve()` calls and resumed runs
+        last_generation = (
+            self.generation + max_generations if max_generations is not None else None
+        )
 
-        while True:
-            if max_generations is not None and generation >= max_generations:
+        while not self.out_of_time:
+            if last_generation is not None and self.generation >= last_generation:
                 break
-            generation += 1
+            generation = self.generation + 1
+            self.evaluator.short_circuit = generation <= self.short_circuit_generations
 
-            avg_fitness = sum(e[1] for e in self.evaluation) / self.population_size
+            avg_fitness = float(self.fitness.sum()) / self.population_size
 
             LOGGER.info(f"Generation {generation} - Average Fitness: {avg_fitness:.2f}")
 
@@ -438,11 +685,20 @@ class Fandango:
             new_population, unique_hashes = self._perform_selection()
 
             # Crossover
+            parent_pairs: list[tuple[DerivationTree, DerivationTree]] = []
             while (
                 len(new_population) < self.population_size
                 and random.random() < self.adaptive_tuner.crossover_rate
+                and not self.out_of_time
             ):
-                yield from self._perform_crossover(new_population, unique_hashes)
+                if not parent_pairs:
+                    parent_pairs = self._select_parent_pairs(
+                        max(1, (self.population_size - len(new_population) + 1) // 2)
+                    )
+                parent1, parent2 = parent_pairs.pop()
+                yield from self._perform_crossover(
+                    new_population, unique_hashes, parent1, parent2
+                )
 
             # Truncate if necessary
             if len(new_population) > self.population_size:
@@ -451,6 +707,10 @@ class Fandango:
             # Mutation
             yield from self._perform_mutation(new_population)
 
+            if self.out_of_time:
+                # Abandon this generation; keep the population of the previous one
+                break
+
             # Destruction
             if self.destruction_rate > 0:
                 new_population = self._perform_destruction(new_population)
@@ -462,62 +722,324 @@ class Fandango:
                 self.evaluator.evaluate_individual,
                 self.current_max_nodes,
                 self.population_size,
+                is_seen=self.evaluator.is_seen,
+                stop=lambda: self.out_of_time,
             )
 
-            self.population = []
+            failing: list[tuple[DerivationTree, list[FailingTree]]] = []
             for ind in new_population:
+                if self.out_of_time:
+                    break
                 _fitness, failing_trees = yield from self.evaluator.evaluate_individual(
                     ind
                 )
-                ind, num_fixes = self.population_manager.fix_individual(
-                    ind, failing_trees
-                )
-                self.population.append(ind)
+                failing.append((ind, failing_trees))
+            if self.out_of_time:
+                break
+
+            # Fix the whole population in one batch
+            fixed_population = []
+            for ind, num_fixes in self.population_manager.fix_individuals(
+                failing, stop=lambda: self.out_of_time
+            ):
+                fixed_population.append(ind)
                 self.fixes_made += num_fixes
+            if self.out_of_time:
+                break
+            self.population = fixed_population
 
             # For soft constraints, the normalized fitness may change over time as we observe more inputs.
             # Hence, we periodically flush the fitness cache to re-evaluate the population if the grammar contains soft constraints.
-            self.evaluator.flush_fitness_cache()
+            self.evaluator.flush_fitness_cache(self.population)
 
             with self.profiler.timer("evaluate_population", increment=self.population):
                 self.evaluation = yield from self.evaluator.evaluate_population(
                     self.population
                 )
                 # Keep only the fittest individuals
-                self.evaluation = sorted(
-                    self.evaluation, key=lambda x: x[1], reverse=True
-                )[: self.population_size]
-
-            current_best_fitness = max(e[1] for e in self.evaluation)
-            current_max_repetitions = self.grammar.get_max_repetition()
-            self.adaptive_tuner.update_parameters(
-                generation,
-                prev_best_fitness,
-                current_best_fitness,
-                self.population,
-                self.evaluator,
-                current_max_repetitions,
+                fitness = Evaluator.fitness_array(self.evaluation)
+                order = np.argsort(-fitness, kind="stable")[: self.population_size]
+                self.evaluation = [self.evaluation[i] for i in order.tolist()]
+                self.fitness = fitness[order]
+
+            prev_best_fitness = self._finish_generation(
+                generation, last_generation, prev_best_fitness
+            )
+
+    def _generate_steady_state(
+        self, max_generations: Optional[int] = None
+    ) -> Generator[DerivationTree, None, None]:
+        """
+        Steady-state evolution: children replace the worst individual of the population one at a time,
+        and only new individuals are evaluated and fixed.
+        To keep `max_generations` comparable with generational evolution,
+        one generation corresponds to `population_size` children.
+
+        :param max_generations: The maximum number of generations to generate. If None, the generation will run indefinitely.
+        :return: A generator of solutions.
+        """
+        prev_best_fitness = 0.0
+        # Generations are counted across `evolve()` calls and resumed runs
+        last_generation = (
+            self.generation + max_generations if max_generations is not None else None
+        )
+        # Select parents in chunks, such that new children become eligible as parents soon
+        chunk_size = max(1, self.population_size // 10)
+
+        while not self.out_of_time:
+            if last_generation is not None and self.generation >= last_generation:
+                break
+            generation = self.generation + 1
+            self.evaluator.short_circuit = generation <= self.short_circuit_generations
+
+            # Align evaluation and fitness with the population; these are cache hits
+            # unless the cache was flushed because of soft constraints.
+            evaluation = []
+            with self.profiler.timer("evaluate_population", increment=self.population):
+                for ind in self.population:
+                    if self.out_of_time:
+                        break
+                    ind_fitness, failing_trees = (
+                        yield from self.evaluator.evaluate_individual(ind)
+                    )
+                    evaluation.append((ind, ind_fitness, failing_trees))
+            if self.out_of_time:
+                break
+            self.evaluation = evaluation
+            self.fitness = Evaluator.fitness_array(evaluation)
+            population_hashes = {hash(ind) for ind in self.population}
+
+            avg_fitness = float(self.fitness.sum()) / self.population_size
+            LOGGER.info(f"Generation {generation} - Average Fitness: {avg_fitness:.2f}")
+
+            offspring = 0
+            while offspring < self.population_size and not self.out_of_time:
+                for parent1, parent2 in self._select_parent_pairs(chunk_size):
+                    children = yield from self._breed(parent1, parent2)
+                    for child in children:
+                        yield from self._replace_worst(child, population_hashes)
+                    offspring += 2
+                    if self.out_of_time:
+                        break
+            if self.out_of_time:
+                # The population is consistent after each child; the generation is just incomplete
+                break
+
+            # For soft constraints, the normalized fitness may change over time as we observe more inputs.
+            self.evaluator.flush_fitness_cache(self.population)
+
+            prev_best_fitness = self._finish_generation(
+                generation, last_generation, prev_best_fitness
             )
 
-            if self.adaptive_tuner.current_max_repetition > current_max_repetitions:
-                self.grammar.set_max_repetition(
-                    self.adaptive_tuner.current_max_repetition
+    def _breed(
+        self, parent1: DerivationTree, parent2: DerivationTree
+    ) -> Generator[DerivationTree, None, list[DerivationTree]]:
+        """
+        Creates children from two parents by crossover and mutation, according to the current rates.
+        Children that are identical to their parents are not returned.
+
+        :param parent1: The first parent.
+        :param parent2: The second parent.
+        :return: A generator of solutions, returning the list of new children.
+        """
+        children = [parent1, parent2]
+        if random.random() < self.adaptive_tuner.crossover_rate:
+            try:
+                index = self.crossover_scheduler.select()
+                start = time.process_time()
+                with self.profiler.timer("crossover", increment=2):
+                    children = list(
+                        self.crossover_scheduler.operators[index].crossover(
+                            self.grammar, parent1, parent2
+                        )
+                    )
+                cpu_time = time.process_time() - start
+                self.crossovers_made += 2
+                children = [
+                    child for child in children if not self.evaluator.is_seen(child)
+                ]
+                yield from self._reward_operator(
+                    self.crossover_scheduler,
+                    index,
+                    cpu_time,
+                    [parent1, parent2],
+                    children,
                 )
+            except Exception as e:
+                print_exception(e, "Error during crossover")
 
-            self.current_max_nodes = self.adaptive_tuner.current_max_nodes
+        new_children = []
+        for child in children:
+            if random.random() < self.adaptive_tuner.mutation_rate:
+                try:
+                    child = yield from self._mutate(child)
+                    if child is None:
+                        continue
+                except Exception as e:
+                    print_exception(e, "Error during mutation")
+            new_children.append(child)
 
-            prev_best_fitness = current_best_fitness
+        parent_hashes = {hash(parent1), hash(parent2)}
+        return [child for child in new_children if hash(child) not in parent_hashes]
 
-            self.adaptive_tuner.log_generation_statistics(
-                generation, self.evaluation, self.population, self.evaluator
+    def _mutate(
+        self, individual: DerivationTree
+    ) -> Generator[DerivationTree, None, Optional[DerivationTree]]:
+        """
+        Mutates `individual` with an operator chosen by the mutation scheduler, and rewards the operator.
+
+        :param individual: The individual to mutate.
+        :return: A generator of solutions, returning the mutated individual,
+            or None if the mutated individual was evaluated before (see `Evaluator.is_seen()`).
+        """
+        index = self.mutation_scheduler.select()
+        start = time.process_time()
+        with self.profiler.timer("mutation", increment=1):
+            mutated = yield from self.mutation_scheduler.operators[index].mutate(
+                individual,
+                self.grammar,
+                self.evaluator.evaluate_individual,
+            )
+        cpu_time = time.process_time() - start
+        self.mutations_made += 1
+        if mutated is not individual and self.evaluator.is_seen(mutated):
+            yield from self._reward_operator(
+                self.mutation_scheduler, index, cpu_time, [individual], []
             )
-            visualize_evaluation(generation, max_generations, self.evaluation)
+            return None
+        yield from self._reward_operator(
+            self.mutation_scheduler, index, cpu_time, [individual], [mutated]
+        )
+        return mutated
+
+    def _reward_operator(
+        self,
+        scheduler: OperatorScheduler,
+        index: int,
+        cpu_time: float,
+        parents: list[DerivationTree],
+        children: list[DerivationTree],
+    ) -> Generator[DerivationTree, None, None]:
+        """
+        Reward operator `index` of `scheduler` with the fitness improvement of the best child over the best parent.
+        Parents and children are evaluated anyway, so their fitness is mostly taken from the cache.
+        If the scheduler has a single operator, there is nothing to choose, and nothing is evaluated.
+
+        :param scheduler: The operator scheduler.
+        :param index: The index of the operator that created the children.
+        :param cpu_time: The CPU time spent in the operator.
+        :param parents: The parents.
+        :param children: The new children; empty if there are none.
+        :return: A generator of solutions.
+        """
+        if len(scheduler.operators) == 1:
+            return
+        improvement = 0.0
+        if children:
+            best_parent = 0.0
+            for parent in parents:
+                fitness, _ = yield from self.evaluator.evaluate_individual(parent)
+                best_parent = max(best_parent, fitness)
+            best_child = 0.0
+            for child in children:
+                fitness, _ = yield from self.evaluator.evaluate_individual(child)
+                best_child = max(best_child, fitness)
+            improvement = best_child - best_parent
+        scheduler.update(index, improvement, cpu_time)
+
+    def _replace_worst(
+        self, child: DerivationTree, population_hashes: set[int]
+    ) -> Generator[DerivationTree, None, None]:
+        """
+        Evaluates and fixes `child`; if it is new and at least as fit as the worst individual,
+        it replaces that individual in the population.
+
+        :param child: The child to insert.
+        :param population_hashes: The set of hashes of the current population; updated in place.
+        :return: A generator of solutions.
+        """
+        fitness, failing_trees = yield from self.evaluator.evaluate_individual(child)
+        child, num_fixes = self.population_manager.fix_individual(child, failing_trees)
+        if num_fixes > 0:
+            self.fixes_made += num_fixes
+            fitness, failing_trees = yield from self.evaluator.evaluate_individual(
+                child
+            )
+
+        key = hash(child)
+        if key in population_hashes:
+            return
+        worst = int(np.argmin(self.fitness))
+        if fitness < self.fitness[worst]:
+            return
+
+        population_hashes.discard(hash(self.population[worst]))
+        population_hashes.add(key)
+        self.population[worst] = child
+        self.evaluation[worst] = (child, fitness, failing_trees)
+        self.fitness[worst] = fitness
+
+    def _finish_generation(
+        self,
+        generation: int,
+        max_generations: Optional[int],
+        prev_best_fitness: float,
+    ) -> float:
+        """
+        Adapts the algorithm parameters and logs statistics at the end of a generation.
+
+        :param generation: The current generation, counted from the start of the run.
+        :param max_generations: The last generation of this `evolve()` call, if any (for visualization).
+        :param prev_best_fitness: The best fitness of the previous generation.
+        :return: The best fitness of the current generation.
+        """
+        current_best_fitness = float(self.fitness.max())
+        current_max_repetitions = self.grammar.get_max_repetition()
+        self.adaptive_tuner.update_parameters(
+            generation,
+            prev_best_fitness,
+            current_best_fitness,
+            self.population,
+            self.evaluator,
+            current_max_repetitions,
+        )
+
+        if self.adaptive_tuner.current_max_repetition > current_max_repetitions:
+            self.grammar.set_max_repetition(self.adaptive_tuner.current_max_repetition)
+
+        self.current_max_nodes = self.adaptive_tuner.current_max_nodes
+
+        self.adaptive_tuner.log_generation_statistics(
+            generation, self.evaluation, self.population, self.evaluator
+        )
+        visualize_evaluation(generation, max_generations, self.evaluation)
+
+        self.profiler.end_generation(
+            generation,
+            best_fitness=current_best_fitness,
+            average_fitness=float(self.fitness.mean()),
+            population_size=len(self.population),
+            fitness_checks=self.evaluator.get_fitness_check_count(),
+            fitness_cache_hit_rate=self.evaluator.get_cache_hit_rate(),
+            evaluations_avoided=self.evaluator.get_evaluations_avoided(),
+        )
+
+        self.generation += 1
+        if self.checkpointer is not None:
+            with self.profiler.timer("checkpoint"):
+                self.checkpointer.save(self)
+        return current_best_fitness
+
+    def _set_out_of_time(self) -> None:
+        self.out_of_time = True
 
     def _evolve_single(
         self,
         max_generations: Optional[int] = None,
         desired_solutions: Optional[int] = None,
         solution_callback: Callable[[DerivationTree, int], None] = lambda _a, _b: None,
+        time_budget: Optional[float] = None,
     ) -> list[DerivationTree]:
         LOGGER.info("---------- Starting evolution ----------")
         start_time = time.time()
@@ -528,9 +1050,18 @@ class Fandango:
         for solution in self.generate(max_generations=max_generations):
             solution_callback(solution, len(solutions))
             solutions.append(solution)
+            for operator in self.crossover_scheduler.operators:
+                if isinstance(operator, SpliceCrossover):
+                    operator.add_to_corpus(solution)
             if desired_solutions is not None and len(solutions) >= desired_solutions:
                 found_enough_solutions = True
                 break
+        if self.out_of_time:
+            LOGGER.info(f"Time budget of {time_budget} seconds exhausted")
+        if self.checkpointer is not None:
+            self.checkpointer.save(self, force=True)
+            self.checkpointer.wait()
+
         if solutions:
             average_solutions_fitness = sum(
                 e[1] for e in self.evaluator.evaluate_population(solutions)
@@ -538,9 +1069,7 @@ class Fandango:
         else:
             average_solutions_fitness = 0.0
 
-        average_population_fitness = (
-            sum(e[1] for e in self.evaluation) / self.population_size
-        )
+        average_population_fitness = float(self.fitness.sum()) / self.population_size
 
         clear_visualization()
         self.time_taken = time.time() - start_time
@@ -551,13 +1080,41 @@ class Fandango:
             f"Average fitness of final population: {average_population_fitness:.2f}"
         )
         LOGGER.info(f"Time taken: {self.time_taken:.2f} seconds")
+        if self.time_taken > 0:
+            self.solutions_per_second = len(solutions) / self.time_taken
+            LOGGER.info(f"Solutions per second: {self.solutions_per_second:.2f}")
         LOGGER.debug("---------- FANDANGO statistics ----------")
         LOGGER.debug(f"Fixes made: {self.fixes_made}")
+        manager = self.population_manager
+        if manager.suggestion_cache_lookups > 0:
+            LOGGER.debug(
+                f"Fix suggestion cache hit rate: "
+                f"{manager.suggestion_cache_hits / manager.suggestion_cache_lookups:.2%}"
+            )
         LOGGER.debug(f"Fitness checks: {self.evaluator.get_fitness_check_count()}")
+        LOGGER.debug(
+            f"Constraint results reused from parents: {self.evaluator.get_constraint_results_reused()}"
+        )
+        LOGGER.debug(
+            f"Search memo hit rate: {self.evaluator.get_search_memo_hit_rate():.2%}"
+        )
         LOGGER.debug(f"Crossovers made: {self.crossovers_made}")
         LOGGER.debug(f"Mutations made: {self.mutations_made}")
+        self.crossover_scheduler.log_statistics("Crossover")
+        self.mutation_scheduler.log_statistics("Mutation")
+        seen_set = self.evaluator.seen_set
+        if seen_set is not None:
+            LOGGER.info(
+                f"Evaluations avoided by seen-set: {seen_set.hits} "
+                f"({len(seen_set)} individuals recorded, {seen_set.memory / 1024:.0f} KiB)"
+            )
+        if self.evaluator.guard is not None:
+            LOGGER.info(
+                f"Constraint evaluations stopped by limits: {self.evaluator.get_evaluations_stopped()}"
+            )
 
         self.profiler.log_results()
+        self._report_constraint_profile()
 
         if (
             not found_enough_solutions
@@ -0,0 +1,162 @@
+import os
+import pickle
+import random
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+from fandango import FandangoError
+from fandango.language.tree import DerivationTree, decode_tree, encode_tree
+from fandango.logger import LOGGER
+
+if TYPE_CHECKING:
+    from fandango.evolution.algorithm import Fandango
+
+CHECKPOINT_VERSION = 3
+CHECKPOINT_FILE = "checkpoint.pickle"
+
+
+class Checkpointer:
+    """
+    Periodically saves the state of a `Fandango` run to a directory, such that it can be resumed later.
+
+    The state is captured on the evolution thread; writing it to disk happens in a background thread.
+    Individuals are encoded incrementally: an individual that was already part of the previous checkpoint
+    is not encoded again.
+    """
+
+    def __init__(self, directory: str, interval: int = 5):
+        """
+        :param directory: The directory to write checkpoints to.
+        :param interval: Save a checkpoint every `interval` generations.
+        """
+        self.directory = directory
+        self.interval = max(1, interval)
+        self._encoded: dict[bytes, bytes] = {}
+        self._writer: Optional[threading.Thread] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, CHECKPOINT_FILE)
+
+    def _encode_population(self, population: list[DerivationTree]) -> list[bytes]:
+        encoded: dict[bytes, bytes] = {}
+        for individual in population:
+            fingerprint = individual.fingerprint()
+            if fingerprint in self._encoded:
+                encoded[fingerprint] = self._encoded[fingerprint]
+            else:
+                encoded[fingerprint] = pickle.dumps(
+                    encode_tree(individual), protocol=pickle.HIGHEST_PROTOCOL
+                )
+        # Only keep the individuals of the current population
+        self._encoded = encoded
+        return [encoded[individual.fingerprint()] for individual in population]
+
+    def snapshot(self, fandango: "Fandango") -> dict[str, Any]:
+        """
+        Capture the state of `fandango`. The result does not share mutable data with `fandango`.
+
+        :param fandango: The Fandango instance.
+        :return: The state, to be written with `write()`.
+        """
+        return {
+            "version": CHECKPOINT_VERSION,
+            "generation": fandango.generation,
+            "population": self._encode_population(fandango.population),
+            "random_state": random.getstate(),
+            "evaluator": fandango.evaluator.get_state(),
+            "adaptive_tuner": dict(vars(fandango.adaptive_tuner)),
+            "max_repetition": fandango.grammar.get_max_repetition(),
+            "current_max_nodes": fandango.current_max_nodes,
+            "fixes_made": fandango.fixes_made,
+            "crossovers_made": fandango.crossovers_made,
+            "mutations_made": fandango.mutations_made,
+        }
+
+    def save(self, fandango: "Fandango", force: bool = False) -> None:
+        """
+        Save a checkpoint of `fandango` in the background if the current generation is due (or if `force` is set).
+
+        :param fandango: The Fandango instance.
+        :param force: If True, save regardless of the current generation.
+        """
+        if not force and fandango.generation % self.interval != 0:
+            return
+        state = self.snapshot(fandango)
+        self.wait()
+        self._writer = threading.Thread(target=self.write, args=(state,), daemon=True)
+        self._writer.start()
+
+    def wait(self) -> None:
+        """
+        Wait until the checkpoint being written (if any) is complete.
+        """
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+    def write(self, state: dict[str, Any]) -> None:
+        """
+        Write `state` to the checkpoint directory. The previous checkpoint is replaced atomically,
+        so an interrupted write never leaves a corrupt checkpoint behind.
+
+        :param state: The state, as returned by `snapshot()`.
+        """
+        temp_path = self.path + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "wb") as fp:
+                pickle.dump(state, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path)
+            LOGGER.debug(
+                f"Generation {state['generation']}: saved checkpoint to {self.path!r}"
+            )
+        except Exception as e:
+            LOGGER.error(f"Could not save checkpoint to {self.path!r}: {e}")
+
+    @staticmethod
+    def load(directory: str) -> dict[str, Any]:
+        """
+        Load the checkpoint from `directory`.
+
+        :param directory: The checkpoint directory.
+        :return: The state, to be passed to `restore()`.
+        """
+        path = os.path.join(directory, CHECKPOINT_FILE)
+        try:
+            with open(path, "rb") as fp:
+                state = pickle.load(fp)
+        except FileNotFoundError:
+            raise FandangoError(f"{directory!r}: no checkpoint found")
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise FandangoError(f"{path!r}: unsupported checkpoint version")
+        return state
+
+    @staticmethod
+    def restore(fandango: "Fandango", state: dict[str, Any]) -> list[DerivationTree]:
+        """
+        Restore the state of `fandango` from `state`.
+
+        Fitness caches are keyed by process-specific hashes, so they are not part of the checkpoint;
+        they are rebuilt when the restored population is evaluated.
+
+        :param fandango: The Fandango instance.
+        :param state: The state, as returned by `load()`.
+        :return: The restored population.
+        """
+        random.setstate(state["random_state"])
+        fandango.evaluator.set_state(state["evaluator"])
+        for name, value in state["adaptive_tuner"].items():
+            setattr(fandango.adaptive_tuner, name, value)
+        fandango.grammar.set_max_repetition(state["max_repetition"])
+        fandango.current_max_nodes = state["current_max_nodes"]
+        fandango.generation = state["generation"]
+        fandango.fixes_made = state["fixes_made"]
+        fandango.crossovers_made = state["crossovers_made"]
+        fandango.mutations_made = state["mutations_made"]
+
+        population = [decode_tree(pickle.loads(data)) for data in state["population"]]
+        LOGGER.info(
+            f"Resuming from generation {fandango.generation} with {len(population)} individuals"
+        )
+        return population
@@ -0,0 +1,157 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Sequence, Union
+
+from fandango.constraints.base import Constraint, SoftValue
+from fandango.constraints.fitness import GeneticBase, evaluation_statistics
+from fandango.language.tree import DerivationTree
+
+
+class ConstraintProfile:
+    """Evaluation statistics of a single hard or soft constraint."""
+
+    def __init__(self, constraint: GeneticBase, kind: str):
+        self.constraint = constraint
+        # "hard" or "soft"
+        self.kind = kind
+        # Evaluations on individuals, including those answered from the constraint's cache
+        self.evaluations = 0
+        self.cache_hits = 0
+        # Evaluations that failed (hard constraints), raised an error, or exceeded a limit
+        self.failures = 0
+        # Time spent in evaluations, in seconds
+        self.time = 0.0
+        # Combinations of search results enumerated (pairs compared, for joins), including those of nested constraints
+        self.combinations = 0
+        # Time spent searching derivation trees, in seconds
+        self.search_time = 0.0
+
+    @property
+    def mean_time(self) -> float:
+        return self.time / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        return self.cache_hits / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.evaluations if self.evaluations else 0.0
+
+    def to_dict(self) -> dict[str, Union[str, int, float]]:
+        return {
+            "constraint": str(self.constraint),
+            "kind": self.kind,
+            "evaluations": self.evaluations,
+            "time": self.time,
+            "mean_time": self.mean_time,
+            "combinations": self.combinations,
+            "cache_hit_rate": self.cache_hit_rate,
+            "failure_rate": self.failure_rate,
+            "search_time": self.search_time,
+        }
+
+
+class ConstraintProfiler:
+    """
+    Collects evaluation statistics of each hard and soft constraint, to find the constraints that make a spec slow.
+    The evaluator measures each evaluation of a constraint with `measure()`; `report()` lists the constraints
+    by their total evaluation time.
+    """
+
+    def __init__(self, constraints: Sequence[Union[Constraint, SoftValue]]):
+        """
+        :param constraints: The hard and soft constraints to profile.
+        """
+        self._profiles: dict[int, ConstraintProfile] = {
+            id(constraint): ConstraintProfile(
+                constraint, "soft" if isinstance(constraint, SoftValue) else "hard"
+            )
+            for constraint in constraints
+        }
+
+    def profile(self, constraint: GeneticBase) -> ConstraintProfile:
+        """
+        :return: The statistics of `constraint`.
+        """
+        return self._profiles[id(constraint)]
+
+    @contextmanager
+    def measure(
+        self, constraint: GeneticBase, trees: Sequence[DerivationTree]
+    ) -> Iterator[ConstraintProfile]:
+        """
+        Measure the evaluation of `constraint` on `trees` within this context.
+        Failures are recorded separately (see `record_failure()`).
+
+        :param constraint: The constraint evaluated.
+        :param trees: The individuals it is evaluated on.
+        :return: The statistics of `constraint`.
+        """
+        profile = self.profile(constraint)
+        profile.evaluations += len(trees)
+        profile.cache_hits += sum(
+            constraint.get_hash(tree) in getattr(constraint, "cache", {})
+            for tree in trees
+        )
+        start = time.perf_counter()
+        with evaluation_statistics() as statistics:
+            try:
+                yield profile
+            finally:
+                profile.time += time.perf_counter() - start
+                profile.combinations += statistics.combinations
+                profile.search_time += statistics.search_time
+
+    def record_reused(self, constraint: GeneticBase) -> None:
+        """
+        Record an evaluation of `constraint` whose result was reused from another individual.
+        """
+        profile = self.profile(constraint)
+        profile.evaluations += 1
+        profile.cache_hits += 1
+
+    def record_failure(self, constraint: GeneticBase) -> None:
+        """
+        Record an evaluation of `constraint` that failed or could not be computed.
+        """
+        self.profile(constraint).failures += 1
+
+    def report(self) -> list[ConstraintProfile]:
+        """
+        :return: The statistics of all constraints, most expensive first.
+        """
+        return sorted(self._profiles.values(), key=lambda p: p.time, reverse=True)
+
+    def format_table(self) -> str:
+        """
+        :return: The report as a table.
+        """
+        header = (
+            f"{'kind':<4}  {'evals':>8}  {'total':>9}  {'mean':>9}  {'combinations':>12}  "
+            f"{'cache hits':>10}  {'failures':>8}  {'search':>9}  constraint"
+        )
+        lines = [header]
+        for profile in self.report():
+            lines.append(
+                f"{profile.kind:<4}  {profile.evaluations:>8}  {profile.time:>8.3f}s  "
+                f"{profile.mean_time * 1000:>7.3f}ms  {profile.combinations:>12}  "
+                f"{profile.cache_hit_rate:>10.1%}  {profile.failure_rate:>8.1%}  "
+                f"{profile.search_time:>8.3f}s  {profile.constraint}"
+            )
+        return "\n".join(lines)
+
+    def to_json(self) -> list[dict[str, Any]]:
+        """
+        :return: The report as a JSON-serializable list, most expensive constraint first.
+        """
+        return [profile.to_dict() for profile in self.report()]
+
+    def write_json(self, file: str) -> None:
+        """
+        Write the report to `file` as JSON.
+        """
+        with open(file, "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+            f.write("\n")
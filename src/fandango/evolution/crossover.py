@@ -1,9 +1,11 @@
 import copy
 import random
 from abc import ABC, abstractmethod
+from typing import Optional
 
 
 from fandango.language.grammar import Grammar
+from fandango.language.symbol import NonTerminal
 from fandango.language.tree import DerivationTree
 
 
@@ -15,20 +17,164 @@ class CrossoverOperator(ABC):
         pass
 
 
+class SymbolIndex:
+    """
+    The nonterminal nodes of a tree by symbol, in the order of `DerivationTree.find_all_nodes()`.
+    Read-only nodes are left out unless `exclude_read_only` is False.
+    """
+
+    def __init__(self, tree: DerivationTree, exclude_read_only: bool = True):
+        self.tree = tree
+        self.exclude_read_only = exclude_read_only
+        self.nodes: dict[NonTerminal, list[DerivationTree]] = {}
+        self._add(tree)
+
+    def _add(self, node: DerivationTree) -> None:
+        if node.symbol.is_non_terminal and not (
+            self.exclude_read_only and node.read_only
+        ):
+            self.nodes.setdefault(node.symbol, []).append(node)  # type: ignore[arg-type]
+        for child in node.children:
+            self._add(child)
+        for source in node.sources:
+            self._add(source)
+
+    def common_symbols(self, other: "SymbolIndex") -> list[NonTerminal]:
+        """
+        :return: The symbols that occur in both trees, sorted.
+        """
+        return sorted(self.nodes.keys() & other.nodes.keys())
+
+
+class SymbolIndexCache:
+    """
+    Caches the `SymbolIndex` of trees by their hash, such that individuals that take part in several
+    crossovers (e.g. elites) are only indexed once.
+    """
+
+    def __init__(self, max_size: int = 4096, exclude_read_only: bool = True):
+        self.max_size = max_size
+        self.exclude_read_only = exclude_read_only
+        self._indexes: dict[int, SymbolIndex] = {}
+
+    def get(self, tree: DerivationTree) -> SymbolIndex:
+        key = hash(tree)
+        index = self._indexes.get(key)
+        # Equal trees have equal hashes, but the index refers to the nodes of one tree
+        if index is None or index.tree is not tree:
+            index = SymbolIndex(tree, exclude_read_only=self.exclude_read_only)
+            if key not in self._indexes and len(self._indexes) >= self.max_size:
+                # Evict the oldest entry
+                del self._indexes[next(iter(self._indexes))]
+            self._indexes[key] = index
+        return index
+
+
 class SimpleSubtreeCrossover(CrossoverOperator):
+    def __init__(self):
+        self._index_cache = SymbolIndexCache()
+
     def crossover(
         self, grammar: Grammar, parent1: DerivationTree, parent2: DerivationTree
     ) -> tuple[DerivationTree, DerivationTree]:
-        symbols1 = parent1.get_non_terminal_symbols()
-        symbols2 = parent2.get_non_terminal_symbols()
-        common_symbols = symbols1.intersection(symbols2)
+        index1 = self._index_cache.get(parent1)
+        index2 = self._index_cache.get(parent2)
+        common_symbols = index1.common_symbols(index2)
         if not common_symbols:
             return parent1, parent2
-        symbol = random.choice(sorted(list(common_symbols)))
-        nodes1 = parent1.find_all_nodes(symbol)
-        nodes2 = parent2.find_all_nodes(symbol)
-        node1 = random.choice(nodes1)
-        node2 = random.choice(nodes2)
+        symbol = random.choice(common_symbols)
+        node1 = random.choice(index1.nodes[symbol])
+        node2 = random.choice(index2.nodes[symbol])
         child1 = parent1.replace(grammar, node1, node2)
         child2 = parent2.replace(grammar, node2, node1)
         return child1, child2
+
+
+class SizeAwareSubtreeCrossover(SimpleSubtreeCrossover):
+    """
+    A subtree crossover that only swaps subtrees if both children have at most `max_nodes` nodes
+    (or no more nodes than their parent, if the parent is already larger).
+    Child sizes are computed from the subtree sizes before any child is built.
+    """
+
+    def __init__(self, max_nodes: Optional[int] = None, attempts: int = 10):
+        """
+        :param max_nodes: The maximum number of nodes of a child. If None, `Fandango` sets its `max_nodes`.
+        :param attempts: The number of node pairs to try before giving up and returning the parents.
+        """
+        super().__init__()
+        self.max_nodes = max_nodes
+        self.attempts = attempts
+
+    def crossover(
+        self, grammar: Grammar, parent1: DerivationTree, parent2: DerivationTree
+    ) -> tuple[DerivationTree, DerivationTree]:
+        if self.max_nodes is None:
+            return super().crossover(grammar, parent1, parent2)
+        index1 = self._index_cache.get(parent1)
+        index2 = self._index_cache.get(parent2)
+        common_symbols = index1.common_symbols(index2)
+        if not common_symbols:
+            return parent1, parent2
+
+        size1, size2 = parent1.size(), parent2.size()
+        limit1, limit2 = max(self.max_nodes, size1), max(self.max_nodes, size2)
+        for _ in range(self.attempts):
+            symbol = random.choice(common_symbols)
+            node1 = random.choice(index1.nodes[symbol])
+            node2 = random.choice(index2.nodes[symbol])
+            delta = node2.size() - node1.size()
+            if size1 + delta <= limit1 and size2 - delta <= limit2:
+                child1 = parent1.replace(grammar, node1, node2)
+                child2 = parent2.replace(grammar, node2, node1)
+                return child1, child2
+        return parent1, parent2
+
+
+class SpliceCrossover(CrossoverOperator):
+    """
+    Splices subtrees from a corpus of donor trees (e.g. solutions found so far) into the parents:
+    in each parent, a random subtree is replaced by a subtree with the same symbol from a random donor.
+    Without donors, this is a subtree crossover between the parents.
+    """
+
+    def __init__(
+        self, corpus: Optional[list[DerivationTree]] = None, max_corpus_size: int = 100
+    ):
+        self.corpus: list[DerivationTree] = list(corpus or [])
+        self.max_corpus_size = max_corpus_size
+        # Used without donors; its symbol indexes of the parents are shared with `_splice()`
+        self._subtree_crossover = SimpleSubtreeCrossover()
+        # Donors may also give read-only subtrees
+        self._donor_index_cache = SymbolIndexCache(exclude_read_only=False)
+
+    def add_to_corpus(self, tree: DerivationTree) -> None:
+        """
+        Add `tree` as a donor. Once the corpus is full, a random donor is replaced.
+        """
+        if len(self.corpus) < self.max_corpus_size:
+            self.corpus.append(tree)
+        else:
+            self.corpus[random.randrange(self.max_corpus_size)] = tree
+
+    def _splice(
+        self, grammar: Grammar, parent: DerivationTree, donor: DerivationTree
+    ) -> DerivationTree:
+        index = self._subtree_crossover._index_cache.get(parent)
+        donor_index = self._donor_index_cache.get(donor)
+        common_symbols = index.common_symbols(donor_index)
+        if not common_symbols:
+            return parent
+        symbol = random.choice(common_symbols)
+        node = random.choice(index.nodes[symbol])
+        donor_node = random.choice(donor_index.nodes[symbol])
+        return parent.replace(grammar, node, donor_node)
+
+    def crossover(
+        self, grammar: Grammar, parent1: DerivationTree, parent2: DerivationTree
+    ) -> tuple[DerivationTree, DerivationTree]:
+        if not self.corpus:
+            return self._subtree_crossover.crossover(grammar, parent1, parent2)
+        child1 = self._splice(grammar, parent1, random.choice(self.corpus))
+        child2 = self._splice(grammar, parent2, random.choice(self.corpus))
+        return child1, child2
@@ -1,9 +1,27 @@
+import copy
+import math
 import random
-from typing import Counter, Generator, Union
-
-from fandango.constraints.base import Constraint, SoftValue
-from fandango.constraints.fitness import FailingTree
+import time
+from contextlib import AbstractContextManager, nullcontext
+from typing import Counter, Generator, Optional, Union
+
+import numpy as np
+
+from fandango.constraints.base import (
+    Constraint,
+    ReadSymbolsVisitor,
+    SoftValue,
+    search_symbols,
+)
+from fandango.constraints.fitness import FailingTree, Fitness, GeneticBase
+from fandango.evolution.constraint_profiler import ConstraintProfiler
+from fandango.evolution.guard import EvaluationGuard, EvaluationLimitExceeded
+from fandango.evolution.profiler import active_profiler
+from fandango.evolution.seenset import SeenSet
 from fandango.language.grammar import DerivationTree, Grammar
+from fandango.language.search import search_memo
+from fandango.language.symbol import NonTerminal
+from fandango.language.tree import StepException, TreeEdit
 from fandango.logger import LOGGER
 
 
@@ -26,7 +44,20 @@ class Evaluator:
         self._warnings_are_errors = warnings_are_errors
         self._fitness_cache: dict[int, tuple[float, list[FailingTree]]] = {}
         self._solution_set: set[int] = set()
+        # Stable fingerprints of all solutions, such that solutions are not reported again after resuming
+        self._solution_fingerprints: set[bytes] = set()
         self._checks_made = 0
+        self._cache_lookups = 0
+        self._cache_hits = 0
+        # If set, individuals evaluated before are not evaluated again (see `is_seen()`)
+        self.seen_set: Optional[SeenSet] = None
+        # If set, bounds the time and memory of each constraint evaluation
+        self.guard: Optional[EvaluationGuard] = None
+        # If set, collects evaluation statistics of each constraint
+        self.constraint_profiler: Optional[ConstraintProfiler] = None
+        # Seeded from the state of `random` without advancing it, so runs stay reproducible
+        # under `--random-seed` and draw the same individuals as without NumPy
+        self._rng = np.random.default_rng(random.getstate()[1])
 
         for constraint in constraints:
             if isinstance(constraint, SoftValue):
@@ -36,16 +67,242 @@ class Evaluator:
             else:
                 raise ValueError(f"Invalid constraint type: {type(constraint)}")
 
+        # The symbols each constraint reads, to reuse results of individuals derived from evaluated ones
+        self._hard_constraint_reads: list[frozenset[NonTerminal]] = []
+        for constraint in self._hard_constraints:
+            visitor = ReadSymbolsVisitor()
+            constraint.accept(visitor)
+            self._hard_constraint_reads.append(frozenset(visitor.symbols))
+        self._soft_constraint_reads: list[frozenset[NonTerminal]] = [
+            frozenset().union(
+                *(search_symbols(search) for search in constraint.searches.values())
+            )
+            for constraint in self._soft_constraints
+        ]
+        # Number of constraint results reused from the individual an individual was derived from
+        self._constraint_results_reused = 0
+        # Number of memoized searches (see `search_memo()`), and how many of them were answered from the memo
+        self._search_lookups = 0
+        self._search_hits = 0
+
+        # Per-constraint statistics, used to evaluate constraints most likely to fail (per unit of cost) first
+        self._constraint_evaluations = [0] * len(self._hard_constraints)
+        self._constraint_failures = [0] * len(self._hard_constraints)
+        self._constraint_time = [0.0] * len(self._hard_constraints)
+        self._constraint_order = list(range(len(self._hard_constraints)))
+        self._individuals_evaluated = 0
+        self._short_circuit = False
+        # Keys of cached fitness values that were estimated from a subset of constraints
+        self._estimated_keys: set[int] = set()
+        # Raw soft constraint values of cached individuals (NaN if a value could not be computed),
+        # such that their fitness can be re-normalized without evaluating the constraints again
+        self._soft_values: dict[int, list[float]] = {}
+        # Whether the sketches ingested values since cached individuals were last re-scored
+        self._sketches_updated = False
+
     @property
     def expected_fitness(self) -> float:
         return self._expected_fitness
 
+    @property
+    def short_circuit(self) -> bool:
+        """
+        If True, hard constraints are evaluated in adaptive order and evaluation stops at the first failing
+        constraint; the fitness of such individuals is estimated from the constraints evaluated so far.
+        Individuals that satisfy all hard constraints always get their exact fitness.
+        """
+        return self._short_circuit
+
+    @short_circuit.setter
+    def short_circuit(self, enabled: bool) -> None:
+        if self._short_circuit and not enabled:
+            # Estimated fitness values must not survive the short-circuit phase
+            for key in self._estimated_keys:
+                self._fitness_cache.pop(key, None)
+            self._estimated_keys.clear()
+        self._short_circuit = enabled
+
+    def get_constraint_order(self) -> list[Constraint]:
+        """
+        :return: The hard constraints, ordered by their likelihood to fail per unit of evaluation cost.
+        """
+        return [self._hard_constraints[i] for i in self._constraint_order]
+
+    def _update_constraint_order(self) -> None:
+        def priority(index: int) -> float:
+            evaluations = self._constraint_evaluations[index]
+            # Laplace smoothing, so that rarely evaluated constraints are not ruled out
+            failure_rate = (self._constraint_failures[index] + 1) / (evaluations + 2)
+            mean_time = self._constraint_time[index] / evaluations if evaluations else 0
+            return failure_rate / max(mean_time, 1e-9)
+
+        self._constraint_order.sort(key=priority, reverse=True)
+
+    def get_state(self) -> dict:
+        """
+        :return: A copy of the evaluator state needed to resume evolution (see `Checkpointer`).
+            Fitness caches are not included, as they are keyed by process-specific hashes.
+        """
+        return {
+            "rng": self._rng.bit_generator.state,
+            "solution_fingerprints": set(self._solution_fingerprints),
+            "checks_made": self._checks_made,
+            "constraint_evaluations": list(self._constraint_evaluations),
+            "constraint_failures": list(self._constraint_failures),
+            "constraint_time": list(self._constraint_time),
+            "constraint_order": list(self._constraint_order),
+            "individuals_evaluated": self._individuals_evaluated,
+            "seen_set": (
+                self.seen_set.get_state() if self.seen_set is not None else None
+            ),
+            "sketches": [
+                copy.deepcopy(constraint.sketch)
+                for constraint in self._soft_constraints
+            ],
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restore the evaluator state from `state`, as returned by `get_state()`.
+        """
+        self._rng.bit_generator.state = state["rng"]
+        self._solution_fingerprints = set(state["solution_fingerprints"])
+        self._checks_made = state["checks_made"]
+        self._constraint_evaluations = list(state["constraint_evaluations"])
+        self._constraint_failures = list(state["constraint_failures"])
+        self._constraint_time = list(state["constraint_time"])
+        self._constraint_order = list(state["constraint_order"])
+        self._individuals_evaluated = state["individuals_evaluated"]
+        if self.seen_set is not None and state.get("seen_set") is not None:
+            self.seen_set.set_state(state["seen_set"])
+        for constraint, sketch in zip(self._soft_constraints, state["sketches"]):
+            constraint.sketch = sketch
+
     def get_fitness_check_count(self) -> int:
         """
         :return: The number of fitness checks made so far.
         """
         return self._checks_made
 
+    def get_cache_hit_rate(self) -> float:
+        """
+        :return: The fraction of individual evaluations that were answered from the fitness cache.
+        """
+        return self._cache_hits / self._cache_lookups if self._cache_lookups else 0.0
+
+    def get_search_memo_hit_rate(self) -> float:
+        """
+        :return: The fraction of searches that were answered from the search memo of their individual.
+        """
+        return self._search_hits / self._search_lookups if self._search_lookups else 0.0
+
+    def get_constraint_results_reused(self) -> int:
+        """
+        :return: The number of constraint results reused from the individual an individual was derived from.
+        """
+        return self._constraint_results_reused
+
+    def _reuse_origin_fitness(
+        self,
+        constraint: GeneticBase,
+        reads: frozenset[NonTerminal],
+        individual: DerivationTree,
+        edit: Optional[TreeEdit],
+    ) -> Optional[Fitness]:
+        """
+        If `individual` was derived (by `edit`) from an evaluated individual without touching any symbol
+        `constraint` reads, return the fitness of `constraint` on that individual,
+        with its failing trees mapped to the corresponding nodes of `individual`.
+
+        :return: The reused fitness, or None if `constraint` must be evaluated.
+        """
+        if edit is None or not edit.touched.isdisjoint(reads):
+            return None
+        origin = edit.origin
+        if origin is None:
+            return None
+        cached = constraint.cache.get(constraint.get_hash(origin))
+        if cached is None:
+            return None
+        failing_trees = []
+        try:
+            for failing_tree in cached.failing_trees:
+                if failing_tree.tree.get_path()[0] is not origin:
+                    return None
+                node = individual.get_by_choices_path(
+                    failing_tree.tree.get_choices_path()
+                )
+                failing_trees.append(
+                    FailingTree(node, failing_tree.cause, failing_tree.suggestions)
+                )
+        except (IndexError, StepException):
+            return None
+        fitness = copy.copy(cached)
+        fitness.failing_trees = failing_trees
+        constraint.cache[constraint.get_hash(individual)] = fitness
+        self._constraint_results_reused += 1
+        return fitness
+
+    def is_seen(self, individual: DerivationTree) -> bool:
+        """
+        Check whether `individual` should be skipped because it was evaluated before in this run.
+        Individuals in the fitness cache are not considered seen, as evaluating them is free;
+        the cache only keeps the current population (see `flush_fitness_cache()`).
+
+        :param individual: The individual to check.
+        :return: True if a seen-set is enabled and (probably) contains the individual.
+        """
+        if self.seen_set is None or hash(individual) in self._fitness_cache:
+            return False
+        if individual.fingerprint() in self.seen_set:
+            self.seen_set.hits += 1
+            return True
+        return False
+
+    def _limit(self, constraint: GeneticBase) -> AbstractContextManager:
+        return self.guard.limit(constraint) if self.guard is not None else nullcontext()
+
+    def _measure(
+        self, constraint: GeneticBase, trees: list[DerivationTree]
+    ) -> AbstractContextManager:
+        if self.constraint_profiler is None:
+            return nullcontext()
+        return self.constraint_profiler.measure(constraint, trees)
+
+    def _record_reused(self, constraint: GeneticBase) -> None:
+        if self.constraint_profiler is not None:
+            self.constraint_profiler.record_reused(constraint)
+
+    def _record_failure(self, constraint: GeneticBase) -> None:
+        if self.constraint_profiler is not None:
+            self.constraint_profiler.record_failure(constraint)
+
+    def get_evaluations_stopped(self) -> int:
+        """
+        :return: The number of constraint evaluations stopped because they exceeded a limit of the guard.
+        """
+        return self.guard.exceeded if self.guard is not None else 0
+
+    def get_evaluations_avoided(self) -> int:
+        """
+        :return: The number of evaluations avoided because individuals were found in the seen-set.
+        """
+        return self.seen_set.hits if self.seen_set is not None else 0
+
+    @staticmethod
+    def fitness_array(
+        evaluation: list[tuple[DerivationTree, float, list[FailingTree]]],
+    ) -> np.ndarray:
+        """
+        :param evaluation: The evaluation of a population.
+        :return: The fitness values of the evaluation as a NumPy array, aligned with the evaluation.
+        """
+        return np.fromiter(
+            (fitness for _ind, fitness, _failing_trees in evaluation),
+            dtype=np.float64,
+            count=len(evaluation),
+        )
+
     def compute_mutation_pool(
         self, population: list[DerivationTree]
     ) -> list[DerivationTree]:
@@ -57,18 +314,114 @@ class Evaluator:
         :param population: The population to compute the mutation pool for.
         :return: The mutation pool.
         """
-        weights = [self._fitness_cache[hash(ind)][0] for ind in population]
-        if not all(w == 0 for w in weights):
-            return random.choices(population, weights=weights, k=len(population))
-        else:
+        weights = np.fromiter(
+            (self._fitness_cache[hash(ind)][0] for ind in population),
+            dtype=np.float64,
+            count=len(population),
+        )
+        total = weights.sum()
+        if total <= 0:
             return population
-
-    def flush_fitness_cache(self) -> None:
+        picks = self._rng.choice(
+            len(population), size=len(population), p=weights / total
+        )
+        return [population[i] for i in picks.tolist()]
+
+    def flush_fitness_cache(
+        self, population: Optional[list[DerivationTree]] = None
+    ) -> None:
         """
-        For soft constraints, the normalized fitness may change over time as we observe more inputs, this method flushes the fitness cache if the grammar contains any soft constraints.
+        For soft constraints, the normalized fitness may change over time as we observe more inputs.
+        This method re-normalizes the cached fitness values against all soft constraint values observed so far,
+        without evaluating the constraints again.
+
+        If a seen-set is enabled, the fitness values of individuals outside `population` are evicted;
+        the seen-set keeps such individuals from being evaluated again (see `is_seen()`).
+
+        :param population: The current population, whose fitness values are kept.
         """
+        if self.seen_set is not None and population is not None:
+            keep = {hash(individual) for individual in population}
+            self._fitness_cache = {
+                key: value for key, value in self._fitness_cache.items() if key in keep
+            }
+            self._soft_values = {
+                key: values for key, values in self._soft_values.items() if key in keep
+            }
+            self._estimated_keys &= keep
         if len(self._soft_constraints) > 0:
-            self._fitness_cache = {}
+            self._update_soft_normalization()
+
+    def _update_soft_normalization(self) -> None:
+        """
+        If the sketches changed, re-score all cached individuals with soft constraint values
+        in one vectorized pass.
+        """
+        if not self._sketches_updated:
+            return
+        self._sketches_updated = False
+
+        # Forget the values of individuals that are no longer cached
+        self._soft_values = {
+            key: values
+            for key, values in self._soft_values.items()
+            if key in self._fitness_cache
+        }
+        if not self._soft_values:
+            return
+        keys = list(self._soft_values)
+        soft_fitness = self._score_soft_values(
+            np.array([self._soft_values[key] for key in keys], dtype=np.float64)
+        )
+        num_hard = len(self._hard_constraints)
+        num_soft = len(self._soft_constraints)
+        for key, soft in zip(keys, soft_fitness.tolist()):
+            _old_fitness, failing_trees = self._fitness_cache[key]
+            fitness = (num_hard + soft * num_soft) / (num_hard + num_soft)
+            if fitness >= self._expected_fitness and key not in self._solution_set:
+                # Evaluate again, such that the new solution is reported
+                del self._fitness_cache[key]
+                del self._soft_values[key]
+            else:
+                self._fitness_cache[key] = (fitness, failing_trees)
+
+    def _score_new_soft_values(
+        self, keys: list[int], values: list[list[float]]
+    ) -> np.ndarray:
+        """
+        Ingest the soft constraint values of newly evaluated individuals into the sketches
+        (one batch per constraint), then score them; as with a t-digest, a value is scored
+        against a sketch that includes it. The values are kept, such that the individuals can be
+        re-scored as the sketches change (see `_update_soft_normalization()`).
+
+        :param keys: The fitness cache keys of the individuals.
+        :param values: The raw soft constraint values of each individual.
+        :return: The normalized soft fitness of each individual, in [0, 1].
+        """
+        rows = np.array(values, dtype=np.float64).reshape(
+            len(values), len(self._soft_constraints)
+        )
+        for index, constraint in enumerate(self._soft_constraints):
+            constraint.sketch.update_batch(rows[:, index])
+        self._sketches_updated = True
+        self._soft_values.update(zip(keys, values))
+        return self._score_soft_values(rows)
+
+    def _score_soft_values(self, values: np.ndarray) -> np.ndarray:
+        """
+        :param values: The raw soft constraint values, one row per individual and one column per soft constraint.
+        :return: The normalized soft fitness of each individual, in [0, 1].
+        """
+        missing = np.isnan(values)
+        scores = np.empty(values.shape, dtype=np.float64)
+        for index, constraint in enumerate(self._soft_constraints):
+            normalized = constraint.sketch.score(values[:, index])
+            if constraint.optimization_goal == "max":
+                scores[:, index] = normalized
+            else:  # "min"
+                scores[:, index] = 1 - normalized
+        scores[missing] = 0.0
+        return scores.mean(axis=1)
 
     def compute_diversity_bonus(self, individuals: list[DerivationTree]) -> list[float]:
         ind_kpaths = [
@@ -88,91 +441,405 @@ class Evaluator:
         return bonus
 
     def evaluate_hard_constraints(
-        self, individual: DerivationTree
+        self, individual: DerivationTree, edit: Optional[TreeEdit] = None
     ) -> tuple[float, list[FailingTree]]:
-        if len(self._hard_constraints) == 0:
-            return 1.0, []
-
-        hard_fitness = 0.0
-        failing_trees: list[FailingTree] = []
-        for constraint in self._hard_constraints:
-            try:
-                result = constraint.fitness(individual)
-
-                if result.success:
-                    hard_fitness += result.fitness()
-                else:
-                    failing_trees.extend(result.failing_trees)
-                    hard_fitness += result.fitness()
-                self._checks_made += 1
-            except Exception as e:
-                LOGGER.error(f"Error evaluating hard constraint {constraint}: {e}")
-                hard_fitness += 0.0
-        hard_fitness /= len(self._hard_constraints)
-        return hard_fitness, failing_trees
+        """
+        :param individual: The individual to evaluate.
+        :param edit: The edit `individual` was derived by; results of constraints it does not affect are reused.
+        :return: The hard fitness and the failing trees; zero fitness if an evaluation exceeded a limit.
+        """
+        (result,) = self._evaluate_hard_constraints([individual], [edit])
+        if result is None:
+            return 0.0, []
+        fitness, failing_trees, _estimated = result
+        return fitness, failing_trees
 
     def evaluate_soft_constraints(
-        self, individual: DerivationTree
-    ) -> tuple[float, list[FailingTree]]:
-        soft_fitness = 0.0
-        failing_trees: list[FailingTree] = []
-        for constraint in self._soft_constraints:
-            try:
-                result = constraint.fitness(individual)
-
-                # failing_trees are required for mutations;
-                # with soft constraints, we never know when they are fully optimized.
-                failing_trees.extend(result.failing_trees)
-
-                constraint.tdigest.update(result.fitness())
-                normalized_fitness = constraint.tdigest.score(result.fitness())
-
-                if constraint.optimization_goal == "max":
-                    soft_fitness += normalized_fitness
-                else:  # "min"
-                    soft_fitness += 1 - normalized_fitness
-            except Exception as e:
-                LOGGER.error(f"Error evaluating soft constraint {constraint}: {e}")
-                soft_fitness += 0.0
+        self, individual: DerivationTree, edit: Optional[TreeEdit] = None
+    ) -> tuple[list[float], list[FailingTree]]:
+        """
+        Evaluate the soft constraints on `individual`.
+        The values are normalized later (see `_score_soft_values()`).
 
-        soft_fitness /= len(self._soft_constraints)
-        return soft_fitness, failing_trees
+        :param individual: The individual to evaluate.
+        :param edit: The edit `individual` was derived by; results of constraints it does not affect are reused.
+        :return: The raw value of each soft constraint (NaN if it could not be computed) and the failing trees.
+        """
+        (result,) = self._evaluate_soft_constraints([individual], [edit])
+        if result is None:
+            return [math.nan] * len(self._soft_constraints), []
+        return result
 
     def evaluate_individual(
         self,
         individual: DerivationTree,
     ) -> Generator[DerivationTree, None, tuple[float, list[FailingTree]]]:
         key = hash(individual)
+        # The edit describes the individual as created; it no longer applies if the individual is modified
+        edit, individual.edit = individual.edit, None
+        self._cache_lookups += 1
         if key in self._fitness_cache:
+            self._cache_hits += 1
             return self._fitness_cache[key]
 
-        fitness, failing_trees = self.evaluate_hard_constraints(individual)
+        # Constraints mentioning the same searches share their results
+        with search_memo() as memo:
+            ((fitness, failing_trees, estimated),) = self._evaluate_constraints(
+                [individual], [key], [edit]
+            )
+        self._search_lookups += memo.lookups
+        self._search_hits += memo.hits
 
-        if self._soft_constraints:
-            if fitness < 1.0:
-                fitness = (
-                    fitness
-                    * len(self._hard_constraints)
-                    / (len(self._hard_constraints) + len(self._soft_constraints))
-                )
-            else:  # fitness from hard constraints == 1.0
-                soft_fitness, soft_failing_trees = self.evaluate_soft_constraints(
-                    individual
+        yield from self._record(individual, key, fitness, failing_trees, estimated)
+        return fitness, failing_trees
+
+    @staticmethod
+    def _log_stopped(e: EvaluationLimitExceeded, individual: DerivationTree) -> None:
+        LOGGER.warning(
+            f"Evaluation of {e.constraint} {e.reason} on {str(individual)!r}; "
+            f"assigning zero fitness"
+        )
+
+    def _record(
+        self,
+        individual: DerivationTree,
+        key: int,
+        fitness: float,
+        failing_trees: list[FailingTree],
+        estimated: bool,
+    ) -> Generator[DerivationTree, None, None]:
+        """
+        Add the fitness of an evaluated individual to the cache, and yield it if it is a new solution.
+        """
+        if (
+            not estimated
+            and fitness >= self._expected_fitness
+            and key not in self._solution_set
+        ):
+            self._solution_set.add(key)
+            fingerprint = individual.fingerprint()
+            if fingerprint not in self._solution_fingerprints:
+                self._solution_fingerprints.add(fingerprint)
+                yield individual
+
+        if estimated:
+            self._estimated_keys.add(key)
+        if self.seen_set is not None:
+            self.seen_set.add(individual.fingerprint())
+        self._fitness_cache[key] = (fitness, failing_trees)
+
+    def _fitness_batch(
+        self, constraint: GeneticBase, trees: list[DerivationTree]
+    ) -> list[Union[Fitness, BaseException]]:
+        """
+        Calculate the fitness of each of `trees` with `constraint.fitness_batch()`. If that fails, or if the
+        evaluations are bounded by the guard, the trees are evaluated one by one.
+        :return: The fitness of each tree, or the error its evaluation raised
+        (including `EvaluationLimitExceeded`).
+        """
+        if not trees:
+            return []
+        if self.guard is None and len(trees) > 1:
+            try:
+                return list(constraint.fitness_batch(trees))
+            except Exception:
+                # Find the trees that fail
+                pass
+        results: list[Union[Fitness, BaseException]] = []
+        for tree in trees:
+            try:
+                with self._limit(constraint):
+                    results.append(constraint.fitness(tree))
+            except (Exception, EvaluationLimitExceeded) as e:
+                results.append(e)
+        return results
+
+    def _constraint_results(
+        self,
+        constraint: GeneticBase,
+        reads: frozenset[NonTerminal],
+        individuals: list[DerivationTree],
+        edits: list[Optional[TreeEdit]],
+        active: list[int],
+    ) -> dict[int, Union[Fitness, BaseException]]:
+        """
+        Evaluate `constraint` on the `active` individuals at once, reusing results of individuals
+        whose edit does not affect the symbols it `reads` (see `_reuse_origin_fitness()`).
+
+        :return: For each active individual, its fitness or the error its evaluation raised.
+        """
+        results: dict[int, Union[Fitness, BaseException]] = {}
+        to_evaluate = []
+        for i in active:
+            reused = self._reuse_origin_fitness(
+                constraint, reads, individuals[i], edits[i]
+            )
+            if reused is None:
+                to_evaluate.append(i)
+            else:
+                results[i] = reused
+                self._record_reused(constraint)
+        trees = [individuals[i] for i in to_evaluate]
+        with self._measure(constraint, trees):
+            batch = self._fitness_batch(constraint, trees)
+        results.update(zip(to_evaluate, batch))
+        return results
+
+    @staticmethod
+    def _record_span(kind: str, index: int, start_time: float, count: int) -> None:
+        """
+        Record the evaluation of constraint `index` on `count` individuals in the active profiler, if any.
+        """
+        profiler = active_profiler()
+        if profiler is not None:
+            profiler.record(
+                f"{kind}.fitness[{index}]",
+                start_time,
+                time.perf_counter(),
+                count=count,
+                name=f"{kind}.fitness",
+                args={"constraint": index, "individuals": count},
+            )
+
+    def _evaluate_hard_constraints(
+        self, individuals: list[DerivationTree], edits: list[Optional[TreeEdit]]
+    ) -> list[Optional[tuple[float, list[FailingTree], bool]]]:
+        """
+        Evaluate the hard constraints on `individuals` at once, constraint by constraint.
+        When short-circuiting, the evaluation of an individual stops at its first failing constraint.
+
+        :param individuals: The individuals to evaluate.
+        :param edits: The edits the individuals were derived by; results of constraints they do not affect are reused.
+        :return: For each individual, the hard fitness, the failing trees, and whether the fitness is an estimate
+        because evaluation was short-circuited; or None if an evaluation exceeded a limit of the guard.
+        """
+        if len(self._hard_constraints) == 0:
+            return [(1.0, [], False) for _ in individuals]
+
+        previous = self._individuals_evaluated
+        self._individuals_evaluated += len(individuals)
+        if previous // 100 != self._individuals_evaluated // 100:
+            self._update_constraint_order()
+
+        if self._short_circuit:
+            order = self._constraint_order
+        else:
+            # Keep the declaration order, such that failing trees are reported deterministically
+            order = range(len(self._hard_constraints))
+
+        hard_fitness = [0.0] * len(individuals)
+        failing_trees: list[list[FailingTree]] = [[] for _ in individuals]
+        evaluated = [0] * len(individuals)
+        stopped = [False] * len(individuals)
+        # The individuals whose evaluation continues
+        active = list(range(len(individuals)))
+        for index in order:
+            if not active:
+                break
+            constraint = self._hard_constraints[index]
+            start_time = time.perf_counter()
+            results = self._constraint_results(
+                constraint,
+                self._hard_constraint_reads[index],
+                individuals,
+                edits,
+                active,
+            )
+
+            still_active = []
+            for i in active:
+                result = results[i]
+                if isinstance(result, EvaluationLimitExceeded):
+                    self._log_stopped(result, individuals[i])
+                    stopped[i] = True
+                    success = False
+                elif isinstance(result, Exception):
+                    LOGGER.error(
+                        f"Error evaluating hard constraint {constraint}: {result}"
+                    )
+                    success = False
+                else:
+                    success = result.success
+                    if not success:
+                        failing_trees[i].extend(result.failing_trees)
+                    hard_fitness[i] += result.fitness()
+                    self._checks_made += 1
+                self._constraint_evaluations[index] += 1
+                evaluated[i] += 1
+                if not success:
+                    # Constraints exceeding a limit are evaluated last when short-circuiting
+                    self._constraint_failures[index] += 1
+                    self._record_failure(constraint)
+                if not stopped[i] and (success or not self._short_circuit):
+                    still_active.append(i)
+            active = still_active
+
+            self._constraint_time[index] += time.perf_counter() - start_time
+            self._record_span("Constraint", index, start_time, len(results))
+
+        return [
+            (
+                None
+                if stopped[i]
+                else (
+                    hard_fitness[i] / evaluated[i],
+                    failing_trees[i],
+                    evaluated[i] < len(self._hard_constraints),
                 )
+            )
+            for i in range(len(individuals))
+        ]
 
-                failing_trees.extend(soft_failing_trees)
+    def _evaluate_soft_constraints(
+        self, individuals: list[DerivationTree], edits: list[Optional[TreeEdit]]
+    ) -> list[Optional[tuple[list[float], list[FailingTree]]]]:
+        """
+        Evaluate the soft constraints on `individuals` at once, constraint by constraint.
+        The values are normalized later (see `_score_new_soft_values()`).
 
-                fitness = (
-                    fitness * len(self._hard_constraints)
-                    + soft_fitness * len(self._soft_constraints)
-                ) / (len(self._hard_constraints) + len(self._soft_constraints))
+        :param individuals: The individuals to evaluate.
+        :param edits: The edits the individuals were derived by; results of constraints they do not affect are reused.
+        :return: For each individual, the raw value of each soft constraint (NaN if it could not be computed)
+        and the failing trees; or None if an evaluation exceeded a limit of the guard.
+        """
+        values: list[list[float]] = [[] for _ in individuals]
+        failing_trees: list[list[FailingTree]] = [[] for _ in individuals]
+        stopped = [False] * len(individuals)
+        for index, constraint in enumerate(self._soft_constraints):
+            start_time = time.perf_counter()
+            active = [i for i in range(len(individuals)) if not stopped[i]]
+            results = self._constraint_results(
+                constraint,
+                self._soft_constraint_reads[index],
+                individuals,
+                edits,
+                active,
+            )
 
-        if fitness >= self._expected_fitness and key not in self._solution_set:
-            self._solution_set.add(key)
-            yield individual
+            for i in active:
+                result = results[i]
+                if isinstance(result, EvaluationLimitExceeded):
+                    self._log_stopped(result, individuals[i])
+                    self._record_failure(constraint)
+                    stopped[i] = True
+                    continue
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    # failing_trees are required for mutations;
+                    # with soft constraints, we never know when they are fully optimized.
+                    failing_trees[i].extend(result.failing_trees)
+                    try:
+                        values[i].append(float(result.fitness()))
+                    except OverflowError:  # Huge integers
+                        values[i].append(math.copysign(math.inf, result.fitness()))
+                except Exception as e:
+                    LOGGER.error(f"Error evaluating soft constraint {constraint}: {e}")
+                    values[i].append(math.nan)
+                    self._record_failure(constraint)
+            self._record_span("SoftValue", index, start_time, len(results))
 
-        self._fitness_cache[key] = (fitness, failing_trees)
-        return fitness, failing_trees
+        return [
+            None if stopped[i] else (values[i], failing_trees[i])
+            for i in range(len(individuals))
+        ]
+
+    def _evaluate_constraints(
+        self,
+        individuals: list[DerivationTree],
+        keys: list[int],
+        edits: list[Optional[TreeEdit]],
+    ) -> list[tuple[float, list[FailingTree], bool]]:
+        """
+        Evaluate the hard constraints and, on individuals that satisfy them all, the soft constraints
+        on `individuals` at once. The soft constraint values of all individuals are normalized at once.
+        Individuals whose evaluation exceeded a limit of the guard get zero fitness.
+
+        :param individuals: The individuals to evaluate.
+        :param keys: The fitness cache keys of the individuals.
+        :param edits: The edits the individuals were derived by, if any.
+        :return: For each individual, the fitness, the failing trees, and whether the fitness is an estimate.
+        """
+        results = [
+            result if result is not None else (0.0, [], False)
+            for result in self._evaluate_hard_constraints(individuals, edits)
+        ]
+        if not self._soft_constraints:
+            return results
+
+        hard_count = len(self._hard_constraints)
+        soft_count = len(self._soft_constraints)
+        satisfied = []
+        for i, (fitness, failing_trees, estimated) in enumerate(results):
+            if fitness < 1.0 or estimated:
+                results[i] = (
+                    fitness * hard_count / (hard_count + soft_count),
+                    failing_trees,
+                    estimated,
+                )
+            else:  # fitness from hard constraints == 1.0
+                satisfied.append(i)
+        soft_results = self._evaluate_soft_constraints(
+            [individuals[i] for i in satisfied], [edits[i] for i in satisfied]
+        )
+
+        scored: list[tuple[int, list[float]]] = []
+        for i, soft_result in zip(satisfied, soft_results):
+            if soft_result is None:
+                results[i] = (0.0, [], False)
+                continue
+            soft_values, soft_failing_trees = soft_result
+            results[i][1].extend(soft_failing_trees)
+            scored.append((i, soft_values))
+
+        if scored:
+            soft_fitness = self._score_new_soft_values(
+                [keys[i] for i, _ in scored],
+                [soft_values for _, soft_values in scored],
+            )
+            for (i, _), score in zip(scored, soft_fitness):
+                fitness, failing_trees, estimated = results[i]
+                results[i] = (
+                    (fitness * hard_count + float(score) * soft_count)
+                    / (hard_count + soft_count),
+                    failing_trees,
+                    estimated,
+                )
+        return results
+
+    def _evaluate_batch(
+        self, individuals: list[DerivationTree]
+    ) -> Generator[DerivationTree, None, None]:
+        """
+        Evaluate the `individuals` that are not in the fitness cache at once, constraint by constraint
+        (see `GeneticBase.fitness_batch()`), and add them to the cache. New solutions are yielded.
+        """
+        pending: dict[int, tuple[DerivationTree, Optional[TreeEdit]]] = {}
+        for individual in individuals:
+            key = hash(individual)
+            # The edit describes the individual as created; it no longer applies if the individual is modified
+            edit, individual.edit = individual.edit, None
+            self._cache_lookups += 1
+            if key in self._fitness_cache or key in pending:
+                self._cache_hits += 1
+                continue
+            pending[key] = (individual, edit)
+        if not pending:
+            return
+
+        keys = list(pending)
+        batch = [individual for individual, _ in pending.values()]
+        edits = [edit for _, edit in pending.values()]
+        # Constraints mentioning the same searches share their results; the memo holds those of the whole batch
+        with search_memo() as memo:
+            results = self._evaluate_constraints(batch, keys, edits)
+        self._search_lookups += memo.lookups
+        self._search_hits += memo.hits
+
+        for individual, key, (fitness, failing_trees, estimated) in zip(
+            batch, keys, results
+        ):
+            yield from self._record(individual, key, fitness, failing_trees, estimated)
 
     def evaluate_population(
         self,
@@ -180,10 +847,21 @@ class Evaluator:
     ) -> Generator[
         DerivationTree, None, list[tuple[DerivationTree, float, list[FailingTree]]]
     ]:
-        evaluation: list[tuple[DerivationTree, float, list[FailingTree]]] = []
-        for ind in population:
-            ind_eval = yield from self.evaluate_individual(ind)
-            evaluation.append((ind, *ind_eval))
+        yield from self._evaluate_batch(population)
+        evaluation: list[tuple[DerivationTree, float, list[FailingTree]]] = [
+            (ind, *self._fitness_cache[hash(ind)]) for ind in population
+        ]
+
+        if self._soft_constraints and self._sketches_updated:
+            # Re-score the whole population against the values observed so far
+            self._update_soft_normalization()
+            for i, (ind, _fitness, _failing_trees) in enumerate(evaluation):
+                key = hash(ind)
+                if key in self._fitness_cache:
+                    ind_eval = self._fitness_cache[key]
+                else:
+                    ind_eval = yield from self.evaluate_individual(ind)
+                evaluation[i] = (ind, *ind_eval)
 
         if self._diversity_k > 0 and self._diversity_weight > 0:
             bonuses = self.compute_diversity_bonus(population)
@@ -199,26 +877,86 @@ class Evaluator:
         evaluation: list[tuple[DerivationTree, float, list[FailingTree]]],
         elitism_rate: float,
         population_size: int,
+        fitness: Optional[np.ndarray] = None,
     ) -> list[DerivationTree]:
-        return [
-            x[0]
-            for x in sorted(evaluation, key=lambda x: x[1], reverse=True)[
-                : int(elitism_rate * population_size)
-            ]
-        ]
+        """
+        Selects the fittest individuals of the evaluation, best first.
+
+        :param evaluation: The evaluation of the population.
+        :param elitism_rate: The share of the population to preserve.
+        :param population_size: The size of the population.
+        :param fitness: The fitness values aligned with `evaluation`; computed if not given.
+        :return: The elites.
+        """
+        if fitness is None:
+            fitness = self.fitness_array(evaluation)
+        k = min(int(elitism_rate * population_size), len(evaluation))
+        if k <= 0:
+            return []
+        if k < len(fitness):
+            top = np.argpartition(-fitness, k - 1)[:k]
+        else:
+            top = np.arange(len(fitness))
+        top = top[np.argsort(-fitness[top], kind="stable")]
+        return [evaluation[i][0] for i in top.tolist()]
 
     def tournament_selection(
         self,
         evaluation: list[tuple[DerivationTree, float, list[FailingTree]]],
         tournament_size: int,
+        fitness: Optional[np.ndarray] = None,
     ) -> tuple[DerivationTree, DerivationTree]:
-        tournament = random.sample(evaluation, k=min(tournament_size, len(evaluation)))
-        tournament.sort(key=lambda x: x[1], reverse=True)
-        parent1 = tournament[0][0]
+        if fitness is None:
+            fitness = self.fitness_array(evaluation)
+        contestants = self._rng.choice(
+            len(evaluation), size=min(tournament_size, len(evaluation)), replace=False
+        )
+        tournament = contestants[np.argsort(-fitness[contestants], kind="stable")]
+        tournament = [evaluation[i][0] for i in tournament.tolist()]
+        parent1 = tournament[0]
         if len(tournament) == 2:
-            parent2 = tournament[1][0] if tournament[1][0] != parent1 else parent1
+            parent2 = tournament[1] if tournament[1] != parent1 else parent1
         else:
-            parent2 = (
-                tournament[1][0] if tournament[1][0] != parent1 else tournament[2][0]
-            )
+            parent2 = tournament[1] if tournament[1] != parent1 else tournament[2]
         return parent1, parent2
+
+    def tournament_selection_batch(
+        self,
+        evaluation: list[tuple[DerivationTree, float, list[FailingTree]]],
+        tournament_size: int,
+        num_tournaments: int,
+        fitness: Optional[np.ndarray] = None,
+    ) -> list[tuple[DerivationTree, DerivationTree]]:
+        """
+        Runs `num_tournaments` tournaments at once. Unlike `tournament_selection`, contestants are drawn with replacement,
+        so that all tournaments can be drawn in a single vectorized step.
+
+        :param evaluation: The evaluation of the population.
+        :param tournament_size: The number of contestants per tournament.
+        :param num_tournaments: The number of tournaments (i.e., parent pairs) to run.
+        :param fitness: The fitness values aligned with `evaluation`; computed if not given.
+        :return: A list of `num_tournaments` parent pairs.
+        """
+        if num_tournaments <= 0 or not evaluation:
+            return []
+        if fitness is None:
+            fitness = self.fitness_array(evaluation)
+        rows = np.arange(num_tournaments)
+        contestants = self._rng.integers(
+            0, len(evaluation), size=(num_tournaments, max(1, tournament_size))
+        )
+        scores = fitness[contestants]
+        winners1 = contestants[rows, np.argmax(scores, axis=1)]
+
+        # The runner-up is the best contestant that is not the winner, if any
+        scores = np.where(contestants == winners1[:, None], -np.inf, scores)
+        runner_up = np.argmax(scores, axis=1)
+        winners2 = np.where(
+            np.isneginf(scores[rows, runner_up]),
+            winners1,
+            contestants[rows, runner_up],
+        )
+        return [
+            (evaluation[i][0], evaluation[j][0])
+            for i, j in zip(winners1.tolist(), winners2.tolist())
+        ]
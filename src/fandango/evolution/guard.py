@@ -0,0 +1,139 @@
+"""
+Bound the time and memory of single constraint evaluations, such that a single slow or memory-hungry
+constraint evaluation cannot stall or crash a run. Evaluations that exceed a limit are stopped
+and get zero fitness.
+"""
+
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from fandango.logger import LOGGER
+
+# Interval (in seconds) at which the memory of a running evaluation is checked
+MEMORY_CHECK_INTERVAL = 0.01
+
+
+class EvaluationLimitExceeded(BaseException):
+    """
+    Raised within a constraint evaluation that exceeds its time or memory limit.
+    This is a `BaseException`, such that constraints that catch errors of their expressions do not catch it.
+    """
+
+    def __init__(self, constraint: Any, reason: str):
+        super().__init__(f"{reason} when evaluating {constraint}")
+        self.constraint = constraint
+        self.reason = reason
+
+
+class EvaluationGuard:
+    """
+    Bounds the time and memory of single constraint evaluations, in-process.
+
+    While an evaluation is running, an interval timer (`SIGALRM`) interrupts it once its time limit is exceeded,
+    and periodically checks the memory it allocated (as traced by `tracemalloc`).
+    If tracing is not already active, it is only active during memory-limited evaluations,
+    as it slows down every allocation.
+    Interrupts take effect at the next Python bytecode, or whenever long-running C code (such as a regular
+    expression match) checks for signals.
+    Timers are only available in the main thread of Unix processes; elsewhere, evaluations are not bounded.
+    """
+
+    def __init__(
+        self, time_limit: Optional[float] = None, memory_limit: Optional[int] = None
+    ):
+        """
+        :param time_limit: The maximum time of an evaluation, in seconds.
+        :param memory_limit: The maximum memory an evaluation may allocate, in bytes.
+        """
+        if time_limit is not None and time_limit <= 0:
+            raise ValueError(f"Time limit must be positive, but is {time_limit}")
+        if memory_limit is not None and memory_limit <= 0:
+            raise ValueError(f"Memory limit must be positive, but is {memory_limit}")
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        # Number of evaluations stopped because they exceeded a limit
+        self.exceeded = 0
+        self._constraint: Any = None
+        self._deadline: Optional[float] = None
+        self._memory_baseline = 0
+        self._warned = False
+
+    @property
+    def available(self) -> bool:
+        """:return: True if evaluations can be bounded in the current thread."""
+        return (
+            hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+        )
+
+    @contextmanager
+    def limit(self, constraint: Any) -> Iterator[None]:
+        """
+        Bound the evaluation of `constraint` within this context.
+
+        :param constraint: The constraint evaluated, to report when a limit is exceeded.
+        :raises EvaluationLimitExceeded: If the evaluation exceeds a limit.
+        """
+        limited = self.time_limit is not None or self.memory_limit is not None
+        if not limited or not self.available:
+            if limited and not self._warned:
+                LOGGER.warning(
+                    "Cannot limit constraint evaluations outside of the main thread of a Unix process"
+                )
+                self._warned = True
+            yield
+            return
+
+        first = interval = self.time_limit or 0.0
+        started_tracing = False
+        if self.memory_limit is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            self._memory_baseline = tracemalloc.get_traced_memory()[0]
+            first = interval = min(
+                self.time_limit or MEMORY_CHECK_INTERVAL, MEMORY_CHECK_INTERVAL
+            )
+        self._deadline = (
+            time.perf_counter() + self.time_limit if self.time_limit else None
+        )
+        self._constraint = constraint
+        previous_handler = signal.signal(signal.SIGALRM, self._check)
+        signal.setitimer(signal.ITIMER_REAL, first, interval)
+        try:
+            yield
+        except MemoryError:
+            self.exceeded += 1
+            raise EvaluationLimitExceeded(constraint, "out of memory")
+        finally:
+            self._constraint = None
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+            if started_tracing:
+                tracemalloc.stop()
+
+    def _check(self, _signum: int, _frame: Any) -> None:
+        constraint = self._constraint
+        if constraint is None:
+            # The evaluation just finished
+            return
+        if self.memory_limit is None or (
+            self._deadline is not None and time.perf_counter() >= self._deadline
+        ):
+            # Without a memory limit, the timer only fires at the deadline
+            reason = f"exceeded the time limit of {self.time_limit}s"
+        elif (
+            tracemalloc.get_traced_memory()[1] - self._memory_baseline
+            > self.memory_limit
+        ):
+            reason = f"exceeded the memory limit of {self.memory_limit} bytes"
+        else:
+            return
+        self._constraint = None
+        self.exceeded += 1
+        raise EvaluationLimitExceeded(constraint, reason)
@@ -4,7 +4,7 @@ import random
 import struct
 from typing import Callable
 
-from fandango import DerivationTree
+from fandango.language.tree import DerivationTree
 
 # Magic Values taken from LibAFL
 ARITH_MAX = 35
@@ -4,6 +4,7 @@ from abc import ABC, abstractmethod
 from typing import Callable, Generator
 
 from fandango.constraints.fitness import FailingTree
+from fandango.evolution.havoc import havoc_mutate
 from fandango.language.grammar import DerivationTree, Grammar
 
 
@@ -82,3 +83,74 @@ class SimpleMutation(MutationOperator):
         )
         mutated = individual.replace(grammar, node_to_mutate, new_subtree)
         return mutated
+
+
+class SubtreeRegenerationMutation(MutationOperator):
+    def __init__(self, max_nodes: int = 50):
+        self.max_nodes = max_nodes
+
+    def mutate(
+        self,
+        individual: DerivationTree,
+        grammar: Grammar,
+        evaluate_func: Callable[
+            [DerivationTree],
+            Generator[DerivationTree, None, tuple[float, list[FailingTree]]],
+        ],
+    ) -> Generator[DerivationTree, None, DerivationTree]:
+        """
+        Replaces a random subtree (not necessarily a failing one) with a newly fuzzed subtree.
+        Unlike `SimpleMutation`, this also changes individuals without failing subtrees,
+        e.g. to improve soft constraints.
+        """
+        yield from ()  # Mutation operators are generators
+        subtrees = [
+            node
+            for node in [individual, *individual.descendants()]
+            if not node.read_only and node.symbol.is_non_terminal
+        ]
+        if not subtrees:
+            return individual
+        node_to_mutate = random.choice(subtrees)
+
+        ctx_tree = node_to_mutate.split_end()
+        if ctx_tree.parent is not None:
+            ctx_tree = ctx_tree.parent
+            ctx_tree.set_children(ctx_tree.children[:-1])
+        else:
+            ctx_tree = None
+        new_subtree = grammar.fuzz(
+            node_to_mutate.symbol, prefix_node=ctx_tree, max_nodes=self.max_nodes
+        )
+        return individual.replace(grammar, node_to_mutate, new_subtree)
+
+
+class HavocMutation(MutationOperator):
+    def __init__(self, max_stack_pow: int = 3):
+        self.max_stack_pow = max_stack_pow
+
+    def mutate(
+        self,
+        individual: DerivationTree,
+        grammar: Grammar,
+        evaluate_func: Callable[
+            [DerivationTree],
+            Generator[DerivationTree, None, tuple[float, list[FailingTree]]],
+        ],
+    ) -> Generator[DerivationTree, None, DerivationTree]:
+        """
+        Applies a stack of random byte-level mutations (see `havoc`) to the individual and parses the result.
+        If the result is not valid according to the grammar, the individual is returned as is.
+        """
+        yield from ()  # Mutation operators are generators
+        if individual.read_only:
+            return individual
+        mutated = havoc_mutate(individual, max_stack_pow=self.max_stack_pow)
+        word: str | bytes = mutated
+        if not individual.contains_bytes():
+            try:
+                word = mutated.decode("utf-8")
+            except UnicodeDecodeError:
+                return individual
+        tree = grammar.parse(word, start=individual.symbol)
+        return individual if tree is None else tree
@@ -1,12 +1,83 @@
+import heapq
+import itertools
 import random
-from typing import Callable, Generator
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Generator, Iterable, Iterator, Optional, Union
+
+import dill
 
 from fandango.constraints.fitness import Comparison, ComparisonSide, FailingTree
+from fandango.evolution.profiler import span
 from fandango.language.grammar import DerivationTree, Grammar
 from fandango.language.packetforecaster import PacketForecaster
 from fandango.language.symbol import NonTerminal
+from fandango.language.tree import decode_tree, encode_tree
 from fandango.logger import LOGGER
 
+# Number of individuals each worker task generates
+WORKER_BATCH_SIZE = 16
+
+# Number of seed individuals each worker task parses
+SEED_BATCH_SIZE = 64
+
+# Maximum number of parsed fix suggestions to keep
+SUGGESTION_CACHE_SIZE = 10_000
+
+# The grammar of a population worker process
+_worker_grammar: Optional[Grammar] = None
+
+
+def _init_worker(grammar_data: bytes, max_repetition: int) -> None:
+    global _worker_grammar
+    _worker_grammar = dill.loads(grammar_data)
+    _worker_grammar.set_max_repetition(max_repetition)
+
+
+def _fuzz_batch(seed: int, start_symbol: str, max_nodes: int) -> list[tuple]:
+    """
+    Generate a batch of individuals in a worker process, using a random stream seeded with `seed`.
+
+    :return: The individuals, encoded with `encode_tree()`.
+    """
+    assert _worker_grammar is not None
+    random.seed(seed)
+    return [
+        encode_tree(_worker_grammar.fuzz(start_symbol, max_nodes))
+        for _ in range(WORKER_BATCH_SIZE)
+    ]
+
+
+def _parse_batch(individuals: list[str]) -> list[Optional[tuple]]:
+    """
+    Parse a batch of seed individuals in a worker process.
+
+    :return: The parse trees, encoded with `encode_tree()`, or None for individuals that cannot be parsed.
+    """
+    assert _worker_grammar is not None
+    results: list[Optional[tuple]] = []
+    for individual in individuals:
+        tree = _worker_grammar.parse(individual)
+        results.append(encode_tree(tree) if tree else None)
+    return results
+
+
+def _expansions(tree: DerivationTree) -> set[tuple]:
+    """
+    :return: The expansions (symbol and child symbols) used in `tree`, including its sources.
+    """
+    expansions = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node.symbol.is_non_terminal:
+            expansions.add(
+                (node.symbol, tuple(child.symbol for child in node.children))
+            )
+        stack.extend(node.children)
+        stack.extend(node.sources)
+    return expansions
+
 
 class PopulationManager:
     def __init__(
@@ -18,6 +89,10 @@ class PopulationManager:
         self._grammar = grammar
         self._start_symbol = start_symbol
         self._warnings_are_errors = warnings_are_errors
+        # Suggested subtrees by (value, symbol); these are shared, as replacing copies them
+        self._suggestion_cache: dict[tuple, Optional[DerivationTree]] = {}
+        self.suggestion_cache_lookups = 0
+        self.suggestion_cache_hits = 0
 
     def _generate_population_entry(self, max_nodes: int):
         return self._grammar.fuzz(self._start_symbol, max_nodes)
@@ -57,12 +132,24 @@ class PopulationManager:
         ],
         max_nodes: int,
         target_population_size: int,
+        workers: int = 1,
+        is_seen: Optional[Callable[[DerivationTree], bool]] = None,
+        stop: Optional[Callable[[], bool]] = None,
     ) -> Generator[DerivationTree, None, None]:
         """
         Refills the population with unique individuals in place.
 
         Does not deduplicate the current population.
 
+        If `workers` is greater than 1, new individuals are generated by a pool of worker processes.
+        Each batch of individuals is generated with its own random stream, seeded from the main random stream,
+        and batches are consumed in order, so the result is the same for any number of workers greater than 1.
+        It differs from the result of a single process, which draws all individuals from the main random stream.
+        Individuals are evaluated and fixed in the main process;
+        duplicate candidates are skipped by their fingerprint before evaluation.
+
+        Candidates for which `is_seen` returns True (see `Evaluator.is_seen()`) are skipped without evaluation.
+
         If after 10 times the difference between the current population size and the target population size
         the required population size is still not met, a warning is logged and the incomplete population is returned.
 
@@ -70,37 +157,261 @@ class PopulationManager:
         :param eval_individual: The function to evaluate the fitness of an individual.
         :param max_nodes: The maximum number of nodes in an individual.
         :param target_population_size: The target size of the population.
+        :param workers: The number of worker processes to generate individuals with.
+        :param is_seen: The function to check whether an individual was evaluated before.
+        :param stop: If given and it returns True, refilling stops and the population is left incomplete.
         :return: A generator that yields solutions. The population is modified in place.
         """
         unique_hashes = {hash(ind) for ind in current_population}
         attempts = 0
         max_attempts = (target_population_size - len(current_population)) * 10
 
-        while (
-            not self._is_population_complete(current_population, target_population_size)
-            and attempts < max_attempts
-        ):
-            individual = self._generate_population_entry(max_nodes)
-            _fitness, failing_trees = yield from eval_individual(individual)
-            candidate, _fixes_made = self.fix_individual(
-                individual,
-                failing_trees,
-            )
-            if not PopulationManager.add_unique_individual(
-                current_population, candidate, unique_hashes
+        entries: Optional[Iterator[DerivationTree]] = None
+        if workers > 1 and max_attempts > 0:
+            entries = self._generate_entries_in_parallel(max_nodes, workers)
+        seen_fingerprints = {ind.fingerprint() for ind in current_population}
+        generator_cache: dict[tuple, DerivationTree] = {}
+
+        stopped = False
+        try:
+            while (
+                not self._is_population_complete(
+                    current_population, target_population_size
+                )
+                and attempts < max_attempts
             ):
-                attempts += 1
+                if stop is not None and stop():
+                    stopped = True
+                    break
+                if entries is None:
+                    individual = self._generate_population_entry(max_nodes)
+                else:
+                    individual = next(entries)
+                    fingerprint = individual.fingerprint()
+                    if fingerprint in seen_fingerprints:
+                        attempts += 1
+                        continue
+                    seen_fingerprints.add(fingerprint)
+                if is_seen is not None and is_seen(individual):
+                    attempts += 1
+                    continue
+                _fitness, failing_trees = yield from eval_individual(individual)
+                candidate, _fixes_made = self.fix_individual(
+                    individual,
+                    failing_trees,
+                    generator_cache,
+                )
+                if not PopulationManager.add_unique_individual(
+                    current_population, candidate, unique_hashes
+                ):
+                    attempts += 1
+        finally:
+            if entries is not None:
+                entries.close()  # Shut down the worker pool
 
-        if not self._is_population_complete(current_population, target_population_size):
+        if not stopped and not self._is_population_complete(
+            current_population, target_population_size
+        ):
             LOGGER.warning(
                 f"Could not generate a full population of unique individuals. Population size reduced to {len(current_population)}."
             )
 
+    def _generate_entries_in_parallel(
+        self, max_nodes: int, workers: int
+    ) -> Iterator[DerivationTree]:
+        """
+        Generate an endless stream of new individuals with a pool of `workers` processes.
+        Closing the stream shuts down the pool.
+        """
+        try:
+            grammar_data = dill.dumps(self._grammar)
+        except Exception as e:
+            LOGGER.warning(f"Cannot generate individuals in parallel: {e}")
+            while True:
+                yield self._generate_population_entry(max_nodes)
+
+        base_seed = random.getrandbits(64)
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(grammar_data, self._grammar.get_max_repetition()),
+        )
+        pending: deque[Future] = deque()
+        batch = 0
+        try:
+            while True:
+                # Keep all workers busy, but consume the batches in order
+                while len(pending) < 2 * workers:
+                    pending.append(
+                        executor.submit(
+                            _fuzz_batch,
+                            base_seed + batch,
+                            self._start_symbol,
+                            max_nodes,
+                        )
+                    )
+                    batch += 1
+                for data in pending.popleft().result():
+                    yield decode_tree(data)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def parse_seeds(
+        self, seeds: Iterable[Union[DerivationTree, str]], workers: int = 1
+    ) -> Iterator[tuple[Union[DerivationTree, str], Optional[DerivationTree]]]:
+        """
+        Parse seed individuals lazily, in order.
+
+        If `workers` is greater than 1, strings are parsed by a pool of worker processes;
+        only a bounded number of batches is read ahead, so `seeds` may be a large, lazy stream.
+
+        :param seeds: The seed individuals, as strings or derivation trees.
+        :param workers: The number of worker processes to parse seeds with.
+        :return: A generator of (seed, parse tree) pairs; the parse tree is None if the seed cannot be parsed.
+        """
+        if workers <= 1:
+            for seed in seeds:
+                yield seed, self._parse_seed(seed)
+            return
+
+        try:
+            grammar_data = dill.dumps(self._grammar)
+        except Exception as e:
+            LOGGER.warning(f"Cannot parse seeds in parallel: {e}")
+            yield from self.parse_seeds(seeds, workers=1)
+            return
+
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(grammar_data, self._grammar.get_max_repetition()),
+        )
+        pending: deque[tuple[list, Future]] = deque()
+        iterator = iter(seeds)
+        exhausted = False
+        try:
+            while True:
+                # Keep all workers busy, but consume the batches in order
+                while not exhausted and len(pending) < 2 * workers:
+                    batch = list(itertools.islice(iterator, SEED_BATCH_SIZE))
+                    if not batch:
+                        exhausted = True
+                        break
+                    for seed in batch:
+                        if not isinstance(seed, (str, DerivationTree)):
+                            raise TypeError(
+                                "Initial individuals must be DerivationTree or String"
+                            )
+                    texts = [seed for seed in batch if isinstance(seed, str)]
+                    pending.append((batch, executor.submit(_parse_batch, texts)))
+                if not pending:
+                    break
+                batch, future = pending.popleft()
+                results = iter(future.result())
+                for seed in batch:
+                    if isinstance(seed, DerivationTree):
+                        yield seed, seed
+                    else:
+                        data = next(results)
+                        yield seed, None if data is None else decode_tree(data)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _parse_seed(self, seed: Union[DerivationTree, str]) -> Optional[DerivationTree]:
+        if isinstance(seed, str):
+            return self._grammar.parse(seed) or None
+        if isinstance(seed, DerivationTree):
+            return seed
+        raise TypeError("Initial individuals must be DerivationTree or String")
+
+    @staticmethod
+    def select_diverse(
+        population: list[DerivationTree], size: int
+    ) -> list[DerivationTree]:
+        """
+        Select `size` individuals from `population` that together cover as many grammar expansions as possible.
+        Individuals are picked greedily by the number of expansions they add; once no individual adds
+        new expansions, the remaining slots are filled in population order.
+
+        :param population: The individuals to select from.
+        :param size: The number of individuals to select.
+        :return: The selected individuals, in population order.
+        """
+        if len(population) <= size:
+            return list(population)
+        coverage = [_expansions(individual) for individual in population]
+        covered: set[tuple] = set()
+        selected: set[int] = set()
+        # Lazy greedy: gains only decrease, so a stale gain is an upper bound
+        heap = [(-len(expansions), i) for i, expansions in enumerate(coverage)]
+        heapq.heapify(heap)
+        while heap and len(selected) < size:
+            _gain, i = heapq.heappop(heap)
+            gain = len(coverage[i] - covered)
+            if gain == 0:
+                continue
+            if heap and gain < -heap[0][0]:
+                heapq.heappush(heap, (-gain, i))
+                continue
+            selected.add(i)
+            covered |= coverage[i]
+        for i in range(len(population)):
+            if len(selected) >= size:
+                break
+            selected.add(i)
+        return [population[i] for i in sorted(selected)]
+
+    def _suggested_tree(
+        self, value: Any, symbol: NonTerminal
+    ) -> Optional[DerivationTree]:
+        """
+        Return a tree for the suggested `value` of `symbol`, or None if `value` cannot be parsed.
+        The tree may be shared between individuals, so it must not be modified.
+        """
+        key: Optional[tuple]
+        if isinstance(value, DerivationTree):
+            key = (DerivationTree, value.fingerprint(), symbol)
+        else:
+            key = (type(value), value, symbol)
+        self.suggestion_cache_lookups += 1
+        try:
+            if key in self._suggestion_cache:
+                self.suggestion_cache_hits += 1
+                return self._suggestion_cache[key]
+        except TypeError:  # Unhashable value
+            key = None
+
+        if isinstance(value, DerivationTree) and symbol == value.symbol:
+            suggested_tree = value.deepcopy(
+                copy_children=True, copy_params=False, copy_parent=False
+            )
+            suggested_tree.set_all_read_only(False)
+        else:
+            # LOGGER.debug(f"Parsing {value} into {symbol.symbol!s}")
+            suggested_tree = self._grammar.parse(value, start=symbol.symbol)
+
+        if key is not None:
+            if len(self._suggestion_cache) >= SUGGESTION_CACHE_SIZE:
+                # Evict the oldest entry
+                del self._suggestion_cache[next(iter(self._suggestion_cache))]
+            self._suggestion_cache[key] = suggested_tree
+        return suggested_tree
+
+    @span("fix_individual")
     def fix_individual(
         self,
         individual: DerivationTree,
         failing_trees: list[FailingTree],
+        generator_cache: Optional[dict[tuple, DerivationTree]] = None,
     ) -> tuple[DerivationTree, int]:
+        """
+        Apply the suggestions of the failing trees of `individual` to it.
+
+        :param individual: The individual to fix.
+        :param failing_trees: The failing trees of the individual.
+        :param generator_cache: A cache for regenerated generator outputs, shared between individuals fixed in one batch.
+        :return: The fixed individual and the number of fixes made.
+        """
         fixes_made = 0
         replacements = dict()
         for failing_tree in failing_trees:
@@ -108,27 +419,42 @@ class PopulationManager:
                 continue
             for operator, value, side in failing_tree.suggestions:
                 if operator == Comparison.EQUAL and side == ComparisonSide.LEFT:
-                    # LOGGER.debug(f"Parsing {value} into {failing_tree.tree.symbol.symbol!s}")
-                    if (
-                        isinstance(value, DerivationTree)
-                        and failing_tree.tree.symbol == value.symbol
-                    ):
-                        suggested_tree = value.deepcopy(
-                            copy_children=True, copy_params=False, copy_parent=False
-                        )
-                        suggested_tree.set_all_read_only(False)
-                    else:
-                        suggested_tree = self._grammar.parse(
-                            value, start=failing_tree.tree.symbol.symbol
-                        )
+                    suggested_tree = self._suggested_tree(
+                        value, failing_tree.tree.symbol
+                    )
                     if suggested_tree is None:
                         continue
                     replacements[failing_tree.tree] = suggested_tree
                     fixes_made += 1
         if len(replacements) > 0:
-            individual = individual.replace_multiple(self._grammar, replacements)
+            individual = individual.replace_multiple(
+                self._grammar, replacements, generator_cache=generator_cache
+            )
         return individual, fixes_made
 
+    def fix_individuals(
+        self,
+        evaluation: list[tuple[DerivationTree, list[FailingTree]]],
+        stop: Optional[Callable[[], bool]] = None,
+    ) -> list[tuple[DerivationTree, int]]:
+        """
+        Apply the suggestions of the failing trees to all individuals in one batch,
+        such that generator outputs that are regenerated for the same sources are only derived once.
+
+        :param evaluation: The individuals and their failing trees.
+        :param stop: If given and it returns True, no further individuals are fixed.
+        :return: The fixed individuals and the number of fixes made for each.
+        """
+        generator_cache: dict[tuple, DerivationTree] = {}
+        fixed = []
+        for individual, failing_trees in evaluation:
+            if stop is not None and stop():
+                break
+            fixed.append(
+                self.fix_individual(individual, failing_trees, generator_cache)
+            )
+        return fixed
+
 
 class IoPopulationManager(PopulationManager):
     def __init__(
@@ -160,3 +486,10 @@ class IoPopulationManager(PopulationManager):
 
         self._prev_packet_idx = current_idx
         return tree
+
+    def _generate_entries_in_parallel(
+        self, max_nodes: int, workers: int
+    ) -> Iterator[DerivationTree]:
+        # Packet forecasts depend on the state of the exchange; generate them here
+        while True:
+            yield self._generate_population_entry(max_nodes)
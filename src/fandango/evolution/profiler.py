@@ -1,8 +1,52 @@
+import csv
+import functools
+import json
+import os
+import threading
 import time
-from contextlib import contextmanager
-from typing import Any, Dict, Generator, Union
+from collections import defaultdict
+from typing import IO, Any, Callable, Optional, TypeVar, Union
 from abc import ABC, abstractmethod
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# The profiler that receives spans from `span()`-decorated functions; None if profiling is disabled
+_active_profiler: Optional["Profiler"] = None
+
+
+def active_profiler() -> Optional["Profiler"]:
+    """
+    :return: The active profiler, or None if profiling is disabled.
+    """
+    return _active_profiler
+
+
+def span(key: str) -> Callable[[F], F]:
+    """
+    Decorator that records each call of the decorated function as a span named `key` in the active profiler.
+    If no profiler is active, the only overhead is a global lookup.
+
+    :param key: The metric key and trace event name.
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active_profiler
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.timer(key, increment=1):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
 
 class Timer(ABC):
     """Abstract base class for timing operations."""
@@ -10,7 +54,13 @@ class Timer(ABC):
     def __init__(self, profiler: "Profiler", key: str):
         self.profiler = profiler
         self.key = key
-        self._start_time = time.time()
+        self._start_time = time.perf_counter()
+
+    def __enter__(self) -> "Timer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop()
 
     @abstractmethod
     def increment(self, count: int = 1) -> None:
@@ -26,25 +76,36 @@ class Timer(ABC):
 class EnabledTimer(Timer):
     """Timer implementation for when profiling is enabled."""
 
+    def __init__(
+        self,
+        profiler: "Profiler",
+        key: str,
+        increment: Union[int, list[Any], None] = None,
+    ):
+        super().__init__(profiler, key)
+        self._increment = increment
+        self._count = 0
+
     def _stop(self) -> None:
-        elapsed = time.time() - self._start_time
-        if "time" not in self.profiler.metrics[self.key]:
-            self.profiler.metrics[self.key]["time"] = 0
-        self.profiler.metrics[self.key]["time"] += elapsed
+        # Calculate increment value after operation completes
+        if isinstance(self._increment, list):
+            self.increment(len(self._increment))
+        elif isinstance(self._increment, int):
+            self.increment(self._increment)
+        elif self._increment is not None:
+            raise ValueError(f"Invalid increment value: {self._increment}")
+        self.profiler.record(
+            self.key, self._start_time, time.perf_counter(), count=self._count
+        )
 
     def increment(self, count: int = 1) -> None:
-        if not self.profiler.enabled:
-            return
-
-        if "count" not in self.profiler.metrics[self.key]:
-            self.profiler.metrics[self.key]["count"] = 0
-        self.profiler.metrics[self.key]["count"] += count
+        self._count += count
 
 
 class DisabledTimer(Timer):
     """No-op timer implementation for when profiling is disabled."""
 
-    def __init__(self, profiler: "Profiler", key: str):
+    def __init__(self, profiler: Optional["Profiler"] = None, key: str = ""):
         pass
 
     def increment(self, count: int = 1) -> None:
@@ -54,44 +115,216 @@ class DisabledTimer(Timer):
         pass
 
 
+_DISABLED_TIMER = DisabledTimer()
+
+# Written by `Profiler.close()` to complete the trace event array
+_TRACE_END = "\n]\n"
+
+
 class Profiler:
-    """A profiling utility for tracking execution times and counts."""
-
-    def __init__(self, enabled: bool):
-        self.enabled = enabled
-        self.metrics: dict[str, dict[str, Union[int, float]]] = {
-            "initial_population": {"count": 0, "time": 0.0},
-            "evaluate_population": {"count": 0, "time": 0.0},
-            "select_elites": {"count": 0, "time": 0.0},
-            "tournament_selection": {"count": 0, "time": 0.0},
-            "filling": {"count": 0, "time": 0.0},
-            "crossover": {"count": 0, "time": 0.0},
-            "mutation": {"count": 0, "time": 0.0},
-        }
-
-    @contextmanager
-    def timer(
-        self, key: str, increment: Union[int, list[Any], None] = None
-    ) -> Generator[Timer, None, None]:
+    """
+    A profiling utility for tracking execution times and counts.
+
+    If enabled, each timed operation (span) is aggregated into `metrics` and into per-generation metrics.
+    Optionally, spans are streamed to `trace_file` in Chrome trace-event format
+    (viewable in `chrome://tracing` or Perfetto), and per-generation metrics are streamed to `stats_file`
+    (CSV with `generation,metric,value` rows if the file name ends in `.csv`, JSON Lines otherwise).
+    The files are only created by `open()`; spans recorded before are kept and written then.
+    Opening the profiler again after `close()` appends to the files.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        trace_file: Optional[str] = None,
+        stats_file: Optional[str] = None,
+    ):
+        self.enabled = enabled or trace_file is not None or stats_file is not None
+        self.metrics: dict[str, dict[str, Union[int, float]]] = defaultdict(
+            lambda: {"count": 0, "time": 0.0}
+        )
+        for key in [
+            "initial_population",
+            "evaluate_population",
+            "select_elites",
+            "tournament_selection",
+            "filling",
+            "crossover",
+            "mutation",
+        ]:
+            self.metrics[key]  # Report these even if they never occur
+        self._generation_metrics: dict[str, dict[str, Union[int, float]]] = defaultdict(
+            lambda: {"count": 0, "time": 0.0}
+        )
+        self._origin = time.perf_counter()
+        self._generation_start = self._origin
+
+        self._trace_file = trace_file
+        self._stats_file = stats_file
+        # Set while the files are open
+        self._opened = False
+        # Set once the files are created; `open()` appends to them after `close()`
+        self._created = False
+        self._trace: Optional[IO[str]] = None
+        self._trace_separator = "\n"
+        # Trace events recorded before the trace file is opened
+        self._pending_events: list[str] = []
+        self._stats: Optional[IO[str]] = None
+        self._stats_writer: Optional[Any] = None
+
+    def open(self) -> None:
+        """
+        Create the trace and stats files (or reopen them if the profiler was closed before),
+        and write the spans recorded so far to the trace.
+        """
+        if not self.enabled or self._opened:
+            return
+        self._opened = True
+        append = self._created
+        self._created = True
+        if self._trace_file is not None:
+            if append:
+                # Continue the event array in front of the end written by `close()`
+                self._trace = open(self._trace_file, "r+", newline="")
+                end = self._trace.seek(0, os.SEEK_END)
+                self._trace.seek(max(end - len(_TRACE_END), 0))
+                self._trace.truncate()
+            else:
+                self._trace = open(self._trace_file, "w", newline="")
+                self._trace.write("[")
+            for event in self._pending_events:
+                self._write_event(event)
+            self._pending_events.clear()
+        if self._stats_file is not None:
+            self._stats = open(self._stats_file, "a" if append else "w", newline="")
+            if os.path.splitext(self._stats_file)[1].lower() == ".csv":
+                self._stats_writer = csv.writer(self._stats)
+                if not append:
+                    self._stats_writer.writerow(["generation", "metric", "value"])
+
+    def _write_event(self, event: str) -> None:
+        assert self._trace is not None
+        self._trace.write(self._trace_separator + event)
+        self._trace_separator = ",\n"
+
+    def activate(self) -> None:
+        """
+        Make this profiler receive spans from `span()`-decorated functions
+        (such as `Grammar.parse()` and `Grammar.fuzz()`).
+        """
+        global _active_profiler
+        if self.enabled:
+            _active_profiler = self
+
+    def deactivate(self) -> None:
+        """
+        Stop receiving spans from `span()`-decorated functions.
+        """
+        global _active_profiler
+        if _active_profiler is self:
+            _active_profiler = None
+
+    def timer(self, key: str, increment: Union[int, list[Any], None] = None) -> Timer:
         """Context manager for profiling operations.
 
         :param key: The metric key to track
         :param increment: Either an integer, a list the length which will be used as the increment value.
-        :yields: A timer object that can be used to increment the metric if it has to be calculated manually.
+        :return: A timer object that can be used to increment the metric if it has to be calculated manually.
+        """
+        if not self.enabled:
+            return _DISABLED_TIMER
+        return EnabledTimer(self, key, increment)
+
+    def record(
+        self,
+        key: str,
+        start: float,
+        end: float,
+        count: int = 1,
+        name: Optional[str] = None,
+        args: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """
+        Record a span that has already been measured.
+
+        :param key: The metric key to track
+        :param start: The start time, as returned by `time.perf_counter()`
+        :param end: The end time, as returned by `time.perf_counter()`
+        :param count: The increment value for the metric count
+        :param name: The name of the trace event (default: `key`)
+        :param args: Additional arguments to store in the trace event
         """
-        timer = EnabledTimer(self, key) if self.enabled else DisabledTimer(self, key)
-        try:
-            yield timer
-        finally:
-            if self.enabled:
-                timer._stop()
-                # Calculate increment value after operation completes
-                if isinstance(increment, list):
-                    timer.increment(len(increment))
-                elif isinstance(increment, int):
-                    timer.increment(increment)
-                elif increment is not None:
-                    raise ValueError(f"Invalid increment value: {increment}")
+        if not self.enabled:
+            return
+        elapsed = end - start
+        for metrics in (self.metrics[key], self._generation_metrics[key]):
+            metrics["count"] += count
+            metrics["time"] += elapsed
+
+        if self._trace is not None or (
+            self._trace_file is not None and not self._opened
+        ):
+            event = {
+                "name": name or key,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": elapsed * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = args
+            if self._trace is not None:
+                self._write_event(json.dumps(event))
+            else:
+                self._pending_events.append(json.dumps(event))
+
+    def end_generation(self, generation: int, **stats: Union[int, float]) -> None:
+        """
+        Finish the metrics of the current generation and write them to the stats file.
+
+        :param generation: The generation that ended.
+        :param stats: Additional statistics to report for this generation (e.g. best fitness).
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.record(
+            "generation",
+            self._generation_start,
+            now,
+            name=f"generation {generation}",
+        )
+        self._generation_start = now
+
+        if self._stats is not None:
+            row: dict[str, Union[int, float]] = {"generation": generation}
+            for key, value in self._generation_metrics.items():
+                row[f"{key}.count"] = value["count"]
+                row[f"{key}.time"] = value["time"]
+            row.update(stats)
+            if resource is not None:
+                row["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if self._stats_writer is not None:
+                for metric, value in row.items():
+                    if metric != "generation":
+                        self._stats_writer.writerow([generation, metric, value])
+            else:
+                self._stats.write(json.dumps(row) + "\n")
+            self._stats.flush()
+        self._generation_metrics.clear()
+
+    def close(self) -> None:
+        """Complete and close the trace and stats files."""
+        self.deactivate()
+        self._opened = False
+        if self._trace is not None:
+            self._trace.write(_TRACE_END)
+            self._trace.close()
+            self._trace = None
+        if self._stats is not None:
+            self._stats.close()
+            self._stats = None
 
     def log_results(self) -> None:
         """Log the profiling results."""
@@ -0,0 +1,123 @@
+import enum
+import math
+import random
+from typing import Generic, Sequence, TypeVar
+
+from fandango.logger import LOGGER
+
+Op = TypeVar("Op")
+
+
+class BanditStrategy(enum.Enum):
+    UCB = "ucb"
+    THOMPSON = "thompson"
+
+
+class OperatorStats:
+    """Statistics of a single operator."""
+
+    def __init__(self):
+        self.invocations = 0
+        # Invocations that produced an individual fitter than its parent(s)
+        self.improvements = 0
+        # Sum of fitness improvements over the parent(s)
+        self.gain = 0.0
+        # CPU time spent in the operator, in seconds
+        self.time = 0.0
+
+    @property
+    def failures(self) -> int:
+        return self.invocations - self.improvements
+
+    @property
+    def gain_per_second(self) -> float:
+        return self.gain / self.time if self.time > 0 else 0.0
+
+
+class OperatorScheduler(Generic[Op]):
+    """
+    Chooses among several (mutation or crossover) operators with a multi-armed bandit.
+
+    The reward of an operator is its fitness improvement per CPU-second.
+    With `BanditStrategy.UCB`, the operator with the highest upper confidence bound on its (normalized)
+    improvement rate is chosen; with `BanditStrategy.THOMPSON`, the success probability of each operator
+    is sampled from a Beta distribution and divided by the operator's mean CPU time.
+    Each operator is tried once before the bandit takes over.
+    """
+
+    def __init__(
+        self,
+        operators: Sequence[Op],
+        strategy: BanditStrategy = BanditStrategy.UCB,
+        exploration: float = math.sqrt(2),
+    ):
+        """
+        :param operators: The operators to choose from.
+        :param strategy: The bandit strategy.
+        :param exploration: The weight of the exploration term for `BanditStrategy.UCB`.
+        """
+        if not operators:
+            raise ValueError("At least one operator is required")
+        self.operators = list(operators)
+        self.strategy = strategy
+        self.exploration = exploration
+        self.stats = [OperatorStats() for _ in self.operators]
+        self._invocations = 0
+
+    def select(self) -> int:
+        """
+        :return: The index of the operator to invoke next.
+        """
+        if len(self.operators) == 1:
+            return 0
+        for index, stats in enumerate(self.stats):
+            if stats.invocations == 0:
+                return index
+
+        if self.strategy == BanditStrategy.THOMPSON:
+            scores = [
+                random.betavariate(stats.improvements + 1, stats.failures + 1)
+                / max(stats.time / stats.invocations, 1e-9)
+                for stats in self.stats
+            ]
+        else:
+            rates = [stats.gain_per_second for stats in self.stats]
+            best_rate = max(rates)
+            log_total = math.log(self._invocations)
+            scores = [
+                (rate / best_rate if best_rate > 0 else 0.0)
+                + self.exploration * math.sqrt(log_total / stats.invocations)
+                for rate, stats in zip(rates, self.stats)
+            ]
+        return max(range(len(scores)), key=scores.__getitem__)
+
+    def update(self, index: int, improvement: float, cpu_time: float) -> None:
+        """
+        Record the outcome of invoking operator `index`.
+
+        :param index: The index of the operator, as returned by `select()`.
+        :param improvement: The fitness of the result minus the fitness of the parent(s).
+        :param cpu_time: The CPU time spent in the operator, in seconds.
+        """
+        stats = self.stats[index]
+        stats.invocations += 1
+        stats.time += cpu_time
+        if improvement > 0:
+            stats.improvements += 1
+            stats.gain += improvement
+        self._invocations += 1
+
+    def log_statistics(self, kind: str) -> None:
+        """
+        Log the statistics of all operators. With a single operator, no statistics are collected.
+
+        :param kind: The kind of operators (e.g. "Mutation"), for the log message.
+        """
+        if len(self.operators) == 1:
+            return
+        for operator, stats in zip(self.operators, self.stats):
+            LOGGER.info(
+                f"{kind} operator {type(operator).__name__}: "
+                f"{stats.invocations} invocations, {stats.improvements} improvements, "
+                f"{stats.time:.2f}s CPU, {stats.gain_per_second:.3f} fitness gain per CPU-second"
+            )
@@ -0,0 +1,170 @@
+import math
+from typing import Optional
+
+from fandango.logger import LOGGER
+
+
+class BloomFilter:
+    """
+    A Bloom filter over stable tree fingerprints (see `DerivationTree.fingerprint()`),
+    sized for `capacity` entries at the given false-positive rate.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        # Optimal number of bits and hash functions
+        self.num_bits = max(
+            8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        # A copy of `bits`, if no fingerprint was added since it was taken (see `snapshot()`)
+        self._snapshot: Optional[bytes] = None
+
+    def _indexes(self, fingerprint: bytes) -> list[int]:
+        # Fingerprints are cryptographic hashes, so double hashing on their halves is good enough
+        h1 = int.from_bytes(fingerprint[:8], "little")
+        h2 = int.from_bytes(fingerprint[8:16], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        bits = self.bits
+        return all(bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(fingerprint))
+
+    def add(self, fingerprint: bytes) -> None:
+        bits = self.bits
+        for i in self._indexes(fingerprint):
+            bits[i >> 3] |= 1 << (i & 7)
+        self.count += 1
+        self._snapshot = None
+
+    def snapshot(self) -> bytes:
+        """
+        :return: A copy of the bits; they are only copied again if fingerprints were added since.
+        """
+        if self._snapshot is None:
+            self._snapshot = bytes(self.bits)
+        return self._snapshot
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class SeenSet:
+    """
+    A run-wide, probabilistic set of the individuals evaluated so far, keyed by stable tree fingerprints.
+
+    This is a scalable Bloom filter: whenever the current filter reaches its capacity, a new filter with
+    twice the capacity and half the false-positive rate is added, such that the overall false-positive rate
+    stays below `false_positive_rate`. Once a new filter would exceed `max_bytes`, no new fingerprints are
+    recorded, so the false-positive rate still holds.
+    """
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(
+        self,
+        false_positive_rate: float = 0.001,
+        max_bytes: int = 64 * 1024 * 1024,
+        initial_capacity: int = 4096,
+    ):
+        """
+        :param false_positive_rate: The maximum probability that a new individual is considered as seen.
+        :param max_bytes: The maximum memory to use for the filters.
+        :param initial_capacity: The capacity of the first filter.
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError(
+                f"False-positive rate must be in range ]0, 1[, but is {false_positive_rate}"
+            )
+        self.false_positive_rate = false_positive_rate
+        self.max_bytes = max_bytes
+        self.filters: list[BloomFilter] = []
+        # Number of evaluations avoided because an individual was found in this set
+        self.hits = 0
+        self._next_capacity = initial_capacity
+        self._next_rate = false_positive_rate * (1 - self.TIGHTENING)
+        self._saturated = False
+        self._add_filter()
+
+    def _add_filter(self) -> Optional[BloomFilter]:
+        bloom_filter = BloomFilter(self._next_capacity, self._next_rate)
+        if self.filters and self.memory + len(bloom_filter.bits) > self.max_bytes:
+            if not self._saturated:
+                LOGGER.warning(
+                    f"Seen-set reached its memory limit of {self.max_bytes} bytes; "
+                    f"no longer recording new individuals"
+                )
+                self._saturated = True
+            return None
+        self.filters.append(bloom_filter)
+        self._next_capacity *= self.GROWTH
+        self._next_rate *= self.TIGHTENING
+        return bloom_filter
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        return any(fingerprint in bloom_filter for bloom_filter in self.filters)
+
+    def __len__(self) -> int:
+        """:return: The number of recorded fingerprints."""
+        return sum(bloom_filter.count for bloom_filter in self.filters)
+
+    @property
+    def memory(self) -> int:
+        """:return: The memory used by the filters, in bytes."""
+        return sum(len(bloom_filter.bits) for bloom_filter in self.filters)
+
+    def get_state(self) -> dict:
+        """
+        :return: A copy of the state of this set, to be restored with `set_state()`.
+            Full filters no longer change, so in repeated calls, usually only the last filter is copied.
+        """
+        return {
+            "filters": [
+                (
+                    bloom_filter.capacity,
+                    bloom_filter.false_positive_rate,
+                    bloom_filter.count,
+                    bloom_filter.snapshot(),
+                )
+                for bloom_filter in self.filters
+            ],
+            "hits": self.hits,
+            "next_capacity": self._next_capacity,
+            "next_rate": self._next_rate,
+            "saturated": self._saturated,
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restore the state of this set from `state`, as returned by `get_state()`.
+        """
+        self.filters = []
+        for capacity, false_positive_rate, count, bits in state["filters"]:
+            bloom_filter = BloomFilter(capacity, false_positive_rate)
+            bloom_filter.bits = bytearray(bits)
+            bloom_filter.count = count
+            self.filters.append(bloom_filter)
+        self.hits = state["hits"]
+        self._next_capacity = state["next_capacity"]
+        self._next_rate = state["next_rate"]
+        self._saturated = state["saturated"]
+
+    def add(self, fingerprint: bytes) -> None:
+        """
+        Record `fingerprint` as seen.
+        """
+        if fingerprint in self:
+            return
+        bloom_filter = self.filters[-1]
+        if bloom_filter.is_full:
+            if self._saturated:
+                return
+            bloom_filter = self._add_filter()
+            if bloom_filter is None:
+                return
+        bloom_filter.add(fingerprint)
@@ -0,0 +1,413 @@
+"""
+Compile a grammar into specialized Python code for fuzzing.
+
+`Grammar.fuzz()` normally walks the `Node` object graph, dispatching through
+`Alternative.fuzz()`, `Concatenation.fuzz()` etc. for every node. The compiler
+turns the rules of a primed grammar into one Python function per nonterminal,
+with distances to completion and the choices among minimal alternatives
+precomputed. Where no generator or computed repetition needs the context of
+the tree built so far, the functions build subtrees bottom-up rather than
+attaching (and re-sizing and re-hashing) every node as it is created. The
+compiled functions make the same random choices as the interpreter, so both
+produce the same trees for the same random state.
+"""
+
+import random
+from typing import Any, Callable, Optional
+
+import exrex
+
+import fandango.language.grammar as grammar_module
+from fandango.language.grammar import (
+    Alternative,
+    CharSet,
+    Concatenation,
+    Grammar,
+    Node,
+    NonTerminalNode,
+    Repetition,
+    TerminalNode,
+)
+from fandango.language.symbol import NonTerminal, Terminal
+from fandango.language.tree import DerivationTree
+
+FuzzFunction = Callable[..., Optional[DerivationTree]]
+
+
+class CompiledFuzzer:
+    """
+    The compiled fuzzing functions of a grammar.
+
+    Only the generated source code (and the objects it refers to) is pickled;
+    the functions are re-created from the source on first use after unpickling.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        constants: list[Any],
+        functions: dict[NonTerminal, tuple[str, bool]],
+    ):
+        """
+        :param source: The generated Python source code.
+        :param constants: The objects the source refers to as `_c0`, `_c1`, ...
+        :param functions: For each nonterminal, the name of its function, and whether
+            the function fills an attached tree (rather than building and returning one).
+        """
+        self.source = source
+        self.constants = constants
+        self.function_names = functions
+        self._functions: Optional[dict[NonTerminal, tuple[FuzzFunction, bool]]] = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_functions"] = None
+        return state
+
+    def _load(self) -> dict[NonTerminal, tuple[FuzzFunction, bool]]:
+        namespace: dict[str, Any] = {
+            "random": random,
+            "exrex": exrex,
+            "DerivationTree": DerivationTree,
+            "Terminal": Terminal,
+            "_grammar_module": grammar_module,
+            "INF": float("inf"),
+        }
+        for index, constant in enumerate(self.constants):
+            namespace[f"_c{index}"] = constant
+        exec(compile(self.source, "<fandango-compiled-grammar>", "exec"), namespace)
+        return {
+            symbol: (namespace[name], attached)
+            for symbol, (name, attached) in self.function_names.items()
+        }
+
+    def fuzz(
+        self,
+        start: NonTerminal,
+        parent: DerivationTree,
+        grammar: Grammar,
+        max_nodes: int,
+    ) -> None:
+        """
+        Add a random tree for `start` as the last child of `parent`;
+        equivalent to `NonTerminalNode(start).fuzz(parent, grammar, max_nodes)`.
+        """
+        if self._functions is None:
+            self._functions = self._load()
+        if start not in self._functions:
+            # Generators, local constraints and unknown symbols are handled by the interpreter
+            NonTerminalNode(start).fuzz(parent, grammar, max_nodes)
+            return
+        function, attached = self._functions[start]
+        if attached:
+            tree = DerivationTree(start)
+            parent.add_child(tree)
+            function(tree, grammar, max_nodes - 1, False)
+        else:
+            parent.add_child(function(grammar, max_nodes - 1, False))
+
+
+class FuzzerCompiler:
+    """
+    Generates the source code of a `CompiledFuzzer` for a primed grammar.
+    """
+
+    def __init__(self, grammar: Grammar):
+        self.grammar = grammar
+        self.constants: list[Any] = []
+        self._constant_names: dict[int, str] = {}
+        self._counter = 0
+        self._lines: list[str] = []
+        self._functions: dict[NonTerminal, tuple[str, bool]] = {}
+        # The tree being filled in an attached function; None when building bottom-up
+        self._parent: Optional[str] = None
+
+    def compile(self) -> CompiledFuzzer:
+        compiled = [
+            symbol
+            for symbol in self.grammar.rules
+            if symbol not in self.grammar.generators
+            and symbol not in self.grammar.local_constraints
+        ]
+        attached = self._needs_context(compiled)
+        for index, symbol in enumerate(compiled):
+            if symbol in attached:
+                self._functions[symbol] = (f"_fuzz_{index}", True)
+            else:
+                self._functions[symbol] = (f"_build_{index}", False)
+
+        for symbol, (name, is_attached) in self._functions.items():
+            self._counter = 0
+            if is_attached:
+                self._parent = "parent"
+                self._emit(0, f"def {name}(parent, grammar, max_nodes, in_message):")
+                self._emit(1, f"# {symbol}")
+                self._emit_node(self.grammar.rules[symbol], "max_nodes", 1)
+            else:
+                self._parent = None
+                self._emit(
+                    0,
+                    f"def {name}(grammar, max_nodes, in_message, sender=None, recipient=None):",
+                )
+                self._emit(1, f"# {symbol}")
+                self._emit(1, "children = []")
+                self._emit(1, "count = 0")
+                self._emit_node(self.grammar.rules[symbol], "max_nodes", 1)
+                self._emit(
+                    1,
+                    f"return DerivationTree({self._constant(symbol)}, children, "
+                    "sender=sender, recipient=recipient)",
+                )
+            self._emit(0, "")
+
+        return CompiledFuzzer(
+            "\n".join(self._lines) + "\n", self.constants, self._functions
+        )
+
+    def _needs_context(self, compiled: list[NonTerminal]) -> set[NonTerminal]:
+        """
+        :return: The nonterminals whose expansion may depend on the tree built so far,
+            because they (transitively) use generators or computed repetitions.
+        """
+        references: dict[NonTerminal, set[NonTerminal]] = {}
+        needs_context: set[NonTerminal] = set()
+        for symbol in compiled:
+            references[symbol] = set()
+            nodes = [self.grammar.rules[symbol]]
+            while nodes:
+                node = nodes.pop()
+                if isinstance(node, NonTerminalNode):
+                    if node.symbol in references or node.symbol in compiled:
+                        references[symbol].add(node.symbol)
+                    else:
+                        needs_context.add(symbol)
+                elif isinstance(node, Repetition):
+                    if node.get_access_points():
+                        needs_context.add(symbol)
+                    nodes.append(node.node)
+                elif isinstance(node, (Alternative, Concatenation)):
+                    nodes.extend(node.children())
+                elif not isinstance(node, (TerminalNode, CharSet)):
+                    needs_context.add(symbol)
+
+        changed = True
+        while changed:
+            changed = False
+            for symbol, referenced in references.items():
+                if symbol not in needs_context and referenced & needs_context:
+                    needs_context.add(symbol)
+                    changed = True
+        return needs_context
+
+    def _emit(self, indent: int, line: str) -> None:
+        self._lines.append("    " * indent + line)
+
+    def _constant(self, value: Any) -> str:
+        key = id(value)
+        if key not in self._constant_names:
+            self._constant_names[key] = f"_c{len(self.constants)}"
+            self.constants.append(value)
+        return self._constant_names[key]
+
+    def _variable(self, prefix: str) -> str:
+        self._counter += 1
+        return f"{prefix}{self._counter}"
+
+    @staticmethod
+    def _distance(node: Node) -> str:
+        distance = node.distance_to_completion
+        return "INF" if distance == float("inf") else repr(distance)
+
+    def _add_child(self, indent: int, tree: str, size: str) -> None:
+        if self._parent is not None:
+            self._emit(indent, f"{self._parent}.add_child({tree})")
+        else:
+            self._emit(indent, f"children.append({tree})")
+            self._emit(indent, f"count += {size}")
+
+    def _size(self) -> str:
+        return f"{self._parent}.size()" if self._parent is not None else "count"
+
+    def _emit_node(self, node: Node, max_nodes: str, indent: int):
+        """
+        Emit code equivalent to `node.fuzz(parent, grammar, max_nodes, in_message)`.
+        """
+        if isinstance(node, TerminalNode):
+            self._emit_terminal(node, indent)
+        elif isinstance(node, NonTerminalNode):
+            self._emit_nonterminal(node, max_nodes, indent)
+        elif isinstance(node, Alternative):
+            self._emit_alternative(node, max_nodes, indent)
+        elif isinstance(node, Concatenation):
+            self._emit_concatenation(node, max_nodes, indent)
+        elif isinstance(node, Repetition):
+            self._emit_repetition(node, max_nodes, indent)
+        elif isinstance(node, CharSet):
+            self._emit(
+                indent, 'raise NotImplementedError("CharSet fuzzing not implemented")'
+            )
+        else:
+            assert self._parent is not None
+            self._emit(
+                indent,
+                f"{self._constant(node)}.fuzz({self._parent}, grammar, {max_nodes}, in_message)",
+            )
+
+    def _emit_terminal(self, node: TerminalNode, indent: int):
+        symbol = node.symbol
+        if not symbol.is_regex:
+            tree = f"DerivationTree({self._constant(symbol)})"
+        elif isinstance(symbol.symbol, bytes):
+            # Exrex can't do bytes, so we decode to str and back
+            pattern = symbol.symbol.decode("iso-8859-1")
+            tree = f'DerivationTree(Terminal(exrex.getone({pattern!r}).encode("iso-8859-1")))'
+        else:
+            tree = f"DerivationTree(Terminal(exrex.getone({symbol.symbol!r})))"
+        self._add_child(indent, tree, "1")
+
+    def _emit_nonterminal(self, node: NonTerminalNode, max_nodes: str, indent: int):
+        if node.symbol not in self._functions:
+            # Generators depend on the tree built so far, and local constraints may
+            # need several attempts; leave them to the interpreter
+            assert self._parent is not None
+            self._emit(
+                indent,
+                f"{self._constant(node)}.fuzz({self._parent}, grammar, {max_nodes}, in_message)",
+            )
+            return
+
+        name, attached = self._functions[node.symbol]
+        tree = self._variable("tree")
+        if attached:
+            symbol = self._constant(node.symbol)
+            if node.sender is None:
+                self._emit(indent, f"{tree} = DerivationTree({symbol})")
+                in_message = "in_message"
+            else:
+                self._emit(indent, "if in_message:")
+                self._emit(indent + 1, f"{tree} = DerivationTree({symbol})")
+                self._emit(indent, "else:")
+                self._emit(
+                    indent + 1,
+                    f"{tree} = DerivationTree({symbol}, sender={node.sender!r}, "
+                    f"recipient={node.recipient!r})",
+                )
+                in_message = "True"
+            self._add_child(indent, tree, "1")
+            self._emit(
+                indent, f"{name}({tree}, grammar, {max_nodes} - 1, {in_message})"
+            )
+            return
+
+        if node.sender is None:
+            self._emit(indent, f"{tree} = {name}(grammar, {max_nodes} - 1, in_message)")
+        else:
+            self._emit(indent, "if in_message:")
+            self._emit(indent + 1, f"{tree} = {name}(grammar, {max_nodes} - 1, True)")
+            self._emit(indent, "else:")
+            self._emit(
+                indent + 1,
+                f"{tree} = {name}(grammar, {max_nodes} - 1, True, "
+                f"{node.sender!r}, {node.recipient!r})",
+            )
+        self._add_child(indent, tree, f"{tree}.size()")
+
+    def _emit_alternative(self, node: Alternative, max_nodes: str, indent: int):
+        alternatives = node.alternatives
+        minimum = min(a.distance_to_completion for a in alternatives)
+        minimal = tuple(
+            i for i, a in enumerate(alternatives) if a.distance_to_completion <= minimum
+        )
+        choice = self._variable("choice")
+        sub_max = self._variable("max_nodes")
+        self._emit(indent, f"if {self._distance(node)} >= {max_nodes}:")
+        self._emit(indent + 1, f"{choice} = random.choice({minimal!r})")
+        self._emit(indent + 1, f"{sub_max} = 0")
+        self._emit(indent, "else:")
+        self._emit(
+            indent + 1, f"{choice} = random.choice({tuple(range(len(alternatives)))!r})"
+        )
+        self._emit(indent + 1, f"{sub_max} = {max_nodes} - 1")
+        if len(alternatives) == 1:
+            self._emit_node(alternatives[0], sub_max, indent)
+            return
+        for i, alternative in enumerate(alternatives):
+            if i == 0:
+                self._emit(indent, f"if {choice} == {i}:")
+            elif i < len(alternatives) - 1:
+                self._emit(indent, f"elif {choice} == {i}:")
+            else:
+                self._emit(indent, "else:")
+            self._emit_node(alternative, sub_max, indent + 1)
+
+    def _emit_concatenation(self, node: Concatenation, max_nodes: str, indent: int):
+        remaining = self._variable("max_nodes")
+        prev_size = self._variable("size")
+        self._emit(indent, f"{remaining} = {max_nodes}")
+        self._emit(indent, f"{prev_size} = {self._size()}")
+        for i, child in enumerate(node.nodes):
+            if isinstance(child, TerminalNode):
+                # Terminals ignore the limit and always add a single node
+                self._emit_terminal(child, indent)
+                if i < len(node.nodes) - 1:
+                    self._emit(indent, f"{remaining} -= 1")
+                    self._emit(indent, f"{prev_size} += 1")
+                continue
+
+            sub_max = self._variable("max_nodes")
+            self._emit(
+                indent,
+                f"{sub_max} = 0 if {self._distance(child)} >= {remaining} else {remaining} - 1",
+            )
+            self._emit_node(child, sub_max, indent)
+            if i < len(node.nodes) - 1:
+                size = self._variable("size")
+                self._emit(indent, f"{size} = {self._size()}")
+                self._emit(indent, f"{remaining} -= {size} - {prev_size}")
+                self._emit(indent, f"{prev_size} = {size}")
+
+    def _emit_repetition(self, node: Repetition, max_nodes: str, indent: int):
+        remaining = self._variable("max_nodes")
+        prev_size = self._variable("size")
+        minimum = self._variable("min")
+        maximum = self._variable("max")
+        rep = self._variable("rep")
+        sub_max = self._variable("max_nodes")
+        size = self._variable("size")
+        repetition = self._constant(node)
+        # Only computed repetitions look at the tree, and these are always attached
+        context = self._parent if self._parent is not None else "None"
+
+        self._emit(indent, f"{remaining} = {max_nodes}")
+        self._emit(indent, f"{prev_size} = {self._size()}")
+        if node.static_min is not None:
+            self._emit(indent, f"{minimum} = {node.static_min!r}")
+        else:
+            self._emit(indent, f"{minimum} = {repetition}.min(grammar, {context})")
+        max_expr, _, max_searches = node.expr_data_max
+        if node.static_max is None and max_expr == "None" and not max_searches:
+            # The default maximum changes as evolution adapts it
+            self._emit(indent, f"{maximum} = _grammar_module.MAX_REPETITIONS")
+        else:
+            self._emit(indent, f"{maximum} = {repetition}.max(grammar, {context})")
+        self._emit(indent, f"for {rep} in range(random.randint({minimum}, {maximum})):")
+        self._emit(indent + 1, f"if {self._distance(node.node)} >= {remaining}:")
+        self._emit(indent + 2, f"if {rep} > {minimum}:")
+        self._emit(indent + 3, "break")
+        self._emit(indent + 2, f"{sub_max} = 0")
+        self._emit(indent + 1, "else:")
+        self._emit(indent + 2, f"{sub_max} = {remaining} - 1")
+        self._emit_node(node.node, sub_max, indent + 1)
+        self._emit(indent + 1, f"{size} = {self._size()}")
+        self._emit(indent + 1, f"{remaining} -= {size} - {prev_size}")
+        self._emit(indent + 1, f"{prev_size} = {size}")
+
+
+def compile_grammar(grammar: Grammar) -> CompiledFuzzer:
+    """
+    Compile the (primed) `grammar` into specialized fuzzing functions.
+
+    :param grammar: The grammar to compile.
+    :return: The compiled fuzzer.
+    """
+    return FuzzerCompiler(grammar).compile()
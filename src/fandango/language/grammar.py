@@ -5,6 +5,7 @@ import random
 import time
 import typing
 from collections import defaultdict
+from contextlib import contextmanager
 
 import re
 import exrex
@@ -14,17 +15,24 @@ from typing import Any, Iterator, Optional, Set, Union, Generator
 
 import regex
 
+from fandango.evolution.profiler import span
 from fandango.language.symbol import NonTerminal, Symbol, Terminal
 from fandango.language.tree import DerivationTree
 from fandango.logger import LOGGER
 
 from fandango import FandangoValueError, FandangoParseError
 
-from thefuzz import process as thefuzz_process
+if typing.TYPE_CHECKING:
+    from fandango.constraints.pushdown import LocalConstraint
+    from fandango.language.compiler import CompiledFuzzer
 
+from thefuzz import process as thefuzz_process
 
 MAX_REPETITIONS = 5
 
+# Number of times a nonterminal is generated until it satisfies its local constraints
+LOCAL_CONSTRAINT_ATTEMPTS = 10
+
 
 class NodeType(enum.Enum):
     ALTERNATIVE = "alternative"
@@ -460,15 +468,47 @@ class NonTerminalNode(Node):
             assign_recipient = self.recipient
             in_message = True
 
-        current_tree = DerivationTree(
-            self.symbol,
-            [],
-            sender=assign_sender,
-            recipient=assign_recipient,
-            read_only=False,
-        )
-        parent.add_child(current_tree)
-        grammar[self.symbol].fuzz(current_tree, grammar, max_nodes - 1, in_message)
+        local_constraints = grammar.local_constraints.get(self.symbol)
+        if local_constraints:
+            sampled = self._sample(grammar, local_constraints)
+            if sampled is not None:
+                sampled.sender = assign_sender
+                sampled.recipient = assign_recipient
+                parent.add_child(sampled)
+                return
+
+        for attempt in range(LOCAL_CONSTRAINT_ATTEMPTS if local_constraints else 1):
+            if attempt > 0:
+                # Discard the subtree that violates a local constraint
+                parent.set_children(parent.children[:-1])
+            current_tree = DerivationTree(
+                self.symbol,
+                [],
+                sender=assign_sender,
+                recipient=assign_recipient,
+                read_only=False,
+            )
+            parent.add_child(current_tree)
+            grammar[self.symbol].fuzz(current_tree, grammar, max_nodes - 1, in_message)
+            if not local_constraints or all(
+                constraint.accepts(current_tree) for constraint in local_constraints
+            ):
+                return
+
+    @staticmethod
+    def _sample(
+        grammar: "Grammar", local_constraints: list["LocalConstraint"]
+    ) -> Optional[DerivationTree]:
+        """
+        Sample a tree that satisfies all `local_constraints` from the values one of them allows, if any.
+        """
+        for constraint in local_constraints:
+            tree = constraint.sample(grammar)
+            if tree is not None and all(
+                other.accepts(tree) for other in local_constraints
+            ):
+                return tree
+        return None
 
     def accept(self, visitor: "NodeVisitor"):
         return visitor.visitNonTerminalNode(self)
@@ -1080,6 +1120,12 @@ def closest_match(word, candidates):
 class Grammar(NodeVisitor):
     """Represent a grammar."""
 
+    # If set, `fuzz()` uses specialized code generated from the rules (see `compiler.py`)
+    compiled_fuzzing: bool = False
+    _compiled_fuzzer: Optional["CompiledFuzzer"] = None
+    # Constraints enforced while fuzzing, by symbol (see `set_local_constraints()`)
+    local_constraints: dict[NonTerminal, list["LocalConstraint"]] = {}
+
     class ParserDerivationTree(DerivationTree):
 
         def __init__(
@@ -2000,9 +2046,26 @@ class Grammar(NodeVisitor):
         args.pop(0)
         return args
 
-    def derive_generator_output(self, tree: "DerivationTree"):
-        generated = self.generate(tree.symbol, tree.sources)
-        return generated.children
+    def derive_generator_output(
+        self,
+        tree: "DerivationTree",
+        cache: Optional[dict[tuple, "DerivationTree"]] = None,
+    ):
+        """
+        Return the children that the generator of `tree` produces from the sources of `tree`.
+
+        :param tree: The tree to derive the children of.
+        :param cache: If given, generator outputs are memoized in `cache` by symbol and sources,
+            such that generators are run only once for the same sources.
+        :return: The new children.
+        """
+        if cache is None:
+            generated = self.generate(tree.symbol, tree.sources)
+            return generated.children
+        key = (tree.symbol, tuple(source.fingerprint() for source in tree.sources))
+        if key not in cache:
+            cache[key] = self.generate(tree.symbol, tree.sources)
+        return [child.deepcopy(copy_parent=False) for child in cache[key].children]
 
     def populate_sources(self, tree: "DerivationTree"):
         self._rec_remove_sources(tree)
@@ -2088,6 +2151,7 @@ class Grammar(NodeVisitor):
     def collapse(self, tree: DerivationTree) -> DerivationTree:
         return self._parser.collapse(tree)
 
+    @span("Grammar.fuzz")
     def fuzz(
         self,
         start: str | NonTerminal = "<start>",
@@ -2102,11 +2166,64 @@ class Grammar(NodeVisitor):
         else:
             root = prefix_node
         fuzzed_idx = len(root.children)
-        NonTerminalNode(start).fuzz(root, self, max_nodes=max_nodes)
+        if self.compiled_fuzzing:
+            self.get_compiled_fuzzer().fuzz(start, root, self, max_nodes)
+        else:
+            NonTerminalNode(start).fuzz(root, self, max_nodes=max_nodes)
         root = root.children[fuzzed_idx]
         root._parent = None
         return root
 
+    def set_local_constraints(self, constraints: list["LocalConstraint"]) -> None:
+        """
+        Enforce `constraints` while fuzzing: subtrees of their symbols are sampled from the values
+        the constraints allow, if known, or else regenerated until they satisfy them
+        (at most `LOCAL_CONSTRAINT_ATTEMPTS` times).
+        """
+        local_constraints: dict[NonTerminal, list["LocalConstraint"]] = {}
+        for constraint in constraints:
+            local_constraints.setdefault(constraint.symbol, []).append(constraint)
+        self.local_constraints = local_constraints
+        # Compiled code leaves these symbols to the interpreter
+        self._compiled_fuzzer = None
+
+    @contextmanager
+    def fuzzing_settings(
+        self,
+        compiled: bool = False,
+        local_constraints: Optional[list["LocalConstraint"]] = None,
+    ) -> Iterator[None]:
+        """
+        Within this context, fuzz with compiled code if `compiled` is set (see `compiled_fuzzing`), and enforce
+        `local_constraints` if given (see `set_local_constraints()`). The previous settings are restored
+        afterwards, such that other users of this grammar are not affected.
+        """
+        previous_compiled = self.compiled_fuzzing
+        previous_local_constraints = self.local_constraints
+        previous_fuzzer = self._compiled_fuzzer
+        if compiled:
+            self.compiled_fuzzing = True
+        if local_constraints is not None:
+            self.set_local_constraints(local_constraints)
+        try:
+            yield
+        finally:
+            self.compiled_fuzzing = previous_compiled
+            if local_constraints is not None:
+                self.local_constraints = previous_local_constraints
+                self._compiled_fuzzer = previous_fuzzer
+
+    def get_compiled_fuzzer(self) -> "CompiledFuzzer":
+        """
+        Return the compiled fuzzer for this grammar, generating it if needed.
+        The fuzzer is kept with the grammar (also when pickled) until the grammar is primed again.
+        """
+        if self._compiled_fuzzer is None:
+            from fandango.language.compiler import compile_grammar
+
+            self._compiled_fuzzer = compile_grammar(self)
+        return self._compiled_fuzzer
+
     def update(self, grammar: Union["Grammar", dict[NonTerminal, Node]], prime=True):
         if isinstance(grammar, Grammar):
             generators = grammar.generators
@@ -2130,11 +2247,13 @@ class Grammar(NodeVisitor):
                 del self.generators[symbol]
 
         self._parser = Grammar.Parser(self)
+        self._compiled_fuzzer = None
         self._local_variables.update(local_variables)
         self._global_variables.update(global_variables)
         if prime:
             self.prime()
 
+    @span("Grammar.parse")
     def parse(
         self,
         word: str | bytes | DerivationTree,
@@ -2329,6 +2448,8 @@ class Grammar(NodeVisitor):
         return paths
 
     def prime(self):
+        # Compiled code inlines the distances computed here
+        self._compiled_fuzzer = None
         nodes = sum([self.visit(self.rules[symbol]) for symbol in self.rules], [])
         while nodes:
             node = nodes.pop(0)
@@ -4,7 +4,9 @@ search criteria.
 """
 
 import abc
-from typing import Any, Optional
+import itertools
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
 
 from fandango.language.symbol import NonTerminal
 from fandango.language.tree import DerivationTree
@@ -101,6 +103,81 @@ class Length(Container):
         return repr(self)
 
 
+class SearchMemo:
+    """
+    Memoizes the results of `NonTerminalSearch.find()` while one individual is evaluated,
+    such that constraints mentioning the same searches share their results.
+    Results are keyed by the search (by its type and representation, so equal searches
+    in different constraints share results), the identity of the tree, and the scope.
+    """
+
+    def __init__(self):
+        # The tree and scope are kept with the results, so their identities are not reused
+        self._results: dict[tuple, tuple[DerivationTree, Any, list[Container]]] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    @staticmethod
+    def _key(
+        search: "NonTerminalSearch",
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, Any]],
+    ) -> tuple:
+        return (
+            search.memo_key(),
+            id(tree),
+            tuple((symbol, id(value)) for symbol, value in (scope or {}).items()),
+        )
+
+    def get(
+        self,
+        search: "NonTerminalSearch",
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, Any]] = None,
+    ) -> Optional[list[Container]]:
+        """
+        :return: The memoized results of `search` in `tree`, or None if there are none yet.
+        """
+        entry = self._results.get(self._key(search, tree, scope))
+        return None if entry is None else entry[2]
+
+    def find(
+        self,
+        search: "NonTerminalSearch",
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, Any]] = None,
+    ) -> list[Container]:
+        key = self._key(search, tree, scope)
+        self.lookups += 1
+        entry = self._results.get(key)
+        if entry is None:
+            entry = (tree, scope, search.find(tree, scope=scope))
+            self._results[key] = entry
+        else:
+            self.hits += 1
+        # Callers may modify the list
+        return list(entry[2])
+
+
+# The memo of the individual being evaluated, if any (see `search_memo()`)
+_active_memo: Optional[SearchMemo] = None
+
+
+@contextmanager
+def search_memo() -> Iterator[SearchMemo]:
+    """
+    Memoize `NonTerminalSearch.find_memoized()` within this context.
+    The tree searched must not be modified within the context.
+    """
+    global _active_memo
+    previous = _active_memo
+    _active_memo = SearchMemo()
+    try:
+        yield _active_memo
+    finally:
+        _active_memo = previous
+
+
 class NonTerminalSearch(abc.ABC):
     """
     Abstract class for a non-terminal search.
@@ -133,6 +210,60 @@ class NonTerminalSearch(abc.ABC):
         :return list[Container]: The list of containers that hold the matching derivation trees.
         """
 
+    def find_memoized(
+        self,
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
+    ) -> list[Container]:
+        """
+        Like `find()`, but memoized in the active `SearchMemo` (see `search_memo()`), if any.
+        :param DerivationTree tree: The derivation tree.
+        :param Optional[dict[NonTerminal, list[DerivationTree]]] scope: The scope of non-terminals matching to trees.
+        :return list[Container]: The list of containers that hold the matching derivation trees.
+        """
+        if _active_memo is None:
+            return self.find(tree, scope=scope)
+        return _active_memo.find(self, tree, scope)
+
+    def iter_find(
+        self,
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
+    ) -> Iterator[Container]:
+        """
+        Like `find()`, but yield the containers lazily, such that consumers that stop early
+        do not search the remainder of the tree. By default, this falls back to `find()`.
+        The scope must not be modified while iterating.
+        :param DerivationTree tree: The derivation tree.
+        :param Optional[dict[NonTerminal, list[DerivationTree]]] scope: The scope of non-terminals matching to trees.
+        :return Iterator[Container]: The containers that hold the matching derivation trees.
+        """
+        yield from self.find(tree, scope=scope)
+
+    def iter_find_memoized(
+        self,
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
+    ) -> Iterator[Container]:
+        """
+        Like `iter_find()`, but answered from the active `SearchMemo`, if it already holds the results.
+        Partial results are not memoized.
+        :param DerivationTree tree: The derivation tree.
+        :param Optional[dict[NonTerminal, list[DerivationTree]]] scope: The scope of non-terminals matching to trees.
+        :return Iterator[Container]: The containers that hold the matching derivation trees.
+        """
+        if _active_memo is not None:
+            results = _active_memo.get(self, tree, scope)
+            if results is not None:
+                return iter(list(results))
+        return self.iter_find(tree, scope=scope)
+
+    def memo_key(self) -> tuple:
+        """
+        :return: A key that is equal for searches that find the same trees.
+        """
+        return type(self), repr(self)
+
     def find_all(
         self,
         trees: list[DerivationTree],
@@ -183,12 +314,11 @@ class LengthSearch(NonTerminalSearch):
     ) -> list[Container]:
         ret = [
             Length(
-                sum(
-                    [
+                list(
+                    itertools.chain.from_iterable(
                         container.get_trees()
-                        for container in self.value.find(tree, scope=scope)
-                    ],
-                    [],
+                        for container in self.value.find_memoized(tree, scope=scope)
+                    )
                 )
             )
         ]
@@ -202,12 +332,11 @@ class LengthSearch(NonTerminalSearch):
     ) -> list[Container]:
         ret = [
             Length(
-                sum(
-                    [
+                list(
+                    itertools.chain.from_iterable(
                         container.get_trees()
                         for container in self.value.find_direct(tree, scope=scope)
-                    ],
-                    [],
+                    )
                 )
             )
         ]
@@ -249,6 +378,16 @@ class RuleSearch(NonTerminalSearch):
         # LOGGER.debug(f"RuleSearch({self}).find({tree.value()!r}) = {ret}")
         return ret
 
+    def iter_find(
+        self,
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
+    ) -> Iterator[Container]:
+        if scope and self.symbol in scope:
+            yield Tree(scope[self.symbol])
+        else:
+            yield from map(Tree, tree.iter_all_trees(self.symbol))
+
     def find_direct(
         self,
         tree: DerivationTree,
@@ -292,7 +431,7 @@ class AttributeSearch(NonTerminalSearch):
         tree: DerivationTree,
         scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
     ) -> list[Container]:
-        bases = self.base.find(tree, scope=scope)
+        bases = self.base.find_memoized(tree, scope=scope)
         targets = []
         for base in bases:
             for t in base.get_trees():
@@ -300,6 +439,15 @@ class AttributeSearch(NonTerminalSearch):
         # LOGGER.debug(f"AttributeSearch({self}).find({tree.value()!r}) = {targets}")
         return targets
 
+    def iter_find(
+        self,
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
+    ) -> Iterator[Container]:
+        for base in self.base.iter_find_memoized(tree, scope=scope):
+            for t in base.get_trees():
+                yield from self.attribute.find_direct(t, scope=scope)
+
     def find_direct(
         self,
         tree: DerivationTree,
@@ -343,7 +491,7 @@ class DescendantAttributeSearch(NonTerminalSearch):
         tree: DerivationTree,
         scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
     ) -> list[Container]:
-        bases = self.base.find(tree, scope=scope)
+        bases = self.base.find_memoized(tree, scope=scope)
         targets = []
         for base in bases:
             for t in base.get_trees():
@@ -352,6 +500,15 @@ class DescendantAttributeSearch(NonTerminalSearch):
         # LOGGER.debug(f"DescendantAttributeSearch({self}).find({tree.value()!r}) = {targets}")
         return targets
 
+    def iter_find(
+        self,
+        tree: DerivationTree,
+        scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
+    ) -> Iterator[Container]:
+        for base in self.base.iter_find_memoized(tree, scope=scope):
+            for t in base.get_trees():
+                yield from self.attribute.iter_find(t, scope=scope)
+
     def find_direct(
         self,
         tree: DerivationTree,
@@ -407,7 +564,7 @@ class ItemSearch(NonTerminalSearch):
         tree: DerivationTree,
         scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
     ) -> list[Container]:
-        return self._find(self.base.find(tree, scope=scope))
+        return self._find(self.base.find_memoized(tree, scope=scope))
 
     def find_direct(
         self,
@@ -500,7 +657,7 @@ class SelectiveSearch(NonTerminalSearch):
         tree: DerivationTree,
         scope: Optional[dict[NonTerminal, list[DerivationTree]]] = None,
     ) -> list[Container]:
-        ret = self._find(self.base.find(tree, scope=scope))
+        ret = self._find(self.base.find_memoized(tree, scope=scope))
         # LOGGER.debug(f"SelectiveSearch({self}).find({tree.value()!r}) = {ret}")
         return ret
 
@@ -1,6 +1,8 @@
 import copy
+import hashlib
+import weakref
 from io import BytesIO, StringIO
-from typing import Any, Optional, Union
+from typing import Any, Iterator, Optional, Union
 
 from fandango import FandangoValueError
 from fandango.language.symbol import NonTerminal, Slice, Symbol, Terminal
@@ -45,6 +47,27 @@ class ChildStep(PathStep):
         self.index = index
 
 
+class TreeEdit:
+    """
+    Records that a tree was derived from `origin` by replacing subtrees (see `DerivationTree.replace_multiple()`).
+    `touched` holds the nonterminal symbols of the replaced and inserted subtrees and their ancestors;
+    subtrees of all other symbols are unchanged, and at the same paths as in `origin`.
+    """
+
+    def __init__(self, origin: "DerivationTree", touched: frozenset[NonTerminal]):
+        self._origin: Optional[weakref.ref] = weakref.ref(origin)
+        self.touched = touched
+
+    @property
+    def origin(self) -> Optional["DerivationTree"]:
+        """The tree this tree was derived from, or None if it no longer exists."""
+        return self._origin() if self._origin is not None else None
+
+    def __getstate__(self):
+        # Weak references cannot be pickled
+        return {"_origin": None, "touched": self.touched}
+
+
 def index_by_reference(lst, target):
     for i, item in enumerate(lst):
         if item is target:
@@ -80,6 +103,7 @@ class DerivationTree:
             raise TypeError(f"Expected Symbol, got {type(symbol)}")
 
         self.hash_cache = None
+        self.fingerprint_cache: Optional[bytes] = None
         self._parent: Optional["DerivationTree"] = parent
         self._sender = sender
         self._recipient = recipient
@@ -89,6 +113,8 @@ class DerivationTree:
         if sources is not None:
             self.sources = sources
         self.read_only = read_only
+        # Set by `replace_multiple()` on the trees it returns
+        self.edit: Optional[TreeEdit] = None
         self._size = 1
         self.set_children(children or [])
         self.invalidate_hash()
@@ -145,6 +171,7 @@ class DerivationTree:
 
     def invalidate_hash(self):
         self.hash_cache = None
+        self.fingerprint_cache = None
         if self._parent is not None:
             self._parent.invalidate_hash()
 
@@ -246,17 +273,26 @@ class DerivationTree:
         self._size = new_val
 
     def find_all_trees(self, symbol: NonTerminal) -> list["DerivationTree"]:
-        trees = sum(
-            [
-                child.find_all_trees(symbol)
-                for child in [*self._children, *self._sources]
-                if child.symbol.is_non_terminal
-            ],
-            [],
-        )
-        if self.symbol == symbol:
-            trees.append(self)
-        return trees
+        return list(self.iter_all_trees(symbol))
+
+    def iter_all_trees(self, symbol: NonTerminal) -> Iterator["DerivationTree"]:
+        """
+        Lazily yield the subtrees with the given symbol, in the order of `find_all_trees()`:
+        the subtrees of each child (and source) first, then the tree itself.
+        """
+        # An explicit stack, such that deep trees neither hit the recursion limit
+        # nor pay for nested generators on every yield
+        stack = [(self, False)]
+        while stack:
+            tree, expanded = stack.pop()
+            if expanded:
+                if tree.symbol == symbol:
+                    yield tree
+                continue
+            stack.append((tree, True))
+            for child in reversed([*tree._children, *tree._sources]):
+                if child.symbol.is_non_terminal:
+                    stack.append((child, False))
 
     def find_direct_trees(self, symbol: NonTerminal) -> list["DerivationTree"]:
         return [
@@ -300,6 +336,7 @@ class DerivationTree:
 
     def invalidate_hash(self):
         self.hash_cache = None
+        self.fingerprint_cache = None
         if self._parent is not None:
             self._parent.invalidate_hash()
 
@@ -318,6 +355,23 @@ class DerivationTree:
             )
         return self.hash_cache
 
+    def fingerprint(self) -> bytes:
+        """
+        Computes a fingerprint of the derivation tree based on its structure and symbols.
+        Unlike `hash()`, the fingerprint is stable across processes,
+        so it can be stored and compared between runs.
+        """
+        if self.fingerprint_cache is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(
+                repr((self.symbol.type.value, self.symbol.symbol)).encode("utf-8")
+            )
+            digest.update(repr((self.sender, self.recipient)).encode("utf-8"))
+            for child in self._children:
+                digest.update(child.fingerprint())
+            self.fingerprint_cache = digest.digest()
+        return self.fingerprint_cache
+
     def __tree__(self):
         return self.symbol, [child.__tree__() for child in self._children]
 
@@ -729,6 +783,18 @@ class DerivationTree:
             current = parent
         return tuple(path[::-1])
 
+    def get_by_choices_path(self, path: tuple) -> "DerivationTree":
+        """
+        Return the node at `path` (as returned by `get_choices_path()`) relative to this node.
+        """
+        node = self
+        for step in path:
+            if isinstance(step, ChildStep):
+                node = node._children[step.index]
+            else:
+                node = node._sources[step.index]
+        return node
+
     def replace(self, grammar: "Grammar", tree_to_replace, new_subtree):
         return self.replace_multiple(grammar, {tree_to_replace: new_subtree})
 
@@ -738,10 +804,21 @@ class DerivationTree:
         replacements: dict["DerivationTree", "DerivationTree"],
         path_to_replacement: dict[tuple, "DerivationTree"] = None,
         current_path: tuple = None,
+        generator_cache: Optional[dict[tuple, "DerivationTree"]] = None,
     ):
         """
         Replace the subtree rooted at the given node with the new subtree.
+
+        If `generator_cache` is given, regenerated generator outputs are memoized in it
+        (see `Grammar.derive_generator_output()`); pass the same cache to apply many replacements in one batch.
         """
+        if path_to_replacement is None and current_path is None and self.parent is None:
+            new_tree = self.replace_multiple(
+                grammar, replacements, None, (), generator_cache
+            )
+            new_tree.edit = self._replacement_edit(grammar, replacements, new_tree)
+            return new_tree
+
         if path_to_replacement is None:
             path_to_replacement = dict()
             for replacee, replacement in replacements.items():
@@ -768,6 +845,7 @@ class DerivationTree:
                 replacements,
                 path_to_replacement,
                 current_path + (SourceStep(i),),
+                generator_cache,
             )
             sources.append(new_param)
             if new_param != param:
@@ -778,6 +856,7 @@ class DerivationTree:
                 replacements,
                 path_to_replacement,
                 current_path + (ChildStep(i),),
+                generator_cache,
             )
             new_children.append(new_child)
             if new_child != child:
@@ -817,12 +896,40 @@ class DerivationTree:
             if self_is_generator_child:
                 new_tree.sources = []
             else:
-                new_tree.set_children(grammar.derive_generator_output(new_tree))
+                new_tree.set_children(
+                    grammar.derive_generator_output(new_tree, generator_cache)
+                )
         elif regen_params:
             new_tree.sources = grammar.derive_sources(new_tree)
 
         return new_tree
 
+    def _replacement_edit(
+        self,
+        grammar: "Grammar",
+        replacements: dict["DerivationTree", "DerivationTree"],
+        new_tree: "DerivationTree",
+    ) -> Optional[TreeEdit]:
+        """
+        :return: The edit that turned this tree into `new_tree`, or None if it cannot be determined
+        because generator outputs or parameters on the way to a replaced subtree may have been derived again.
+        """
+        touched: set[NonTerminal] = set()
+        for replacee in replacements:
+            node = new_tree
+            try:
+                for step in replacee.get_choices_path():
+                    if node.symbol in grammar.generators:
+                        return None
+                    if node.symbol.is_non_terminal:
+                        touched.add(node.symbol)  # type: ignore[arg-type]
+                    node = node.get_by_choices_path((step,))
+            except (IndexError, StepException):
+                return None
+            touched.update(replacee.get_non_terminal_symbols(exclude_read_only=False))
+            touched.update(node.get_non_terminal_symbols(exclude_read_only=False))
+        return TreeEdit(self, frozenset(touched))
+
     def get_non_terminal_symbols(self, exclude_read_only=True) -> set[NonTerminal]:
         """
         Retrieve all non-terminal symbols present in the derivation tree.
@@ -1162,3 +1269,39 @@ class DerivationTree:
 class SliceTree(DerivationTree):
     def __init__(self, children: list["DerivationTree"], read_only: bool = False):
         super().__init__(Slice(), children, read_only=read_only)
+
+
+def encode_tree(tree: DerivationTree) -> tuple:
+    """
+    Encode a derivation tree into nested tuples, without parent links and caches,
+    such that it can be pickled compactly (e.g., to send it to a worker process or to store it).
+
+    :param tree: The tree to encode.
+    :return: The encoded tree.
+    """
+    return (
+        tree.symbol,
+        tuple(encode_tree(child) for child in tree.children),
+        tuple(encode_tree(source) for source in tree.sources),
+        tree.sender,
+        tree.recipient,
+        tree.read_only,
+    )
+
+
+def decode_tree(data: tuple) -> DerivationTree:
+    """
+    Decode a derivation tree encoded with `encode_tree()`.
+
+    :param data: The encoded tree.
+    :return: The decoded tree.
+    """
+    symbol, children, sources, sender, recipient, read_only = data
+    return DerivationTree(
+        symbol,
+        [decode_tree(child) for child in children],
+        sources=[decode_tree(source) for source in sources],
+        sender=sender,
+        recipient=recipient,
+        read_only=read_only,
+    )
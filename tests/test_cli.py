@@ -4,9 +4,11 @@ import os
 import re
 import shlex
 import shutil
+import struct
 import subprocess
 import unittest
 import time
+import zipfile
 
 from fandango.cli import get_parser
 
@@ -21,6 +23,12 @@ class test_cli(unittest.TestCase):
         out, err = proc.communicate()
         return out.decode(), err.decode(), proc.returncode
 
+    def remove_output(self, path):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
     def test_help(self):
         command = shlex.split("fandango --help")
         out, err, code = self.run_command(command)
@@ -67,6 +75,7 @@ class test_cli(unittest.TestCase):
             "fandango fuzz -f tests/resources/digit.fan -n 10 --random-seed 426912 -d tests/resources/test --no-cache"
         )
         expected = ["35716", "4", "9768", "30", "5658", "5", "9", "649", "20", "41"]
+        self.addCleanup(self.remove_output, "tests/resources/test")
         (
             out,
             err,
@@ -83,6 +92,39 @@ class test_cli(unittest.TestCase):
             os.remove(filename)
         shutil.rmtree("tests/resources/test")
 
+    def test_output_to_archive_and_stream(self):
+        command = shlex.split(
+            "fandango fuzz -f tests/resources/digit.fan -n 10 --random-seed 426912 --no-cache"
+        )
+        out, err, code = self.run_command(command)
+        self.assertEqual(0, code)
+        expected = out.strip().split("\n")
+        self.assertEqual(10, len(expected))
+
+        command = shlex.split(
+            "fandango fuzz -f tests/resources/digit.fan -n 10 --random-seed 426912 --output-archive tests/resources/test.zip --output-stream tests/resources/test.bin --no-cache"
+        )
+        self.addCleanup(self.remove_output, "tests/resources/test.zip")
+        self.addCleanup(self.remove_output, "tests/resources/test.bin")
+        out, err, code = self.run_command(command)
+        self.assertEqual(0, code)
+        self.assertEqual("", out)
+        self.assertEqual("", err)
+
+        with zipfile.ZipFile("tests/resources/test.zip") as archive:
+            actual = [
+                archive.read(f"fandango-{i:04d}.txt").decode()
+                for i in range(len(expected))
+            ]
+        self.assertEqual(expected, actual)
+
+        actual = []
+        with open("tests/resources/test.bin", "rb") as fd:
+            while header := fd.read(8):
+                (length,) = struct.unpack(">Q", header)
+                actual.append(fd.read(length).decode())
+        self.assertEqual(expected, actual)
+
     def test_output_with_libfuzzer_harness(self):
         compile = shlex.split(
             "clang -g -O2 -fPIC -shared -o tests/resources/test_libfuzzer_interface tests/resources/test_libfuzzer_interface.c"
@@ -1,8 +1,13 @@
 #!/usr/bin/env pytest
 
+import random
+from types import CodeType
 import unittest
 
+import dill
 
+from fandango.constraints.fitness import FailingTree, evaluation_statistics
+from fandango.constraints.pushdown import find_local_constraints
 from fandango.language.symbol import NonTerminal, Terminal
 from fandango.language.tree import DerivationTree
 from fandango.language.parse import parse
@@ -119,6 +124,74 @@ class ConstraintTest(unittest.TestCase):
         )
         self.assertFalse(constraint.check(counter_example))
 
+    def test_compiled_comparison_constraint(self):
+        constraint = self.get_constraint("|<ab>| > 2;")
+        self.assertIsInstance(constraint.left_code, CodeType)
+        self.assertIsInstance(constraint.right_code, CodeType)
+        example = DerivationTree(
+            NonTerminal("<ab>"),
+            [
+                DerivationTree(NonTerminal("<ab>"), [DerivationTree(Terminal(""))]),
+                DerivationTree(Terminal("b")),
+            ],
+        )
+        # Code objects are compiled again when unpickling, e.g. from the spec cache
+        unpickled = dill.loads(dill.dumps(constraint))
+        self.assertIsInstance(unpickled.left_code, CodeType)
+        self.assertIsInstance(unpickled.right_code, CodeType)
+        self.assertEqual(constraint.check(example), unpickled.check(example))
+
+    def test_comparison_join(self):
+        constraint = self.get_constraint("str(<start>) == str(<ab>);")
+        self.assertIsNotNone(constraint.join_plan)
+        example = DerivationTree(
+            NonTerminal("<start>"),
+            [
+                DerivationTree(
+                    NonTerminal("<ab>"),
+                    [
+                        DerivationTree(
+                            NonTerminal("<ab>"), [DerivationTree(Terminal(""))]
+                        ),
+                        DerivationTree(Terminal("b")),
+                    ],
+                )
+            ],
+        )
+        joined = constraint.fitness(example)
+        product = constraint._product_fitness(example)
+        self.assertEqual(1, joined.solved)
+        self.assertEqual(2, joined.total)
+        self.assertEqual(
+            [(ft.tree, ft.suggestions) for ft in product.failing_trees],
+            [(ft.tree, ft.suggestions) for ft in joined.failing_trees],
+        )
+
+    def test_comparison_join_statistics(self):
+        constraint = self.get_constraint("str(<start>) != str(<ab>) + 'a';")
+        self.assertIsNotNone(constraint.join_plan)
+        example = DerivationTree(
+            NonTerminal("<start>"),
+            [
+                DerivationTree(
+                    NonTerminal("<ab>"),
+                    [
+                        DerivationTree(
+                            NonTerminal("<ab>"), [DerivationTree(Terminal(""))]
+                        ),
+                        DerivationTree(Terminal("b")),
+                    ],
+                )
+            ],
+        )
+        with evaluation_statistics() as statistics:
+            self.assertTrue(constraint._product_fitness(example).success)
+        self.assertEqual(2, statistics.combinations)
+        # A hash join compares no pairs one by one if none of them fails
+        with evaluation_statistics() as statistics:
+            self.assertTrue(constraint.fitness(example).success)
+        self.assertEqual(0, statistics.combinations)
+
     def test_conjunction_constraint(self):
         constraint = self.get_constraint("'a' not in str(<ab>) and |<ab>| > 2;")
         example = DerivationTree(
@@ -259,6 +332,37 @@ class ConstraintTest(unittest.TestCase):
         tree_2 = DerivationTree(NonTerminal("<ab>"), [DerivationTree(Terminal(""))])
         self.assertNotEqual(tree_1, tree_2)
 
+    def test_failing_tree_identity(self):
+        constraint = self.get_constraint("'a' in str(<ab>);")
+        tree_1 = DerivationTree(NonTerminal("<ab>"), [DerivationTree(Terminal(""))])
+        tree_2 = DerivationTree(NonTerminal("<ab>"), [DerivationTree(Terminal(""))])
+        self.assertEqual(tree_1, tree_2)
+        # Failing trees are told apart by the identity of their trees
+        self.assertEqual(
+            FailingTree(tree_1, constraint), FailingTree(tree_1, constraint)
+        )
+        self.assertNotEqual(
+            FailingTree(tree_1, constraint), FailingTree(tree_2, constraint)
+        )
+        self.assertEqual(
+            1, len({FailingTree(tree_1, constraint), FailingTree(tree_1, constraint)})
+        )
+
+        example = DerivationTree(
+            NonTerminal("<ab>"),
+            [
+                DerivationTree(NonTerminal("<ab>"), [tree_1]),
+                DerivationTree(Terminal("b")),
+            ],
+        )
+        failing_trees = constraint.fitness(example).failing_trees
+        # Each failing <ab> is reported once
+        self.assertEqual(3, len(failing_trees))
+        self.assertEqual(
+            {id(example), id(example.children[0]), id(tree_1)},
+            {id(ft.tree) for ft in failing_trees},
+        )
+
     def test_exists_constraint(self):
         constraint = self.get_constraint("exists <x> in <ab>: 'a' == str(<x>);")
         counter_example = DerivationTree(
@@ -380,6 +484,61 @@ int(<number>) < 100000;
                     self.assertEqual(tree, fitness.failing_trees[0].tree)
 
 
+class LocalConstraintTest(unittest.TestCase):
+    def test_local_constraints(self):
+        with open("tests/resources/persons.fan", "r") as file:
+            grammar, constraints = parse(
+                file,
+                constraints=[
+                    "int(<age>) in range(18, 66);",
+                    "len(str(<name>)) < 5;",
+                    "str(<first_name>) != str(<last_name>);",
+                ],
+                use_cache=False,
+            )
+        local_constraints = find_local_constraints(grammar, constraints)
+        # The last constraint relates two nonterminals
+        self.assertEqual(constraints[:2], [c.constraint for c in local_constraints])
+        self.assertEqual(range(18, 66), local_constraints[0].values)
+        self.assertIsNone(local_constraints[1].values)
+
+        # Earlier runs may have changed the (global) repetition bound
+        self.addCleanup(grammar.set_max_repetition, grammar.get_max_repetition())
+        grammar.set_max_repetition(5)
+        random.seed(0)
+        # The parsed grammar may be shared with other tests, so only enforce the constraints here
+        with grammar.fuzzing_settings(local_constraints=local_constraints):
+            for _ in range(20):
+                tree = grammar.fuzz()
+                self.assertTrue(constraints[0].check(tree))
+                self.assertTrue(constraints[1].check(tree))
+
+
+class BatchFitnessTest(unittest.TestCase):
+    @staticmethod
+    def parse_constraint(constraint):
+        with open("tests/resources/persons.fan", "r") as file:
+            grammar, constraints = parse(
+                file, constraints=[constraint], use_cache=False
+            )
+        return grammar, constraints[0]
+
+    def test_fitness_batch(self):
+        # Enough trees to compare the values vectorized
+        for constraint in ["int(<age>) > 40;", "50 <= int(<age>);"]:
+            grammar, batched = self.parse_constraint(constraint)
+            _, sequential = self.parse_constraint(constraint)
+            random.seed(0)
+            trees = [grammar.fuzz() for _ in range(100)]
+            results = batched.fitness_batch(trees)
+            self.assertEqual(len(trees), len(results))
+            for tree, result in zip(trees, results):
+                expected = sequential.fitness(tree)
+                self.assertEqual(expected.fitness(), result.fitness())
+                self.assertEqual(expected.success, result.success)
+                self.assertEqual(len(expected.failing_trees), len(result.failing_trees))
+
+
 class ConverterTest(unittest.TestCase):
     def test_standards(self):
         # Earlier Fandango versions overloaded int(); so check if it still works
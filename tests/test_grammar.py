@@ -135,3 +135,27 @@ class ConstraintTest(unittest.TestCase):
             s = str(sol).split(".")
             self.assertEqual(s[0], "a" * 50)
             self.assertTrue(len(s[1]) >= 10)
+
+    def test_compiled_fuzzing(self):
+        for resource in [
+            "tests/resources/grammar.fan",
+            "tests/resources/dynamic_repetition.fan",
+            "tests/resources/nested_grammar_parameters.fan",
+        ]:
+            file = open(resource, "r")
+            GRAMMAR, _ = parse(file, use_stdlib=False, use_cache=False)
+            assert GRAMMAR is not None
+            # Earlier runs may have changed the (global) repetition bound
+            self.addCleanup(GRAMMAR.set_max_repetition, GRAMMAR.get_max_repetition())
+            GRAMMAR.set_max_repetition(5)
+            for seed in range(10):
+                random.seed(seed)
+                interpreted = GRAMMAR.fuzz(max_nodes=50)
+                GRAMMAR.compiled_fuzzing = True
+                random.seed(seed)
+                compiled = GRAMMAR.fuzz(max_nodes=50)
+                GRAMMAR.compiled_fuzzing = False
+                self.assertEqual(
+                    [t.symbol for t in interpreted.flatten()],
+                    [t.symbol for t in compiled.flatten()],
+                )
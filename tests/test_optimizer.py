@@ -1,14 +1,39 @@
 #!/usr/bin/env pytest
 
+import contextlib
+import csv
 from copy import deepcopy
+import io
+import json
+import os
 import random
+import tempfile
+import tracemalloc
 import unittest
 
-from fandango.constraints.fitness import FailingTree
+from fandango.constraints.fitness import Comparison, ComparisonSide, FailingTree
+from fandango import FandangoParseError
 from fandango.evolution import GeneratorWithReturn
-from fandango.evolution.algorithm import Fandango, LoggerLevel
+from fandango.evolution.algorithm import EvolutionStrategy, Fandango, LoggerLevel
+from fandango.evolution.crossover import (
+    SimpleSubtreeCrossover,
+    SizeAwareSubtreeCrossover,
+    SpliceCrossover,
+    SymbolIndex,
+)
+from fandango.evolution.evaluation import Evaluator
+from fandango.evolution.guard import EvaluationGuard, EvaluationLimitExceeded
+from fandango.evolution.mutation import (
+    HavocMutation,
+    SimpleMutation,
+    SubtreeRegenerationMutation,
+)
 from fandango.evolution.population import PopulationManager
+from fandango.evolution.profiler import active_profiler
+from fandango.evolution.scheduler import BanditStrategy, OperatorScheduler
+from fandango.evolution.seenset import SeenSet
 from fandango.language.parse import parse
+from fandango.language.symbol import NonTerminal
 from fandango.language.tree import DerivationTree
 
 
@@ -73,6 +98,86 @@ class GeneticTest(unittest.TestCase):
             self.assertIsInstance(individual, DerivationTree)
             self.assertTrue(self.fandango.grammar.parse(str(individual)))
 
+    def test_refill_population_in_parallel(self):
+        manager = PopulationManager(
+            grammar=self.fandango.grammar,
+            start_symbol=self.fandango.start_symbol,
+            warnings_are_errors=True,
+        )
+        populations = []
+        for workers in [2, 3]:
+            random.seed(7)
+            population = []
+            list(
+                manager.refill_population(
+                    current_population=population,
+                    eval_individual=self.fandango.evaluator.evaluate_individual,
+                    max_nodes=self.fandango.current_max_nodes,
+                    target_population_size=20,
+                    workers=workers,
+                )
+            )
+            self.assertEqual(len(population), 20)
+            self.assertEqual(len({ind.fingerprint() for ind in population}), 20)
+            populations.append([str(ind) for ind in population])
+        # The result does not depend on the number of workers, as long as there are several
+        self.assertEqual(populations[0], populations[1])
+
+    def test_refill_population_closes_workers_on_error(self):
+        manager = PopulationManager(
+            grammar=self.fandango.grammar,
+            start_symbol=self.fandango.start_symbol,
+            warnings_are_errors=True,
+        )
+        streams = []
+        generate_entries = manager._generate_entries_in_parallel
+
+        def record_entries(*args):
+            streams.append(generate_entries(*args))
+            return streams[-1]
+
+        def fail(individual):
+            raise RuntimeError("evaluation failed")
+            yield
+
+        manager._generate_entries_in_parallel = record_entries  # type: ignore[method-assign]
+        with self.assertRaises(RuntimeError):
+            list(
+                manager.refill_population(
+                    current_population=[],
+                    eval_individual=fail,
+                    max_nodes=self.fandango.current_max_nodes,
+                    target_population_size=20,
+                    workers=2,
+                )
+            )
+        self.assertEqual(len(streams), 1)
+        # The stream (and with it the worker pool) has been closed
+        self.assertIsNone(streams[0].gi_frame)
+
+    def test_parse_and_deduplicate_seeds(self):
+        seeds = iter(["13", "0", "13", "257", "x"] * 50)
+        for workers in [1, 2]:
+            with self.assertRaises(FandangoParseError):
+                self.fandango._parse_and_deduplicate(["13", "0"], workers=workers)
+            population = self.fandango._parse_and_deduplicate(
+                seeds, workers=workers, skip_unparsable=True
+            )
+            self.assertEqual([str(ind) for ind in population], ["13", "257"])
+            seeds = iter(["13", "0", "13", "257", "x"] * 50)
+
+    def test_select_diverse_seeds(self):
+        population = self.fandango._parse_and_deduplicate(
+            ["1", "2", "3", "12", "123", "1234"]
+        )
+        selected = [str(ind) for ind in PopulationManager.select_diverse(population, 2)]
+        # "1234" covers the most expansions
+        self.assertEqual(len(selected), 2)
+        self.assertIn("1234", selected)
+        self.assertEqual(
+            len(PopulationManager.select_diverse(population, 10)), len(population)
+        )
+
     def test_refill_population_with_non_empty_population(self):
         # Generate a population of derivation trees
         manager = PopulationManager(
@@ -112,6 +217,28 @@ class GeneticTest(unittest.TestCase):
         for individual in copy_of_initial_population:
             self.assertIn(individual, population)
 
+    def test_fix_individuals_with_suggestion_cache(self):
+        manager = PopulationManager(
+            grammar=self.fandango.grammar,
+            start_symbol=self.fandango.start_symbol,
+            warnings_are_errors=True,
+        )
+        evaluation = []
+        for individual in self.fandango.population[:5]:
+            number = individual.children[0]
+            suggestion = (Comparison.EQUAL, "13", ComparisonSide.LEFT)
+            evaluation.append(
+                (individual, [FailingTree(number, None, suggestions=[suggestion])])
+            )
+        fixed = manager.fix_individuals(evaluation)
+        self.assertEqual(len(fixed), 5)
+        for individual, num_fixes in fixed:
+            self.assertEqual(num_fixes, 1)
+            self.assertEqual(str(individual), "13")
+        # The suggestion is parsed only once
+        self.assertEqual(manager.suggestion_cache_lookups, 5)
+        self.assertEqual(manager.suggestion_cache_hits, 4)
+
     def test_evaluate_fitness(self):
         # Evaluate the fitness of the population
         population = self.fandango.population
@@ -178,6 +305,32 @@ class GeneticTest(unittest.TestCase):
         for individual in elites:
             self.assertTrue(self.fandango.grammar.parse(str(individual)))
 
+    def test_select_elites_are_fittest(self):
+        elites = self.fandango.evaluator.select_elites(
+            self.fandango.evaluation,
+            elitism_rate=self.fandango.elitism_rate,
+            population_size=self.fandango.population_size,
+        )
+        fitnesses = sorted((e[1] for e in self.fandango.evaluation), reverse=True)
+        fitness_of = {hash(e[0]): e[1] for e in self.fandango.evaluation}
+        self.assertListEqual(
+            [fitness_of[hash(elite)] for elite in elites],
+            fitnesses[: len(elites)],
+        )
+
+    def test_batch_selection(self):
+        pairs = self.fandango.evaluator.tournament_selection_batch(
+            self.fandango.evaluation,
+            tournament_size=max(
+                2, int(self.fandango.population_size * self.fandango.tournament_size)
+            ),
+            num_tournaments=20,
+        )
+        self.assertEqual(len(pairs), 20)
+        for parent1, parent2 in pairs:
+            self.assertIn(parent1, self.fandango.population)
+            self.assertIn(parent2, self.fandango.population)
+
     def test_selection(self):
         # Select the parents
         parent1, parent2 = self.fandango.evaluator.tournament_selection(
@@ -228,6 +381,56 @@ class GeneticTest(unittest.TestCase):
         for individual in children:
             self.assertTrue(self.fandango.grammar.parse(str(individual)))
 
+    def test_size_aware_crossover(self):
+        parent1, parent2 = self.fandango.population[:2]
+        operator = SizeAwareSubtreeCrossover(max_nodes=0)
+        # With no room to grow, only swaps that do not grow either parent are allowed
+        for _ in range(20):
+            child1, child2 = operator.crossover(self.fandango.grammar, parent1, parent2)
+            self.assertLessEqual(child1.size(), parent1.size())
+            self.assertLessEqual(child2.size(), parent2.size())
+
+        operator = SizeAwareSubtreeCrossover(max_nodes=parent1.size() + parent2.size())
+        for _ in range(20):
+            for child in operator.crossover(self.fandango.grammar, parent1, parent2):
+                self.assertTrue(self.fandango.grammar.parse(str(child)))
+
+    def test_crossover_index_matches_find_all_nodes(self):
+        tree = self.fandango.population[0]
+        index = SymbolIndex(tree)
+        self.assertEqual(set(index.nodes), tree.get_non_terminal_symbols())
+        for symbol, nodes in index.nodes.items():
+            self.assertEqual(
+                [id(node) for node in nodes],
+                [id(node) for node in tree.find_all_nodes(symbol)],
+            )
+
+    def test_splice_crossover(self):
+        parent1, parent2, donor = self.fandango.population[:3]
+        operator = SpliceCrossover()
+        # Without donors, the same subtree crossover (and its symbol indexes) is used every time
+        fallback = operator._subtree_crossover
+        for _ in range(5):
+            operator.crossover(self.fandango.grammar, parent1, parent2)
+        self.assertIs(operator._subtree_crossover, fallback)
+        self.assertIs(
+            fallback._index_cache.get(parent1), fallback._index_cache.get(parent1)
+        )
+
+        operator.add_to_corpus(donor)
+        for _ in range(20):
+            for child in operator.crossover(self.fandango.grammar, parent1, parent2):
+                self.assertTrue(self.fandango.grammar.parse(str(child)))
+
+    def test_default_crossover_is_not_shared(self):
+        other = Fandango(
+            grammar=self.fandango.grammar,
+            constraints=self.fandango.constraints,
+            population_size=10,
+        )
+        self.assertIsInstance(other.crossover_operator, SimpleSubtreeCrossover)
+        self.assertIsNot(other.crossover_operator, self.fandango.crossover_operator)
+
     def test_mutation(self):
         # Select the parents
         tournament_size = max(
@@ -285,6 +488,393 @@ class GeneticTest(unittest.TestCase):
         for individual in self.fandango.population:
             self.assertTrue(self.fandango.grammar.parse(str(individual)))
 
+    def test_evolve_steady_state(self):
+        fandango = Fandango(
+            grammar=self.fandango.grammar,
+            constraints=self.fandango.constraints,
+            population_size=50,
+            evolution_strategy=EvolutionStrategy.STEADY_STATE,
+        )
+        solutions = fandango.evolve(max_generations=20, desired_solutions=10)
+
+        self.assertEqual(len(solutions), len(set(solutions)))
+        self.assertEqual(len(fandango.population), len(set(fandango.population)))
+        self.assertEqual(len(fandango.evaluation), len(fandango.population))
+        for individual, fitness, _failing_trees in fandango.evaluation:
+            self.assertIn(individual, fandango.population)
+            self.assertEqual(
+                fitness, fandango.fitness[fandango.population.index(individual)]
+            )
+        for individual in solutions:
+            self.assertTrue(fandango.grammar.parse(str(individual)))
+
+
+class IncrementalEvaluationTests(unittest.TestCase):
+    def test_unaffected_constraint_results_are_reused(self):
+        file = open("tests/resources/persons_with_constr.fan", "r")
+        grammar, constraints = parse(
+            file,
+            constraints=["int(<age>) > 20;"],
+            use_stdlib=False,
+            use_cache=False,
+        )
+        assert grammar is not None
+        evaluator = Evaluator(
+            grammar,
+            constraints,
+            expected_fitness=1.0,
+            diversity_k=0,
+            diversity_weight=0,
+        )
+        parent = grammar.parse("Alice Smith,12")
+        list(evaluator.evaluate_individual(parent))
+        self.assertEqual(evaluator.get_constraint_results_reused(), 0)
+
+        # Replacing the first name does not touch any <age>
+        first_name = parent.find_all_nodes(NonTerminal("<first_name>"))[0]
+        child = parent.replace(
+            grammar, first_name, grammar.parse("Bob", "<first_name>")
+        )
+        self.assertIs(child.edit.origin, parent)
+        generator = GeneratorWithReturn(evaluator.evaluate_individual(child))
+        list(generator)
+        fitness, failing_trees = generator.return_value
+        self.assertEqual(evaluator.get_constraint_results_reused(), 1)
+        self.assertLess(fitness, 1.0)
+        self.assertTrue(failing_trees)
+        # The failing trees refer to the child, not to the parent
+        for failing_tree in failing_trees:
+            self.assertIs(failing_tree.tree.get_path()[0], child)
+
+        # Replacing the age does
+        age = parent.find_all_nodes(NonTerminal("<age>"))[0]
+        child = parent.replace(grammar, age, grammar.parse("42", "<age>"))
+        list(evaluator.evaluate_individual(child))
+        self.assertEqual(evaluator.get_constraint_results_reused(), 1)
+
+
+class BatchEvaluationTests(unittest.TestCase):
+    INPUTS = ["12-12", "5-7", "300-300", "999-999", "41-14", "7-7", "12-12"]
+
+    def setup_evaluator(self) -> tuple[Evaluator, list[DerivationTree]]:
+        # Soft constraints keep their sketches, so each evaluator gets its own
+        file = open("tests/resources/softvalue.fan", "r")
+        grammar, constraints = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar is not None
+        evaluator = Evaluator(
+            grammar,
+            constraints,
+            expected_fitness=1.0,
+            diversity_k=0,
+            diversity_weight=0,
+        )
+        return evaluator, [grammar.parse(s) for s in self.INPUTS]
+
+    def test_population_matches_individuals(self):
+        batch_evaluator, population = self.setup_evaluator()
+        generator = GeneratorWithReturn(batch_evaluator.evaluate_population(population))
+        list(generator)
+        batch_evaluation = generator.return_value
+
+        evaluator, population = self.setup_evaluator()
+        for individual in population:
+            list(evaluator.evaluate_individual(individual))
+        # Re-score against all values, as `evaluate_population()` does
+        evaluator._update_soft_normalization()
+        evaluation = []
+        for individual in population:
+            generator = GeneratorWithReturn(evaluator.evaluate_individual(individual))
+            list(generator)
+            evaluation.append(generator.return_value)
+
+        self.assertEqual(len(batch_evaluation), len(evaluation))
+        for (ind, batch_fitness, batch_failing), (fitness, failing) in zip(
+            batch_evaluation, evaluation
+        ):
+            self.assertAlmostEqual(batch_fitness, fitness, msg=str(ind))
+            self.assertEqual(
+                [str(f.tree) for f in batch_failing],
+                [str(f.tree) for f in failing],
+                str(ind),
+            )
+        self.assertEqual(
+            batch_evaluator.get_fitness_check_count(),
+            evaluator.get_fitness_check_count(),
+        )
+
+
+class FuzzingSettingsTests(unittest.TestCase):
+    def test_settings_do_not_leak_into_grammar(self):
+        file = open("tests/resources/persons.fan", "r")
+        grammar, constraints = parse(
+            file, constraints=["int(<age>) in range(18, 66);"], use_cache=False
+        )
+        assert grammar is not None
+        in_range = constraints[0]
+        local_constraints = grammar.local_constraints
+        fandango = Fandango(
+            grammar=grammar,
+            constraints=constraints,
+            random_seed=1,
+            population_size=20,
+            push_constraints=True,
+            compile_grammar=True,
+        )
+        self.assertTrue(all(in_range.check(ind) for ind in fandango.population))
+        fandango.evolve(max_generations=1)
+        self.assertFalse(grammar.compiled_fuzzing)
+        self.assertIs(grammar.local_constraints, local_constraints)
+
+        # A second instance on the same grammar generates without the pushed constraint
+        other = Fandango(
+            grammar=grammar,
+            constraints=constraints,
+            random_seed=1,
+            population_size=50,
+        )
+        self.assertFalse(all(in_range.check(ind) for ind in other.population))
+
+
+class ShortCircuitTests(unittest.TestCase):
+    def test_short_circuit_solutions_are_exact(self):
+        file = open("tests/resources/int.fan", "r")
+        grammar_int, constraints_int = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar_int is not None
+        fandango = Fandango(
+            grammar=grammar_int,
+            constraints=constraints_int,
+            random_seed=1,
+            short_circuit_generations=5,
+        )
+        solutions = fandango.evolve(max_generations=50, desired_solutions=5)
+        for solution in solutions:
+            number = int(str(solution))
+            self.assertEqual(number % 2, 0)
+            self.assertGreater(number, 10000)
+            self.assertLess(number, 100000)
+
+        order = fandango.evaluator.get_constraint_order()
+        self.assertCountEqual(order, constraints_int)
+
+
+class TimeBudgetTests(unittest.TestCase):
+    def test_time_budget_stops_evolution(self):
+        file = open("tests/resources/int.fan", "r")
+        grammar_int, constraints_int = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar_int is not None
+        fandango = Fandango(
+            grammar=grammar_int,
+            constraints=constraints_int,
+            random_seed=1,
+        )
+        streamed = []
+        solutions = fandango.evolve(
+            max_generations=None,
+            time_budget=1.0,
+            solution_callback=lambda solution, _index: streamed.append(solution),
+        )
+        self.assertTrue(fandango.out_of_time)
+        self.assertLess(fandango.time_taken, 10.0)
+        self.assertEqual(streamed, solutions)
+        self.assertEqual(len(fandango.evaluation), len(fandango.population))
+
+    def test_time_budget_with_slow_constraint(self):
+        file = open("tests/resources/int.fan", "r")
+        grammar_int, constraints_int = parse(
+            file,
+            constraints=[
+                '__import__("time").sleep(0.05) is None and int(<start>) % 7 == 1;'
+            ],
+            use_stdlib=False,
+            use_cache=False,
+        )
+        assert grammar_int is not None
+        fandango = Fandango(
+            grammar=grammar_int,
+            constraints=constraints_int,
+            random_seed=1,
+            population_size=50,
+        )
+        fandango.evolve(max_generations=None, time_budget=0.5)
+        self.assertTrue(fandango.out_of_time)
+        # Evaluating a generation takes several seconds; the budget is checked in between
+        self.assertLess(fandango.time_taken, 2.0)
+        self.assertEqual(len(fandango.evaluation), len(fandango.population))
+
+
+class CheckpointTests(unittest.TestCase):
+    def make_fandango(self, **kwargs):
+        file = open("tests/resources/int.fan", "r")
+        grammar_int, constraints_int = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar_int is not None
+        return Fandango(
+            grammar=grammar_int,
+            constraints=constraints_int,
+            random_seed=1,
+            population_size=20,
+            **kwargs,
+        )
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            fandango = self.make_fandango(checkpoint_dir=directory)
+            solutions = fandango.evolve(max_generations=3)
+            fingerprints = [ind.fingerprint() for ind in fandango.population]
+
+            stats_file = os.path.join(directory, "stats.jsonl")
+            resumed = self.make_fandango(resume_from=directory, stats_file=stats_file)
+            self.assertEqual(resumed.generation, fandango.generation)
+            self.assertEqual(
+                [ind.fingerprint() for ind in resumed.population], fingerprints
+            )
+
+            # Solutions found before the checkpoint are not reported again
+            old = {solution.fingerprint() for solution in solutions}
+            for solution in resumed.evolve(max_generations=2):
+                self.assertNotIn(solution.fingerprint(), old)
+
+            # Generations are counted on from the checkpoint
+            self.assertEqual(resumed.generation, 5)
+            with open(stats_file) as fp:
+                rows = [json.loads(line) for line in fp]
+            self.assertEqual([4, 5], [row["generation"] for row in rows])
+
+    def test_resume_with_seen_set(self):
+        with tempfile.TemporaryDirectory() as directory:
+            fandango = self.make_fandango(
+                checkpoint_dir=directory, seen_set_error_rate=0.01
+            )
+            fandango.evolve(max_generations=3)
+            seen_set = fandango.evaluator.seen_set
+            assert seen_set is not None
+
+            resumed = self.make_fandango(
+                resume_from=directory, seen_set_error_rate=0.01
+            )
+            resumed_seen_set = resumed.evaluator.seen_set
+            assert resumed_seen_set is not None
+            self.assertEqual(len(resumed_seen_set), len(seen_set))
+            for ind in fandango.population:
+                self.assertIn(ind.fingerprint(), resumed_seen_set)
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_trace_and_stats_export(self):
+        file = open("tests/resources/int.fan", "r")
+        grammar_int, constraints_int = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar_int is not None
+        with tempfile.TemporaryDirectory() as directory:
+            trace_file = os.path.join(directory, "trace.json")
+            stats_file = os.path.join(directory, "stats.jsonl")
+            fandango = Fandango(
+                grammar=grammar_int,
+                constraints=constraints_int,
+                random_seed=1,
+                population_size=20,
+                trace_file=trace_file,
+                stats_file=stats_file,
+            )
+            # Nothing is written (or left active) unless the population evolves
+            self.assertIsNone(active_profiler())
+            self.assertFalse(os.path.exists(trace_file))
+            fandango.evolve(max_generations=3)
+            self.assertIsNone(active_profiler())
+
+            with open(trace_file) as fp:
+                events = json.load(fp)
+            names = {event["name"] for event in events}
+            self.assertIn("Grammar.fuzz", names)
+            self.assertIn("Constraint.fitness", names)
+            self.assertTrue(all(event["ph"] == "X" for event in events))
+
+            with open(stats_file) as fp:
+                rows = [json.loads(line) for line in fp]
+            self.assertEqual([row["generation"] for row in rows], [1, 2, 3])
+            self.assertIn("best_fitness", rows[0])
+
+    def test_trace_and_stats_across_evolve_calls(self):
+        file = open("tests/resources/int.fan", "r")
+        grammar_int, constraints_int = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar_int is not None
+        with tempfile.TemporaryDirectory() as directory:
+            trace_file = os.path.join(directory, "trace.json")
+            stats_file = os.path.join(directory, "stats.csv")
+            fandango = Fandango(
+                grammar=grammar_int,
+                constraints=constraints_int,
+                random_seed=1,
+                population_size=20,
+                trace_file=trace_file,
+                stats_file=stats_file,
+            )
+            fandango.evolve(max_generations=2)
+            fandango.evolve(max_generations=2)
+
+            with open(trace_file) as fp:
+                events = json.load(fp)
+            names = {event["name"] for event in events}
+            for generation in range(1, 5):
+                self.assertIn(f"generation {generation}", names)
+
+            with open(stats_file, newline="") as fp:
+                rows = list(csv.reader(fp))
+            self.assertEqual(rows[0], ["generation", "metric", "value"])
+            self.assertEqual(sorted({int(row[0]) for row in rows[1:]}), [1, 2, 3, 4])
+
+    def test_constraint_profile(self):
+        file = open("tests/resources/persons_with_constr.fan", "r")
+        grammar, constraints = parse(
+            file,
+            constraints=[
+                "int(<age>) < 60;",
+                "str(<first_name>) != str(<last_name>);",
+            ],
+            use_stdlib=False,
+            use_cache=False,
+        )
+        assert grammar is not None
+        with tempfile.TemporaryDirectory() as directory:
+            profile_file = os.path.join(directory, "profile.json")
+            fandango = Fandango(
+                grammar=grammar,
+                constraints=constraints,
+                random_seed=1,
+                population_size=20,
+                constraint_profile_file=profile_file,
+            )
+            with (
+                contextlib.redirect_stdout(io.StringIO()) as stdout,
+                contextlib.redirect_stderr(io.StringIO()) as stderr,
+            ):
+                fandango.evolve(max_generations=3)
+            # The report does not mix with the generated inputs
+            self.assertEqual(stdout.getvalue(), "")
+            self.assertIn("combinations", stderr.getvalue())
+
+            with open(profile_file) as fp:
+                report = json.load(fp)
+        self.assertEqual(
+            sorted(str(constraint) for constraint in constraints),
+            sorted(row["constraint"] for row in report),
+        )
+        self.assertEqual(
+            ["hard", "hard", "soft"], sorted(row["kind"] for row in report)
+        )
+        times = [row["time"] for row in report]
+        self.assertEqual(sorted(times, reverse=True), times)
+        for row in report:
+            self.assertGreater(row["evaluations"], 0)
+            if "!=" not in row["constraint"]:
+                # A join counts only the pairs it compares one by one (see test_comparison_join_statistics)
+                self.assertGreater(row["combinations"], 0)
+            self.assertLessEqual(row["search_time"], row["time"])
+            self.assertTrue(0 <= row["cache_hit_rate"] <= 1)
+            self.assertTrue(0 <= row["failure_rate"] <= 1)
+        # Not every individual satisfies the hard constraints
+        self.assertTrue(
+            any(row["failure_rate"] > 0 for row in report if row["kind"] == "hard")
+        )
+
 
 class DeterminismTests(unittest.TestCase):
     # fandango fuzz -f tests/resources/determinism.fan -n 100 --random-seed 1
@@ -344,5 +934,159 @@ class TargetedMutations(unittest.TestCase):
         self.assertListEqual(solutions, ["0123456789"])
 
 
+class SeenSetTests(unittest.TestCase):
+    def test_seen_set(self):
+        seen_set = SeenSet(false_positive_rate=0.01, initial_capacity=100)
+        fingerprints = [os.urandom(16) for _ in range(1000)]
+        for fingerprint in fingerprints:
+            seen_set.add(fingerprint)
+        # Fingerprints that are false positives are not recorded again
+        self.assertGreater(len(seen_set), 950)
+        self.assertGreater(len(seen_set.filters), 1)
+        for fingerprint in fingerprints:
+            self.assertIn(fingerprint, seen_set)
+        false_positives = sum(os.urandom(16) in seen_set for _ in range(10000))
+        self.assertLess(false_positives, 200)
+
+    def test_seen_set_state(self):
+        seen_set = SeenSet(false_positive_rate=0.01, initial_capacity=100)
+        fingerprints = [os.urandom(16) for _ in range(500)]
+        for fingerprint in fingerprints:
+            seen_set.add(fingerprint)
+        state = seen_set.get_state()
+        # Full filters are not copied again
+        self.assertGreater(len(seen_set.filters), 1)
+        for (*_, bits), (*_, same_bits) in zip(
+            state["filters"][:-1], seen_set.get_state()["filters"]
+        ):
+            self.assertIs(bits, same_bits)
+
+        restored = SeenSet(false_positive_rate=0.01, initial_capacity=100)
+        restored.set_state(state)
+        self.assertEqual(len(restored), len(seen_set))
+        for fingerprint in fingerprints:
+            self.assertIn(fingerprint, restored)
+        # The last filter is copied again once it changed
+        seen_set.add(os.urandom(16))
+        self.assertNotEqual(
+            state["filters"][-1][3], seen_set.get_state()["filters"][-1][3]
+        )
+
+    def test_seen_set_memory_limit(self):
+        seen_set = SeenSet(
+            false_positive_rate=0.01, max_bytes=1024, initial_capacity=100
+        )
+        for _ in range(10000):
+            seen_set.add(os.urandom(16))
+        self.assertLessEqual(seen_set.memory, 1024)
+        self.assertLess(len(seen_set), 10000)
+
+    def test_evolve_with_seen_set(self):
+        file = open("tests/resources/example_number.fan", "r")
+        grammar, constraints = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar is not None
+        # Earlier runs may have changed the (global) repetition bound
+        self.addCleanup(grammar.set_max_repetition, grammar.get_max_repetition())
+        grammar.set_max_repetition(3)
+        fandango = Fandango(
+            grammar=grammar,
+            constraints=constraints,
+            population_size=20,
+            random_seed=1,
+            seen_set_error_rate=0.001,
+        )
+        fandango.evolve(max_generations=20)
+        self.assertIsNotNone(fandango.evaluator.seen_set)
+        self.assertGreater(len(fandango.evaluator.seen_set), 0)
+        # Re-generated individuals are caught by the seen-set, not the fitness cache
+        self.assertGreater(fandango.evaluator.get_evaluations_avoided(), 0)
+
+
+class OperatorSchedulerTests(unittest.TestCase):
+    def test_scheduler_prefers_productive_operator(self):
+        for strategy in BanditStrategy:
+            random.seed(0)
+            scheduler = OperatorScheduler(["good", "bad"], strategy)
+            for _ in range(200):
+                index = scheduler.select()
+                improvement = 0.1 if index == 0 else 0.0
+                scheduler.update(index, improvement, cpu_time=0.001)
+            self.assertGreater(
+                scheduler.stats[0].invocations, scheduler.stats[1].invocations
+            )
+
+    def test_evolve_with_several_operators(self):
+        file = open("tests/resources/example_number.fan", "r")
+        grammar, constraints = parse(file, use_stdlib=False, use_cache=False)
+        assert grammar is not None
+        fandango = Fandango(
+            grammar=grammar,
+            constraints=constraints,
+            population_size=20,
+            random_seed=1,
+            mutation_operators=[
+                SimpleMutation(),
+                SubtreeRegenerationMutation(),
+                HavocMutation(),
+            ],
+            crossover_operators=[SimpleSubtreeCrossover(), SpliceCrossover()],
+        )
+        fandango.evolve(max_generations=5)
+        invocations = sum(
+            stats.invocations
+            for scheduler in [fandango.mutation_scheduler, fandango.crossover_scheduler]
+            for stats in scheduler.stats
+        )
+        self.assertGreater(invocations, 0)
+
+
+class EvaluationGuardTests(unittest.TestCase):
+    def test_time_limit(self):
+        guard = EvaluationGuard(time_limit=0.05)
+        with self.assertRaises(EvaluationLimitExceeded):
+            with guard.limit("loop"):
+                while True:
+                    pass
+        with guard.limit("quick"):
+            pass
+        self.assertEqual(guard.exceeded, 1)
+
+    def test_memory_limit(self):
+        guard = EvaluationGuard(time_limit=10.0, memory_limit=1024 * 1024)
+        data = []
+        with self.assertRaises(EvaluationLimitExceeded):
+            with guard.limit("allocation"):
+                while True:
+                    data.append(bytearray(1024))
+        self.assertEqual(guard.exceeded, 1)
+        # Tracing is only active during the evaluation
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_individual_that_times_out_gets_zero_fitness(self):
+        file = open("tests/resources/persons_with_constr.fan", "r")
+        grammar, constraints = parse(
+            file,
+            # Never terminates
+            constraints=["all(True for _ in iter(int, int(<age>) + 1));"],
+            use_stdlib=False,
+            use_cache=False,
+        )
+        assert grammar is not None
+        evaluator = Evaluator(
+            grammar,
+            constraints,
+            expected_fitness=1.0,
+            diversity_k=0,
+            diversity_weight=0,
+        )
+        evaluator.guard = EvaluationGuard(time_limit=0.1)
+        generator = GeneratorWithReturn(
+            evaluator.evaluate_individual(grammar.parse("Alice Smith,12"))
+        )
+        self.assertEqual([], list(generator))
+        self.assertEqual((0.0, []), generator.return_value)
+        self.assertEqual(evaluator.get_evaluations_stopped(), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -8,6 +8,7 @@ from fandango.language.search import (
     ItemSearch,
     SelectiveSearch,
     DescendantAttributeSearch,
+    search_memo,
 )
 from fandango.language.symbol import NonTerminal, Terminal
 from fandango.language.tree import DerivationTree
@@ -194,3 +195,50 @@ class TestSearches(unittest.TestCase):
         self.assertEqual(2, len(trees))
         self.assertIn(self._C1, trees)
         self.assertIn(self._C2, trees)
+
+    def test_search_memo(self):
+        search = AttributeSearch(
+            RuleSearch(NonTerminal("<d>")), RuleSearch(NonTerminal("<b>"))
+        )
+        # An equal search, as in another constraint
+        other = AttributeSearch(
+            RuleSearch(NonTerminal("<d>")), RuleSearch(NonTerminal("<b>"))
+        )
+        with search_memo() as memo:
+            trees = [c.evaluate() for c in search.find_memoized(self.EXAMPLE)]
+            other_trees = [c.evaluate() for c in other.find_memoized(self.EXAMPLE)]
+            # Searching in a different tree is not answered from the memo
+            sub_trees = [c.evaluate() for c in search.find_memoized(self._B1)]
+        self.assertEqual([self._B2], trees)
+        self.assertEqual(trees, other_trees)
+        self.assertEqual([], sub_trees)
+        # `search` (and its base), `other`, and `search` and its base in `_B1`
+        self.assertEqual(5, memo.lookups)
+        self.assertEqual(1, memo.hits)
+
+    def test_iter_find(self):
+        searches = [
+            RuleSearch(NonTerminal("<c>")),
+            AttributeSearch(
+                RuleSearch(NonTerminal("<d>")), RuleSearch(NonTerminal("<b>"))
+            ),
+            DescendantAttributeSearch(
+                RuleSearch(NonTerminal("<a>")), RuleSearch(NonTerminal("<b>"))
+            ),
+        ]
+        for search in searches:
+            self.assertEqual(
+                [c.evaluate() for c in search.find(self.EXAMPLE)],
+                [c.evaluate() for c in search.iter_find(self.EXAMPLE)],
+            )
+
+    def test_iter_find_is_lazy(self):
+        # A tree far too deep for a recursive search
+        tree = DerivationTree(NonTerminal("<c>"), [DerivationTree(Terminal("0"))])
+        for _ in range(5000):
+            tree = DerivationTree(NonTerminal("<c>"), [tree])
+        stream = RuleSearch(NonTerminal("<c>")).iter_find(tree)
+        first = next(stream).evaluate()
+        # Subtrees come before their parents
+        self.assertEqual(2, first.size())
+        self.assertEqual(5001, 1 + sum(1 for _ in stream))
@@ -1,8 +1,10 @@
 #!/usr/bin/env pytest
 
+import math
 import unittest
 import subprocess
 import shlex
+from fandango.constraints.base import QuantileSketch
 from fandango.evolution.algorithm import Fandango, LoggerLevel
 
 from fandango.language.parse import parse
@@ -94,3 +96,26 @@ class TestSoftValue(TestSoft):
         lines = [line for line in out.split("\n") if line.strip()]
         last_age = int(lines[-1].split(",")[1])
         self.assertEqual(last_age, 0)
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_score(self):
+        sketch = QuantileSketch("max")
+        sketch.update_batch(range(10000))
+        self.assertEqual(len(sketch), 10000)
+        self.assertLessEqual(len(sketch.means), sketch.max_centroids)
+
+        scores = sketch.score([-1, 0, 9000, 9900, 9999, 20000, math.nan])
+        self.assertEqual(scores[0], 0.0)
+        self.assertEqual(scores[1], 0.0)
+        self.assertLess(scores[2], scores[3])
+        self.assertEqual(scores[4], 1.0)
+        self.assertEqual(scores[5], 1.0)
+        self.assertEqual(scores[6], 0.0)
+
+    def test_quantiles(self):
+        sketch = QuantileSketch("min")
+        for start in range(0, 100000, 10000):
+            sketch.update_batch(range(start, start + 10000))
+        for value, quantile in [(10000, 0.1), (50000, 0.5), (99000, 0.99)]:
+            self.assertAlmostEqual(sketch.cdf(value), quantile, delta=0.01)